@@ -25,6 +25,11 @@ from tools.web_controller import WebController
 from system.agentos_core import AgentOSCore
 from system.brain import Brain
 from agents.agent_launcher import AgentLauncher
+from tools.model_client import get_model_client
+from tools.telemetry import get_telemetry
+
+# Connect to the models the agents will use while the rest of the system boots.
+MODEL_WARMUP = os.getenv("MODEL_WARMUP", "0") == "1"
 
 # --- The main function is now asynchronous to support Playwright ---
 async def main():
@@ -35,10 +40,12 @@ async def main():
     logger.info("🚀 Booting AgentOS v0.1...")
     
     web_controller = None
+    shared_memory = None
     try:
         # --- Step 1: Initialize Core Components ---
         # Create single, shared instances of all core system components.
         shared_memory = Memory()
+        warmup_task = asyncio.create_task(get_model_client().awarm_up()) if MODEL_WARMUP else None
         shared_supervisor = SupervisorAgent()
         
         # The WebController is a critical shared resource that needs to be managed.
@@ -52,6 +59,9 @@ async def main():
         shared_brain = Brain(core=shared_core, supervisor=shared_supervisor)
         
         logger.info("✅ Core components initialized.")
+        if warmup_task:
+            await warmup_task
+            logger.info(f"Model pool after warm-up: {get_model_client().pool_stats()}")
 
         # --- Step 2: Launch the Mission via the Launcher ---
         # The launcher is now the single point of entry for all agent activities.
@@ -75,6 +85,19 @@ async def main():
         if web_controller:
             logger.info("Shutting down web controller...")
             await web_controller.close()
+        # Persist any memory writes still sitting in the write-back cache.
+        if shared_memory:
+            logger.info("Flushing shared memory to disk...")
+            await shared_memory.aclose()
+        model_client = get_model_client()
+        logger.info(f"Model response cache: {model_client.cache_stats()}")
+        logger.info(f"Model request scheduler: {model_client.scheduler_stats()}")
+        telemetry_path = get_telemetry().dump()
+        logger.info(f"Model calls: {get_telemetry().summary().get('all')}. Telemetry written to {telemetry_path}.")
+        # Stop the client's loop thread and save the router state. close() joins the
+        # thread, so it runs off this event loop.
+        logger.info("Shutting down model client...")
+        await asyncio.to_thread(model_client.close)
 
 if __name__ == "__main__":
     # Run the main asynchronous function
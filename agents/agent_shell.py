@@ -1,17 +1,20 @@
 # agents/agent_shell.py
 
 import os
-import json
 import logging
 from datetime import datetime
 from memory.memory import Memory
 from agents.supervisor import SupervisorAgent
 from system.agentos_core import AgentOSCore
+from agents.log_sink import get_log_sink
 
 # Configure logging for this module
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Agent log levels mapped onto the standard logging levels for the console.
+LOG_LEVELS = {"error": logging.ERROR, "warning": logging.WARNING}
+
 class AgentShell:
     """
     A lightweight, dynamic base class for all agents in AgentOS.
@@ -40,7 +43,10 @@ class AgentShell:
         self.log(f"Agent initialized with shared core components.")
 
     def log(self, message: str, level: str = "info"):
-        """A standardized logging method for all agents."""
+        """
+        A standardized logging method for all agents. The file record is handed
+        to the shared log sink, which batches writes; errors are flushed at once.
+        """
         log_entry = {
             "timestamp": datetime.now().isoformat(),
             "agent": self.name,
@@ -48,18 +54,11 @@ class AgentShell:
             "message": message
         }
         
-        # Log to console
-        console_message = f"[{self.name}] {message}"
-        if level == "error":
-            logger.error(console_message)
-        elif level == "warning":
-            logger.warning(console_message)
-        else:
-            logger.info(console_message)
+        # Log to console (lazy %-formatting: skipped entirely if the level is disabled)
+        logger.log(LOG_LEVELS.get(level, logging.INFO), "[%s] %s", self.name, message)
             
         # Log to file
-        with open(self.log_file, "a", encoding="utf-8") as f:
-            f.write(json.dumps(log_entry) + "\n")
+        get_log_sink().write(self.log_file, log_entry, urgent=(level == "error"))
 
     def run(self):
         """
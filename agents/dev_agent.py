@@ -1,7 +1,6 @@
 # agents/dev_agent.py
 
 import os
-import subprocess
 import json
 import logging
 from dotenv import load_dotenv
@@ -9,6 +8,7 @@ from agents.agent_shell import AgentShell
 from memory.memory import Memory
 from system.agentos_core import AgentOSCore
 from agents.supervisor import SupervisorAgent
+from tools.gemini_cli import aask_gemini_with_file
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -50,11 +50,11 @@ class DevAgent(AgentShell):
             json.dump(agents_map, f, indent=2)
         self.log(f"🗺️  agents_map.json updated for {agent_name}")
 
-    def run(self):
+    async def run(self):
         """The main execution logic for the DevAgent."""
         self.log("DevAgent is running.")
         
-        mission = self.memory.load("mission_plan")
+        mission = await self.memory.aload("mission_plan", namespace="DirectorAgent")
         if not mission:
             self.log("No mission plan found in memory. Nothing to do.", level="warning")
             return
@@ -98,11 +98,8 @@ Only return the raw Python code. Do not add any explanation, comments, or markdo
         
         self.log(f"Generating code for {agent_name_to_create} via Gemini CLI...")
         try:
-            result = subprocess.run(
-                ["powershell", "-ExecutionPolicy", "Bypass", "-File", gemini_cli_path, "--yolo"],
-                input=full_prompt, capture_output=True, text=True, encoding="utf-8", errors="ignore"
-            )
-            generated_code = result.stdout.strip()
+            # Runs on the shared CLI worker pool: no shell start-up per prompt, and a timeout.
+            generated_code = await aask_gemini_with_file(full_prompt, caller=self.name)
         except Exception as e:
             self.log(f"Gemini CLI execution failed: {e}", level="error")
             return
@@ -49,7 +49,7 @@ class DirectorAgent(AgentShell):
                 json.dump(mission, f, indent=2)
             
             # Use the shared memory instance to save the plan
-            self.memory.save("mission_plan", mission)
+            self.memory.save("mission_plan", mission, namespace=self.name)
             self.log("📋 Mission plan created and saved successfully.")
         except Exception as e:
             self.log(f"❌ Failed to save mission file: {e}", level="error")
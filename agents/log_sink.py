@@ -0,0 +1,124 @@
+# agents/log_sink.py
+
+import os
+import json
+import time
+import queue
+import atexit
+import logging
+import threading
+
+# Configure logging for this module
+logger = logging.getLogger(__name__)
+
+# Buffered records are written once this many are pending...
+DEFAULT_MAX_BATCH = int(os.getenv("AGENT_LOG_MAX_BATCH", "256"))
+# ...or once the oldest pending record is this many seconds old.
+DEFAULT_FLUSH_INTERVAL = float(os.getenv("AGENT_LOG_FLUSH_INTERVAL", "1.0"))
+
+
+class LogSink:
+    """
+    A shared, queue-backed writer for the per-agent JSON-line log files.
+
+    Agents only enqueue records; a single background thread keeps every log
+    file open and appends records in batches, flushing when `max_batch`
+    records are pending or `flush_interval` seconds have passed. Urgent
+    records (errors) are written and flushed as soon as they arrive.
+    """
+    def __init__(self, max_batch: int = DEFAULT_MAX_BATCH, flush_interval: float = DEFAULT_FLUSH_INTERVAL):
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self._queue: queue.Queue = queue.Queue()
+        self._handles: dict[str, object] = {}
+        self._pending: dict[str, list[str]] = {}
+        self._pending_count = 0
+        self._flush_deadline = None
+        self._closed = False
+        self._writer = threading.Thread(target=self._run, name="AgentLogSink", daemon=True)
+        self._writer.start()
+
+    def write(self, path: str, record: dict, urgent: bool = False):
+        """Queues one JSON-line record for `path`. Never blocks on file I/O."""
+        if self._closed:
+            # Late records after shutdown are written directly rather than lost.
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+            return
+        self._queue.put((path, record, urgent))
+
+    def flush(self, timeout: float | None = None):
+        """Blocks until every record queued so far has been written to disk."""
+        if self._closed:
+            return
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait(timeout)
+
+    def close(self):
+        """Drains the queue, closes every file handle and stops the writer thread."""
+        if self._closed:
+            return
+        self.flush(timeout=10)
+        self._closed = True
+        self._queue.put(None)
+        self._writer.join(timeout=10)
+
+    # --- Writer thread ---
+
+    def _run(self):
+        while True:
+            timeout = max(0.0, self._flush_deadline - time.monotonic()) if self._flush_deadline else None
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                self._write_pending()
+                continue
+
+            if item is None:
+                self._write_pending()
+                for handle in self._handles.values():
+                    handle.close()
+                self._handles.clear()
+                return
+            if isinstance(item, threading.Event):
+                self._write_pending()
+                item.set()
+                continue
+
+            path, record, urgent = item
+            self._pending.setdefault(path, []).append(json.dumps(record) + "\n")
+            self._pending_count += 1
+            if self._flush_deadline is None:
+                self._flush_deadline = time.monotonic() + self.flush_interval
+            if urgent or self._pending_count >= self.max_batch or time.monotonic() >= self._flush_deadline:
+                self._write_pending()
+
+    def _write_pending(self):
+        for path, lines in self._pending.items():
+            try:
+                handle = self._handles.get(path)
+                if handle is None:
+                    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+                    handle = self._handles[path] = open(path, "a", encoding="utf-8")
+                handle.write("".join(lines))
+                handle.flush()
+            except Exception as e:
+                logger.error(f"Failed to write {len(lines)} log record(s) to {path}: {e}")
+        self._pending.clear()
+        self._pending_count = 0
+        self._flush_deadline = None
+
+
+_shared_sink: LogSink | None = None
+_shared_sink_lock = threading.Lock()
+
+
+def get_log_sink() -> LogSink:
+    """Returns the process-wide log sink, creating it (and its atexit drain) on first use."""
+    global _shared_sink
+    with _shared_sink_lock:
+        if _shared_sink is None:
+            _shared_sink = LogSink()
+            atexit.register(_shared_sink.close)
+        return _shared_sink
@@ -32,8 +32,8 @@ class PosterAgent(AgentShell):
         """
         self.log(f"Agent '{self.name}' is running.")
 
-        # 1. Load the necessary information from shared memory.
-        content_to_post = self.memory.load("post_content")
+        # 1. Load the necessary information from shared memory (written by the WriterAgent).
+        content_to_post = await self.memory.aload("post_content", namespace="WriterAgent")
         if not content_to_post:
             self.log("No post content found in memory. Aborting mission.", level="error")
             return
@@ -5,14 +5,19 @@ import logging
 import re
 from datetime import datetime
 import numpy as np
-from tools.gemini_ui_vision import smart_vision_query
+from tools.gemini_ui_vision import asmart_vision_query, is_parseable_json
 from tools.web_controller import WebController
 from tools.display_context import DisplayContext  # To convert physical to logical coordinates
+from tools.change_detector import get_change_detector
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# A click verdict stays valid while nothing changes within this many screen
+# pixels of the click point.
+VERDICT_REGION_MARGIN = 100
+
 class SupervisorAgent:
     """
     Acts as a selective safety and validation layer for other agents.
@@ -22,6 +27,9 @@ class SupervisorAgent:
     def __init__(self):
         self.logs = []
         self.last_perception_pixels: np.ndarray | None = None
+        # Click verdicts for the current screen, keyed by (x, y, task_context).
+        self.click_verdicts: dict[tuple, tuple[bool, str]] = {}
+        self._display_scale: float | None = None
         self.web_controller = WebController()  # Used for resolving selectors only
         self.high_risk_keywords = [
             "post", "delete", "confirm", "purchase", "send", "submit",
@@ -34,7 +42,30 @@ class SupervisorAgent:
         This is crucial for performing visual validation on high-risk actions.
         """
         self.last_perception_pixels = pixels
-        logger.info("Supervisor's perception snapshot has been updated.")
+        dirty_rects = get_change_detector().compare("Supervisor", pixels)
+        self._invalidate_verdicts(dirty_rects)
+        logger.info(f"Supervisor's perception snapshot has been updated ({len(dirty_rects)} changed region(s)).")
+
+    def _invalidate_verdicts(self, dirty_rects: list[dict]):
+        """Drops the click verdicts whose surroundings changed on screen."""
+        if not self.click_verdicts or not dirty_rects:
+            return
+        scale = self._scaling_factor()
+        margin = VERDICT_REGION_MARGIN
+        for key in list(self.click_verdicts):
+            # Verdicts are keyed by logical coordinates; the frame is in physical pixels.
+            px, py = key[0] * scale, key[1] * scale
+            for rect in dirty_rects:
+                if (rect["left"] - margin <= px <= rect["left"] + rect["width"] + margin and
+                        rect["top"] - margin <= py <= rect["top"] + rect["height"] + margin):
+                    del self.click_verdicts[key]
+                    break
+
+    def _scaling_factor(self) -> float:
+        """The display scaling factor, looked up once: logical coordinates times this are frame pixels."""
+        if self._display_scale is None:
+            self._display_scale = DisplayContext.get_scaling_factor()
+        return self._display_scale
 
     def _is_high_risk(self, action: str, task_context: str) -> bool:
         """
@@ -85,14 +116,14 @@ class SupervisorAgent:
             else:
                 coords_str = str(value)
 
-            is_approved, reason = self._validate_click_with_gemini(coords_str, self.last_perception_pixels, task_context)
+            is_approved, reason = await self._validate_click_with_gemini(coords_str, self.last_perception_pixels, task_context)
             self.log_decision(agent_name, action, value, reason)
             return is_approved
 
         self.log_decision(agent_name, action, value, "Yes (Auto-approved)")
         return True
 
-    def _validate_click_with_gemini(self, coords_str: str, pixels: np.ndarray, task_context: str) -> tuple[bool, str]:
+    async def _validate_click_with_gemini(self, coords_str: str, pixels: np.ndarray, task_context: str) -> tuple[bool, str]:
         """
         Asks Gemini to visually confirm if a click at specific coordinates is safe and correct.
         """
@@ -101,9 +132,23 @@ class SupervisorAgent:
         except (ValueError, AttributeError):
             return False, f"Invalid coordinate format: '{coords_str}'"
 
+        # Nothing moved near this point since it was last validated: reuse the verdict.
+        cached = self.click_verdicts.get((x, y, task_context))
+        if cached:
+            logger.info(f"Screen unchanged around ({x},{y}). Reusing previous verdict.")
+            return cached
+
+        # The uploaded screenshot may be downscaled, so give the point on a 0-1000 scale
+        # of the image's width and height, which holds at any resolution. The point is in
+        # logical coordinates and the frame in physical pixels, so scale it back first.
+        height, width = pixels.shape[:2]
+        scale = self._scaling_factor()
+        norm_x, norm_y = round(x * scale * 1000 / width), round(y * scale * 1000 / height)
+
         prompt = f"""
         You are a meticulous safety supervisor for an AI agent.
-        The agent wants to perform a mouse click at logical coordinates (x={x}, y={y}).
+        The agent wants to perform a mouse click at normalized coordinates (x={norm_x}, y={norm_y}),
+        where (0, 0) is the top-left and (1000, 1000) the bottom-right corner of the screenshot.
         The agent's current task is: "{task_context}".
 
         Analyze the provided screenshot. Is there a clearly clickable and relevant UI element
@@ -112,7 +157,8 @@ class SupervisorAgent:
         Respond in JSON only: {{"decision": "Yes/No", "reason": "..."}}.
         """
 
-        response_text = smart_vision_query(pixels, prompt)
+        response_text = await asmart_vision_query(pixels, prompt, profile="validation", validator=is_parseable_json,
+                                                  caller="Supervisor")
         if not response_text:
             return False, "Gemini vision query failed."
 
@@ -128,10 +174,12 @@ class SupervisorAgent:
 
             if decision == "yes":
                 logger.info(f"Gemini approved click at ({x},{y}). Reason: {reason}")
-                return True, f"Yes ({reason})"
+                verdict = True, f"Yes ({reason})"
             else:
                 logger.warning(f"Gemini rejected click at ({x},{y}). Reason: {reason}")
-                return False, f"No ({reason})"
+                verdict = False, f"No ({reason})"
+            self.click_verdicts[(x, y, task_context)] = verdict
+            return verdict
         except (json.JSONDecodeError, IndexError) as e:
             logger.error(f"Failed to parse JSON from Gemini response: {e}")
             return False, f"Failed to parse validation response. Raw text: {response_text}"
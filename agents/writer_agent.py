@@ -9,6 +9,7 @@ from memory.memory import Memory
 import google.generativeai as genai
 from system.agentos_core import AgentOSCore
 from agents.supervisor import SupervisorAgent
+from tools.model_client import get_model_client
 
 # --- FIX: Load environment variables at the top of this module ---
 # This ensures the API key is available as soon as this file is imported.
@@ -25,6 +26,10 @@ if GEMINI_API_KEY:
 else:
     logger.warning("WriterAgent: GEMINI_API_KEY not found. Text generation will fail.")
 
+# Trending hashtags are reused for this many seconds (see tools.response_cache);
+# tweets themselves are never cached, so each run writes a new one.
+HASHTAG_CACHE_TTL = float(os.getenv("WRITER_HASHTAG_CACHE_TTL", "3600"))
+
 class WriterAgent(AgentShell):
     """
     An autonomous agent that generates creative text content (like tweets)
@@ -35,44 +40,42 @@ class WriterAgent(AgentShell):
         # --- FIX: Pass all shared components to the parent class ---
         super().__init__(name=name, core=core, memory=memory, supervisor=supervisor)
         self.task_context = "Write a witty, trending tweet for AgentOS."
-        
-        # Initialize the model once for efficiency
-        if GEMINI_API_KEY:
-            self.model = genai.GenerativeModel("gemini-1.5-flash-latest")
-        else:
-            self.model = None
+        self.model_name = "gemini-1.5-flash-latest"
 
-    def _call_gemini_for_text(self, prompt: str) -> str | None:
-        """A robust, centralized function for making text-based Gemini calls."""
-        if not self.model:
+    async def _call_gemini_for_text(self, prompt: str, cache_ttl: float = 0) -> str | None:
+        """
+        A robust, centralized function for making text-based Gemini calls without blocking the event loop.
+        `cache_ttl` (seconds) lets an identical prompt reuse the previous answer.
+        """
+        if not GEMINI_API_KEY:
             logger.error("Gemini model not initialized due to missing API key.")
             return None
-        try:
-            logger.info(f"Sending text prompt to Gemini: '{prompt[:50]}...'")
-            response = self.model.generate_content(prompt)
-            return response.text.strip()
-        except Exception as e:
-            logger.error(f"Gemini text generation failed: {e}", exc_info=True)
+        logger.info(f"Sending text prompt to Gemini: '{prompt[:50]}...'")
+        text = await get_model_client().atext_query(prompt, models=[self.model_name], cache_ttl=cache_ttl,
+                                                        caller=self.name)
+        if not text:
+            logger.error("Gemini text generation failed.")
             return None
+        return text.strip()
 
     def _is_english_hashtag(self, tag: str) -> bool:
         """Validates if a string is a simple English hashtag."""
         return bool(re.match(r"^#[a-zA-Z0-9_]+$", tag))
 
-    def _get_trending_hashtags(self) -> list[str]:
+    async def _get_trending_hashtags(self) -> list[str]:
         """Fetches and filters trending hashtags."""
         prompt = (
             "List 5 currently trending Twitter hashtags in India. "
             "Only include hashtags. No explanation. Separate with spaces."
         )
-        response_text = self._call_gemini_for_text(prompt)
+        response_text = await self._call_gemini_for_text(prompt, cache_ttl=HASHTAG_CACHE_TTL)
         if not response_text:
             return []
         
         raw_tags = response_text.split()
         return [tag for tag in raw_tags if self._is_english_hashtag(tag)]
 
-    def _write_funny_tweet(self, hashtags: list[str]) -> str:
+    async def _write_funny_tweet(self, hashtags: list[str]) -> str:
         """Writes a short, witty tweet using the provided hashtags."""
         hashtags_str = " ".join(hashtags)
         prompt = (
@@ -80,13 +83,13 @@ class WriterAgent(AgentShell):
             f"Tone: witty, funny, sarcastic, like a clever human motivating with humor.\n"
             f"Keep under 280 characters. No emojis. Use only the given hashtags."
         )
-        return self._call_gemini_for_text(prompt) or ""
+        return await self._call_gemini_for_text(prompt) or ""
 
-    def run(self):
+    async def run(self):
         """The main execution logic for the WriterAgent."""
         self.log("Fetching trending topics to write a new post...")
         
-        hashtags = self._get_trending_hashtags()
+        hashtags = await self._get_trending_hashtags()
         if len(hashtags) < 2:
             self.log("Not enough valid hashtags found, using fallback topics.", level="warning")
             hashtags_to_use = ["#StartupLife", "#BuildWithAI"]
@@ -95,7 +98,7 @@ class WriterAgent(AgentShell):
 
         self.log(f"Using hashtags: {' '.join(hashtags_to_use)}")
         
-        tweet = self._write_funny_tweet(hashtags_to_use)
+        tweet = await self._write_funny_tweet(hashtags_to_use)
 
         # Fallback if the model fails to generate a good tweet
         if not tweet or len(tweet) < 20:
@@ -103,7 +106,7 @@ class WriterAgent(AgentShell):
             tweet = f"Make progress, not excuses. {hashtags_to_use[0]} {hashtags_to_use[1]}"
 
         # Save the final content to the shared memory instance
-        self.memory.save("post_content", tweet)
+        await self.memory.asave("post_content", tweet, namespace=self.name)
         self.log(f"New tweet generated: \"{tweet}\"")
         self.log("✅ Tweet saved to memory for PosterAgent.")
         self.log("Work complete. Handing off to the next agent.")
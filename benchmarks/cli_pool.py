@@ -0,0 +1,101 @@
+# benchmarks/cli_pool.py
+"""
+Compares starting a new interpreter per Gemini CLI prompt (the old
+subprocess.run path) with the persistent worker pool in tools/gemini_cli.py.
+
+A small stand-in CLI script is generated that reads the prompt from stdin
+and answers after --work seconds, so only the process handling differs.
+The interpreter start-up saved depends heavily on the shell: negligible for
+bash, hundreds of milliseconds for PowerShell.
+
+Usage:
+    python benchmarks/cli_pool.py [--shell bash] [--prompts 40] [--workers 2] [--work 0.0]
+"""
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from tools.gemini_cli import GeminiCliPool
+
+FAKE_CLIS = {
+    "posix": ('#!/bin/sh\nprompt=$(cat)\nsleep {work}\necho "answer to ${{#prompt}} chars"\n', ".sh"),
+    "powershell": ('$prompt = @($input) -join "`n"\nStart-Sleep -Milliseconds {work_ms}\n'
+                   '"answer to $($prompt.Length) chars"\n', ".ps1"),
+}
+
+
+def write_fake_cli(shell: str, work: float) -> str:
+    template, suffix = FAKE_CLIS["powershell" if shell in ("powershell", "pwsh") else "posix"]
+    fd, path = tempfile.mkstemp(prefix="fake_gemini_cli-", suffix=suffix)
+    with os.fdopen(fd, "w") as f:
+        f.write(template.format(work=work, work_ms=int(work * 1000)))
+    os.chmod(path, 0o755)
+    return path
+
+
+def spawn_per_prompt(shell: str, cli_path: str, prompt: str) -> str:
+    if shell in ("powershell", "pwsh"):
+        command = [shell, "-NoProfile", "-ExecutionPolicy", "Bypass", "-File", cli_path, "--yolo"]
+    else:
+        command = [shell, cli_path, "--yolo"]
+    result = subprocess.run(command, input=prompt, capture_output=True, text=True, encoding="utf-8", errors="ignore")
+    return result.stdout.strip()
+
+
+async def pooled(pool: GeminiCliPool, prompts: list[str]) -> tuple[list[float], float]:
+    """Per-prompt latency one at a time, then the wall time of all prompts submitted at once."""
+    latencies = []
+    for prompt in prompts:
+        start = time.perf_counter()
+        await pool.ask(prompt)
+        latencies.append(time.perf_counter() - start)
+    start = time.perf_counter()
+    await asyncio.gather(*(pool.ask(p) for p in prompts))
+    return latencies, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Gemini CLI: spawn-per-prompt vs. persistent worker pool.")
+    parser.add_argument("--shell", default="bash", choices=["bash", "sh", "pwsh", "powershell"])
+    parser.add_argument("--prompts", type=int, default=40)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--work", type=float, default=0.0, help="Seconds the stand-in CLI takes per prompt.")
+    args = parser.parse_args()
+
+    cli_path = write_fake_cli(args.shell, args.work)
+    prompts = [f"Prompt {i}: " + "x" * 2000 for i in range(args.prompts)]
+    try:
+        start = time.perf_counter()
+        spawned = []
+        for prompt in prompts:
+            t = time.perf_counter()
+            spawn_per_prompt(args.shell, cli_path, prompt)
+            spawned.append(time.perf_counter() - t)
+        spawn_total = time.perf_counter() - start
+
+        pool = GeminiCliPool(size=args.workers, shell=args.shell, cli_path=cli_path, timeout=30)
+        start = time.perf_counter()
+        asyncio.run(pool.ask(prompts[0]))
+        first = time.perf_counter() - start
+        latencies, pool_total = asyncio.run(pooled(pool, prompts))
+        pool.close()
+    finally:
+        os.remove(cli_path)
+
+    # Latency columns: one prompt at a time. Throughput: the pool gets all prompts at once.
+    print(f"{'mode':>16} {'p50 ms':>8} {'max ms':>8} {'total s':>8} {'prompts/s':>10}")
+    print(f"{'spawn/prompt':>16} {statistics.median(spawned) * 1000:>8.1f} {max(spawned) * 1000:>8.1f} "
+          f"{spawn_total:>8.2f} {len(prompts) / spawn_total:>10.1f}")
+    print(f"{f'pool x{args.workers}':>16} {statistics.median(latencies) * 1000:>8.1f} {max(latencies) * 1000:>8.1f} "
+          f"{pool_total:>8.2f} {len(prompts) / pool_total:>10.1f}")
+    print(f"(first pooled prompt, including worker start-up: {first * 1000:.1f} ms)")
@@ -0,0 +1,389 @@
+# benchmarks/fake_model_server.py
+"""
+A local stand-in for the Gemini API with programmable latency, for
+benchmarking and exercising the model client without network or quota.
+
+Every model has a profile: a base latency plus jitter, an optional slow
+tail (a fraction of requests that take much longer), error / invalid
+response rates and a requests-per-minute limit answered with HTTP 429.
+Profiles can be set on start-up or changed while running
+(POST /control). `connect_latency` delays the first response on every new
+connection, standing in for the TLS and channel set-up a real API call
+pays when it cannot reuse a connection.
+
+FakeModelTransport plugs the server into ModelClient, one connection per
+request:
+
+    server = FakeModelServer(profiles={"flash": {"latency": 0.3, "tail_rate": 0.1, "tail_latency": 4}})
+    server.start()
+    client = ModelClient(transport=FakeModelTransport(server.url))
+
+FakeGenerativeModel mimics the SDK's GenerativeModel instead, keeping its
+connections open between calls; fake_model_factory(url) builds them for a
+tools.model_client.ModelRegistry.
+
+Usage (standalone):
+    python benchmarks/fake_model_server.py [--port 8765] [--latency flash=0.3,pro=0.9] [--tail flash=0.1:4]
+                                           [--connect-latency 0.1]
+"""
+
+import json
+import time
+import random
+import asyncio
+import argparse
+import threading
+from urllib.parse import urlparse
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+DEFAULT_RESPONSE = '{"reasoning": "Fake model response.", "action": {"name": "FINISH", "reason": "fake"}}'
+DEFAULT_PROFILE = {
+    "latency": 0.2,        # Seconds before the response is sent.
+    "jitter": 0.0,         # Uniform +/- seconds added to the latency.
+    "tail_rate": 0.0,      # Fraction of requests that take tail_latency instead.
+    "tail_latency": 5.0,
+    "error_rate": 0.0,     # Fraction answered with HTTP 500.
+    "invalid_rate": 0.0,   # Fraction answered with text that is not JSON.
+    "rate_limit": 0.0,     # Requests per minute (a token bucket) before HTTP 429; 0 is unlimited.
+    "response": DEFAULT_RESPONSE,
+    # Streaming (POST /models/<model>:streamGenerateContent): the reply is sent
+    # in pieces of this many characters, this many seconds apart, after `latency`.
+    "stream_chunk_chars": 16,
+    "stream_interval": 0.0,
+}
+RATE_LIMITED_ERROR = "429 Resource has been exhausted (e.g. check quota)."
+INVALID_RESPONSE = "I am not sure what is on the screen. It looks like a page with several buttons and a text box."
+
+
+class FakeModelServer:
+    """A threaded HTTP server answering POST /models/<model>:generateContent after a programmed delay."""
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, profiles: dict | None = None, seed: int = 0,
+                 connect_latency: float = 0.0):
+        self.connect_latency = connect_latency
+        self.connections = 0
+        self.profiles: dict[str, dict] = {}
+        self.stats: dict[str, dict] = {}
+        self._buckets: dict[str, list[float]] = {}  # model -> [level, last refill]
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        for model, profile in (profiles or {}).items():
+            self.set_profile(model, **profile)
+        self._httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self._httpd.daemon_threads = True
+        self._thread: threading.Thread | None = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def set_profile(self, model: str, **settings):
+        with self._lock:
+            self.profiles[model] = {**DEFAULT_PROFILE, **self.profiles.get(model, {}), **settings}
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="FakeModelServer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def _plan(self, model: str) -> tuple[float, str, dict]:
+        """Draws the latency and outcome ("ok", "error", "invalid" or "rate_limited") of one request."""
+        with self._lock:
+            profile = self.profiles.get(model) or {**DEFAULT_PROFILE}
+            rng = self._rng
+            if rng.random() < profile["tail_rate"]:
+                latency = profile["tail_latency"]
+            else:
+                latency = max(0.0, profile["latency"] + rng.uniform(-profile["jitter"], profile["jitter"]))
+            roll = rng.random()
+            if not self._within_rate_limit(model, profile["rate_limit"]):
+                latency, outcome = 0.0, "rate_limited"
+            elif roll < profile["error_rate"]:
+                outcome = "error"
+            elif roll < profile["error_rate"] + profile["invalid_rate"]:
+                outcome = "invalid"
+            else:
+                outcome = "ok"
+            counters = self.stats.setdefault(model, {"requests": 0, "error": 0, "invalid": 0, "rate_limited": 0, "ok": 0})
+            counters["requests"] += 1
+            counters[outcome] += 1
+        return latency, outcome, profile
+
+    def _within_rate_limit(self, model: str, per_minute: float) -> bool:
+        if per_minute <= 0:
+            return True
+        now = time.monotonic()
+        bucket = self._buckets.setdefault(model, [per_minute, now])
+        bucket[0] = min(per_minute, bucket[0] + (now - bucket[1]) * per_minute / 60.0)
+        bucket[1] = now
+        if bucket[0] < 1:
+            return False
+        bucket[0] -= 1
+        return True
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # Keep-alive, unless the client asks to close.
+            disable_nagle_algorithm = True  # Headers and body go out separately; don't hold the body back.
+
+            def setup(self):
+                super().setup()
+                with server._lock:
+                    server.connections += 1
+                time.sleep(server.connect_latency)
+
+            def log_message(self, format, *args):
+                pass  # Keep benchmark output clean.
+
+            def _reply(self, status: int, payload: dict):
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                try:
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # The client cancelled the request.
+
+            def do_GET(self):
+                if self.path == "/stats":
+                    with server._lock:
+                        self._reply(200, {"stats": server.stats, "profiles": server.profiles,
+                                          "connections": server.connections})
+                else:
+                    self._reply(404, {"error": "not found"})
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", "0"))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                if self.path == "/control":
+                    for model, settings in body.items():
+                        server.set_profile(model, **settings)
+                    self._reply(200, {"profiles": server.profiles})
+                    return
+                if self.path.startswith("/models/") and self.path.endswith(":countTokens"):
+                    self._reply(200, {"total_tokens": sum(len(str(part).split()) for part in body.get("contents", []))})
+                    return
+                if self.path.startswith("/models/") and self.path.endswith(":streamGenerateContent"):
+                    self._stream(self.path[len("/models/"):-len(":streamGenerateContent")])
+                    return
+                if not (self.path.startswith("/models/") and self.path.endswith(":generateContent")):
+                    self._reply(404, {"error": "not found"})
+                    return
+                model = self.path[len("/models/"):-len(":generateContent")]
+                latency, outcome, profile = server._plan(model)
+                # Without streaming, the whole reply has to be generated before anything is sent.
+                pieces = -(-len(profile["response"]) // max(1, profile["stream_chunk_chars"]))
+                time.sleep(latency + max(0, pieces - 1) * profile["stream_interval"])
+                if outcome == "rate_limited":
+                    self._reply(429, {"error": RATE_LIMITED_ERROR})
+                elif outcome == "error":
+                    self._reply(500, {"error": f"Simulated failure of {model}."})
+                elif outcome == "invalid":
+                    self._reply(200, {"text": INVALID_RESPONSE})
+                else:
+                    self._reply(200, {"text": profile["response"]})
+
+            def _stream(self, model: str):
+                """Sends the reply as chunked JSON lines ({"text": piece}), one piece per stream_interval."""
+                latency, outcome, profile = server._plan(model)
+                time.sleep(latency)
+                if outcome == "rate_limited":
+                    self._reply(429, {"error": RATE_LIMITED_ERROR})
+                    return
+                if outcome == "error":
+                    self._reply(500, {"error": f"Simulated failure of {model}."})
+                    return
+                text = INVALID_RESPONSE if outcome == "invalid" else profile["response"]
+                size = max(1, profile["stream_chunk_chars"])
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                try:
+                    for start in range(0, len(text), size):
+                        if start:
+                            time.sleep(profile["stream_interval"])
+                        data = json.dumps({"text": text[start:start + size]}).encode("utf-8")
+                        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+                    self.wfile.write(b"0\r\n\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    self.close_connection = True  # The client stopped reading early.
+
+        return Handler
+
+
+class FakeModelTransport:
+    """A ModelClient transport that sends requests to a FakeModelServer over plain HTTP."""
+    def __init__(self, url: str):
+        parsed = urlparse(url)
+        self.host, self.port = parsed.hostname, parsed.port
+
+    @property
+    def ready(self) -> bool:
+        return True
+
+    async def generate(self, model_name: str, contents: list, generation_config: dict | None) -> str | None:
+        # Images travel as their size only; the fake server does not look at them.
+        parts = [part if isinstance(part, str) else {"mime_type": part["mime_type"], "bytes": len(part["data"])}
+                 for part in contents]
+        body = json.dumps({"contents": parts, "generation_config": generation_config}).encode("utf-8")
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        try:
+            writer.write(
+                f"POST /models/{model_name}:generateContent HTTP/1.1\r\n"
+                f"Host: {self.host}\r\nContent-Type: application/json\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode("ascii") + body
+            )
+            await writer.drain()
+            raw = await reader.read()
+        finally:
+            writer.close()
+        head, _, payload = raw.partition(b"\r\n\r\n")
+        status = int(head.split(b" ", 2)[1])
+        data = json.loads(payload or b"{}")
+        if status != 200:
+            raise RuntimeError(data.get("error", f"HTTP {status}"))
+        return data.get("text")
+
+
+class _Response:
+    def __init__(self, text: str | None):
+        self.text = text
+
+
+class FakeGenerativeModel:
+    """
+    A stand-in for genai.GenerativeModel that talks to a FakeModelServer.
+    Like the SDK's client, it keeps its connections open and reuses them
+    for later calls; concurrent calls each get their own connection.
+    """
+    connections_opened = 0  # Across all instances, for benchmarks.
+
+    def __init__(self, url: str, model_name: str, generation_config: dict | None = None):
+        parsed = urlparse(url)
+        self.host, self.port = parsed.hostname, parsed.port
+        self.model_name = model_name
+        self.generation_config = generation_config
+        self._idle: list[tuple] = []
+
+    async def generate_content_async(self, contents: list, stream: bool = False):
+        parts = [part if isinstance(part, str) else {"mime_type": part["mime_type"], "bytes": len(part["data"])}
+                 for part in contents]
+        payload = {"contents": parts, "generation_config": self.generation_config}
+        if stream:
+            return _FakeStream(self, f"/models/{self.model_name}:streamGenerateContent", payload)
+        status, data = await self._post(f"/models/{self.model_name}:generateContent", payload)
+        if status != 200:
+            raise RuntimeError(data.get("error", f"HTTP {status}"))
+        return _Response(data.get("text"))
+
+    async def count_tokens_async(self, contents) -> dict:
+        status, data = await self._post(f"/models/{self.model_name}:countTokens", {"contents": [contents]})
+        return data
+
+    async def _post(self, path: str, payload: dict) -> tuple[int, dict]:
+        reader, writer = await self._connect()
+        try:
+            status, head = await self._send(reader, writer, path, payload)
+            data = json.loads(await reader.readexactly(_content_length(head)))
+        except BaseException:
+            writer.close()  # Half-read or cancelled: the connection cannot be reused.
+            raise
+        self._idle.append((reader, writer))
+        return status, data
+
+    async def _stream(self, path: str, payload: dict):
+        reader, writer = await self._connect()
+        try:
+            status, head = await self._send(reader, writer, path, payload)
+            if status != 200:
+                data = json.loads(await reader.readexactly(_content_length(head)))
+                self._idle.append((reader, writer))
+                raise RuntimeError(data.get("error", f"HTTP {status}"))
+            while True:
+                size = int((await reader.readline()).strip(), 16)
+                if size == 0:
+                    await reader.readline()
+                    break
+                data = json.loads(await reader.readexactly(size))
+                await reader.readline()
+                yield _Response(data.get("text"))
+        except RuntimeError:
+            raise
+        except BaseException:
+            writer.close()  # Stopped mid-stream: the rest of the reply is still in flight.
+            raise
+        self._idle.append((reader, writer))
+
+    async def _connect(self) -> tuple:
+        if self._idle:
+            return self._idle.pop()
+        FakeGenerativeModel.connections_opened += 1
+        return await asyncio.open_connection(self.host, self.port)
+
+    async def _send(self, reader, writer, path: str, payload: dict) -> tuple[int, bytes]:
+        body = json.dumps(payload).encode("utf-8")
+        writer.write(
+            f"POST {path} HTTP/1.1\r\nHost: {self.host}\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n\r\n".encode("ascii") + body
+        )
+        await writer.drain()
+        head = await reader.readuntil(b"\r\n\r\n")
+        return int(head.split(b" ", 2)[1]), head
+
+
+class _FakeStream:
+    """The async-iterable reply of generate_content_async(stream=True), yielding text chunks."""
+    def __init__(self, model: FakeGenerativeModel, path: str, payload: dict):
+        self._chunks = model._stream(path, payload)
+
+    def __aiter__(self):
+        return self._chunks
+
+
+def _content_length(head: bytes) -> int:
+    return next(int(line.split(b":", 1)[1]) for line in head.split(b"\r\n")
+                if line.lower().startswith(b"content-length:"))
+
+
+def fake_model_factory(url: str):
+    """A ModelRegistry factory building FakeGenerativeModels for the server at `url`."""
+    def factory(model_name: str, generation_config: dict | None):
+        return FakeGenerativeModel(url, model_name, generation_config)
+    return factory
+
+
+def _parse_pairs(value: str) -> dict[str, str]:
+    return dict(item.split("=", 1) for item in value.split(",") if item)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake Gemini-like model server with programmable latency.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", default="flash=0.3,pro=0.9", help="model=seconds,...")
+    parser.add_argument("--tail", default="", help="model=rate:seconds,... (slow-tail requests)")
+    parser.add_argument("--error-rate", default="", help="model=rate,...")
+    parser.add_argument("--connect-latency", type=float, default=0.0, help="Seconds added to each new connection.")
+    args = parser.parse_args()
+
+    server = FakeModelServer(args.host, args.port, connect_latency=args.connect_latency)
+    for model, seconds in _parse_pairs(args.latency).items():
+        server.set_profile(model, latency=float(seconds))
+    for model, spec in _parse_pairs(args.tail).items():
+        rate, seconds = spec.split(":")
+        server.set_profile(model, tail_rate=float(rate), tail_latency=float(seconds))
+    for model, rate in _parse_pairs(args.error_rate).items():
+        server.set_profile(model, error_rate=float(rate))
+    print(f"Fake model server listening on {server.url}")
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
@@ -0,0 +1,90 @@
+# benchmarks/frame_conversion.py
+"""
+Compares the per-frame cost of turning a raw BGRA screen grab into an RGB
+array and a WebP-ready PIL image, at common capture resolutions:
+
+    copy  - the previous pipeline: BGRA -> packed RGB bytes (as mss's .rgb
+            does), Image.frombytes, np.array, then .astype("uint8") before
+            encoding.
+    frame - ScreenFrame: a view over the raw buffer, one conversion into a
+            pooled RGB buffer, and PIL decoding BGRX directly for the image.
+
+Memory is the tracemalloc peak per frame (Python and NumPy allocations;
+PIL's own image storage is not traced, in either pipeline).
+
+Usage:
+    python benchmarks/frame_conversion.py [--resolutions 1920x1080,2560x1440,3840x2160] [--iterations 20]
+"""
+
+import os
+import sys
+import time
+import argparse
+import statistics
+import tracemalloc
+import numpy as np
+from PIL import Image
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from tools.frame import ScreenFrame, RgbBufferPool, to_pil_image
+
+
+def synthetic_grab(width: int, height: int) -> bytearray:
+    rng = np.random.default_rng(0)
+    return bytearray(rng.integers(0, 256, size=width * height * 4, dtype=np.uint8).tobytes())
+
+
+def copy_pipeline(raw: bytearray, width: int, height: int):
+    # What mss's ScreenShot.rgb does: repack BGRA into RGB bytes.
+    rgb = bytearray(width * height * 3)
+    rgb[0::3], rgb[1::3], rgb[2::3] = raw[2::4], raw[1::4], raw[0::4]
+    pixels = np.array(Image.frombytes("RGB", (width, height), bytes(rgb)))
+    image = Image.fromarray(pixels.astype("uint8"), "RGB")
+    return pixels, image
+
+
+def frame_pipeline(raw: bytearray, width: int, height: int, pool: RgbBufferPool):
+    frame = ScreenFrame(raw, width, height, pool=pool)
+    # Converts into a pooled buffer, lent only for the block so it can be recycled below.
+    with frame.lease_rgb():
+        pass
+    image = to_pil_image(frame)
+    frame.recycle()
+    return frame, image
+
+
+def measure(fn, iterations: int) -> tuple[list[float], int]:
+    fn()  # Warm-up (and, for the frame pipeline, fills the buffer pool).
+    latencies = []
+    peak = 0
+    for _ in range(iterations):
+        tracemalloc.start()
+        start = time.perf_counter()
+        fn()
+        latencies.append((time.perf_counter() - start) * 1000)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return latencies, peak
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Screen frame conversion benchmark.")
+    parser.add_argument("--resolutions", default="1920x1080,2560x1440,3840x2160")
+    parser.add_argument("--iterations", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'resolution':>11} {'pipeline':>8} {'p50 ms':>9} {'max ms':>9} {'peak MB':>9}")
+    for resolution in args.resolutions.split(","):
+        width, height = (int(v) for v in resolution.split("x"))
+        raw = synthetic_grab(width, height)
+        pool = RgbBufferPool()
+        runs = {
+            "copy": lambda: copy_pipeline(raw, width, height),
+            "frame": lambda: frame_pipeline(raw, width, height, pool),
+        }
+        for name, fn in runs.items():
+            latencies, peak = measure(fn, args.iterations)
+            print(f"{resolution:>11} {name:>8} {statistics.median(latencies):>9.2f} {max(latencies):>9.2f} {peak / 1024 ** 2:>9.1f}")
@@ -0,0 +1,86 @@
+# benchmarks/hedging.py
+"""
+Compares sequential model fallback with hedged requests against the fake
+model server. The primary model is usually fast but has a slow tail (and
+some failures); the fallback is slower but steady. Reports end-to-end
+latency percentiles plus the client's hedge and win statistics.
+
+Usage:
+    python benchmarks/hedging.py [--requests 200] [--tail-rate 0.1] [--tail-latency 4] [--error-rate 0.02]
+"""
+
+import os
+import sys
+import time
+import asyncio
+import logging
+import argparse
+import statistics
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from benchmarks.fake_model_server import FakeModelServer, FakeModelTransport
+from tools.model_client import ModelClient
+from tools.model_router import ModelRouter
+from tools.request_scheduler import RequestScheduler
+from tools.gemini_ui_vision import is_parseable_json
+
+MODELS = ["flash", "pro"]
+
+
+async def run(client: ModelClient, requests: int, concurrency: int) -> list[float]:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(i: int):
+        async with semaphore:
+            start = time.perf_counter()
+            await client.atext_query(f"request {i}", models=MODELS, validator=is_parseable_json)
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    return sorted(latencies)
+
+
+def percentile(ordered: list[float], p: float) -> float:
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Hedged vs. sequential model fallback benchmark.")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--primary-latency", type=float, default=0.3)
+    parser.add_argument("--fallback-latency", type=float, default=0.9)
+    parser.add_argument("--tail-rate", type=float, default=0.1)
+    parser.add_argument("--tail-latency", type=float, default=4.0)
+    parser.add_argument("--error-rate", type=float, default=0.02)
+    parser.add_argument("--timeout", type=float, default=10.0)
+    args = parser.parse_args()
+
+    server = FakeModelServer(profiles={
+        "flash": {"latency": args.primary_latency, "jitter": args.primary_latency / 4, "tail_rate": args.tail_rate,
+                  "tail_latency": args.tail_latency, "error_rate": args.error_rate},
+        "pro": {"latency": args.fallback_latency, "jitter": args.fallback_latency / 10},
+    })
+    server.start()
+    # Per-attempt log lines would drown the results.
+    logging.disable(logging.WARNING)
+
+    print(f"{'mode':>10} {'p50 s':>7} {'p95 s':>7} {'p99 s':>7} {'max s':>7} {'hedge rate':>11} {'hedge wins':>11}")
+    for hedging in (False, True):
+        # No per-minute budget: the fake server has no rate limit, and the burst would exceed the default.
+        client = ModelClient(timeout=args.timeout, hedging=hedging, transport=FakeModelTransport(server.url),
+                             router=ModelRouter(state_path=None),
+                             scheduler=RequestScheduler(args.concurrency * 2, rpm=0, tpm=0))
+        latencies = asyncio.run(run(client, args.requests, args.concurrency))
+        stats = client.hedge_stats()
+        client.close()
+        print(f"{'hedged' if hedging else 'sequential':>10} {statistics.median(latencies):>7.2f} "
+              f"{percentile(latencies, 95):>7.2f} {percentile(latencies, 99):>7.2f} {latencies[-1]:>7.2f} "
+              f"{stats['hedge_rate']:>11.1%} {stats['hedge_win_rate']:>11.1%}")
+        print(f"{'':>10} wins: {stats['wins']}, failed: {stats['failed_requests']}, "
+              f"hedge delays: { {m: round(d, 2) for m, d in stats['hedge_delays'].items()} }")
+    server.stop()
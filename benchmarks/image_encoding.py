@@ -0,0 +1,89 @@
+# benchmarks/image_encoding.py
+"""
+Measures WebP encode time against payload size for vision uploads, per
+capture resolution, across downscale targets and quality settings (and the
+named per-call-site profiles). The test image is a synthetic UI screenshot:
+flat panels, text-like strokes and a photo-like region, which compresses
+much like a real page.
+
+Usage:
+    python benchmarks/image_encoding.py [--resolutions 1920x1080,2560x1440,3840x2160]
+                                        [--max-sides full,1920,1280,1024] [--qualities 95,85,70] [--iterations 5]
+"""
+
+import os
+import sys
+import time
+import argparse
+import statistics
+import numpy as np
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from tools.image_encoder import ENCODING_PROFILES, ImageEncoder
+
+
+def synthetic_screenshot(width: int, height: int) -> np.ndarray:
+    rng = np.random.default_rng(0)
+    pixels = np.full((height, width, 3), 245, dtype=np.uint8)
+    # Sidebar, header and a few cards.
+    pixels[:, : width // 6] = (30, 39, 50)
+    pixels[: height // 12] = (255, 255, 255)
+    for i in range(6):
+        top = height // 10 + i * height // 7
+        pixels[top: top + height // 9, width // 4: width * 3 // 4] = 255
+        # Text-like strokes: short dark runs on the card.
+        for line in range(4):
+            y = top + 12 + line * 18
+            if y + 3 >= height:
+                break
+            starts = rng.integers(width // 4 + 10, width * 3 // 4 - 60, size=25)
+            for x in starts:
+                pixels[y: y + 3, x: x + rng.integers(8, 50)] = 20
+    # A photo-like region (noisy gradient), e.g. an embedded image.
+    h, w = height // 4, width // 5
+    gradient = np.linspace(0, 200, w, dtype=np.float32)[None, :, None]
+    photo = gradient + rng.normal(0, 18, size=(h, w, 3))
+    top, left = height // 2, width * 3 // 5
+    pixels[top: top + h, left: left + w] = np.clip(photo, 0, 255).astype(np.uint8)
+    return pixels
+
+
+def measure(encoder: ImageEncoder, pixels: np.ndarray, profile: str, iterations: int) -> tuple[float, int]:
+    latencies = []
+    size = 0
+    for _ in range(iterations):
+        start = time.perf_counter()
+        size = len(encoder._encode(pixels, profile))
+        latencies.append((time.perf_counter() - start) * 1000)
+    return statistics.median(latencies), size
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Vision upload encoding benchmark.")
+    parser.add_argument("--resolutions", default="1920x1080,2560x1440,3840x2160")
+    parser.add_argument("--max-sides", default="full,1920,1280,1024")
+    parser.add_argument("--qualities", default="95,85,70")
+    parser.add_argument("--iterations", type=int, default=5)
+    args = parser.parse_args()
+
+    encoder = ImageEncoder(workers=1)
+    # Ad-hoc profiles for the sweep, next to the named ones.
+    settings = []
+    for max_side in args.max_sides.split(","):
+        for quality in args.qualities.split(","):
+            name = f"{max_side}/q{quality}"
+            ENCODING_PROFILES[name] = {"max_side": None if max_side == "full" else int(max_side), "quality": int(quality)}
+            settings.append(name)
+    settings += ["planning", "validation", "analysis", "default"]
+
+    print(f"{'resolution':>11} {'setting':>14} {'encode ms':>10} {'payload KB':>11}")
+    for resolution in args.resolutions.split(","):
+        width, height = (int(v) for v in resolution.split("x"))
+        pixels = synthetic_screenshot(width, height)
+        for name in settings:
+            median_ms, size = measure(encoder, pixels, name, args.iterations)
+            print(f"{resolution:>11} {name:>14} {median_ms:>10.1f} {size / 1024:>11.1f}")
+    encoder.close()
@@ -0,0 +1,100 @@
+# benchmarks/log_scan_scaling.py
+"""
+Measures log-analysis throughput (lines/sec) of LogScanner.aggregate() as
+the number of worker processes grows. Synthetic per-agent JSON-line logs
+of the requested total size are generated once and then analysed from
+scratch for every worker count.
+
+Usage:
+    python benchmarks/log_scan_scaling.py [--size-gb 2] [--files 8] [--workers 1,2,4,8] [--json-parser auto]
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from memory.memory import Memory
+from memory.stores import JsonFileStore
+from system.log_scanner import LogScanner
+from system.error_aggregator import ErrorAggregator
+
+AGENTS = ["WriterAgent", "PosterAgent", "DirectorAgent", "DevAgent"]
+MESSAGES = [
+    ("info", "Generated post content. Handing off to PosterAgent."),
+    ("info", "Perceiving environment at step {n}."),
+    ("warning", "Retrying vision query ({n} of 3)."),
+    ("error", "❌ Supervisor blocked DOM click on div[data-testid=tweetButton] at ({n}, {m})."),
+    ("error", "Web controller failed to initialize after {n} ms. Aborting task."),
+]
+
+
+def generate_logs(folder: str, total_bytes: int, files: int) -> int:
+    """Writes `files` log files of roughly total_bytes in all. Returns the line count."""
+    rng = random.Random(42)
+    per_file = total_bytes // files
+    lines = 0
+    for i in range(files):
+        agent = AGENTS[i % len(AGENTS)]
+        with open(os.path.join(folder, f"{agent}_{i}.json"), "w", encoding="utf-8") as f:
+            written = 0
+            chunk = []
+            while written < per_file:
+                level, message = MESSAGES[rng.randrange(len(MESSAGES))]
+                line = json.dumps({
+                    "timestamp": f"2025-07-23T01:{rng.randrange(60):02d}:{rng.randrange(60):02d}.000000",
+                    "agent": agent,
+                    "level": level,
+                    "message": message.format(n=rng.randrange(1000), m=rng.randrange(1000))
+                }) + "\n"
+                chunk.append(line)
+                written += len(line.encode("utf-8"))
+                if len(chunk) >= 10000:
+                    f.write("".join(chunk))
+                    lines += len(chunk)
+                    chunk = []
+            f.write("".join(chunk))
+            lines += len(chunk)
+    return lines
+
+
+def run(folder: str, workers: int, json_parser: str, shard_mb: int) -> tuple[float, int]:
+    with tempfile.TemporaryDirectory() as tmp:
+        memory = Memory(store=JsonFileStore(os.path.join(tmp, "memory.json")), archive_path=None,
+                        lock_path=os.path.join(tmp, "memory.lock"))
+        scanner = LogScanner(folder, memory, consumer="Benchmark", workers=workers,
+                             json_parser=json_parser, shard_bytes=shard_mb * 1024 * 1024)
+        aggregator = ErrorAggregator()
+        start = time.perf_counter()
+        scanner.aggregate(aggregator)
+        elapsed = time.perf_counter() - start
+        memory.close()
+    return elapsed, len(aggregator.errors)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Log analysis scaling benchmark.")
+    parser.add_argument("--size-gb", type=float, default=2.0)
+    parser.add_argument("--files", type=int, default=8)
+    parser.add_argument("--workers", default="1,2,4,8")
+    parser.add_argument("--json-parser", default="auto", choices=["auto", "json", "orjson"])
+    parser.add_argument("--shard-mb", type=int, default=64)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        print(f"Generating {args.size_gb:g} GB of synthetic logs in {args.files} files...")
+        lines = generate_logs(folder, int(args.size_gb * 1024 ** 3), args.files)
+        print(f"{lines} lines written.\n")
+        print(f"{'workers':>8} {'seconds':>10} {'lines/sec':>14} {'speedup':>8} {'distinct':>9}")
+        baseline = None
+        for workers in [int(w) for w in args.workers.split(",")]:
+            elapsed, distinct = run(folder, workers, args.json_parser, args.shard_mb)
+            baseline = baseline or elapsed
+            print(f"{workers:>8} {elapsed:>10.2f} {lines / elapsed:>14,.0f} {baseline / elapsed:>7.2f}x {distinct:>9}")
@@ -0,0 +1,74 @@
+# benchmarks/memory_write_latency.py
+"""
+Measures single-key write latency of the memory storage engines as the
+store grows. The JSON document rewrites everything on each write, so its
+latency climbs with the key count; the append-only log should stay flat.
+
+Usage:
+    python benchmarks/memory_write_latency.py [--sizes 1000,5000,10000,20000,40000] [--samples 200]
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+import statistics
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from memory.stores import JsonFileStore
+from memory.log_store import LogStructuredStore
+
+# A value roughly the size of a typical agent handoff (a tweet plus metadata).
+SAMPLE_VALUE = {"text": "x" * 200, "tags": ["#StartupLife", "#BuildWithAI"], "step": 1}
+
+
+def grow_store(store, current_size: int, target_size: int):
+    batch = {f"key_{i}": SAMPLE_VALUE for i in range(current_size, target_size)}
+    store.write_batch(batch)
+
+
+def measure_writes(store, key_space: int, samples: int) -> list[float]:
+    latencies = []
+    for i in range(samples):
+        key = f"key_{(i * 7919) % key_space}"
+        start = time.perf_counter()
+        store.write_batch({key: SAMPLE_VALUE})
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def run(backend: str, sizes: list[int], samples: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        if backend == "json":
+            store = JsonFileStore(os.path.join(tmp, "memory.json"))
+            store.load_all()
+        else:
+            # Skip fsync so the numbers reflect the engine, not the disk.
+            store = LogStructuredStore(os.path.join(tmp, "memory.log"), fsync=False)
+
+        print(f"\n--- {backend} store ---")
+        print(f"{'keys':>8} {'p50 ms':>10} {'p95 ms':>10} {'max ms':>10}")
+        current = 0
+        for size in sizes:
+            grow_store(store, current, size)
+            current = size
+            latencies = sorted(measure_writes(store, size, samples))
+            p95 = latencies[int(len(latencies) * 0.95) - 1]
+            print(f"{size:>8} {statistics.median(latencies):>10.3f} {p95:>10.3f} {latencies[-1]:>10.3f}")
+        store.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Memory store write-latency benchmark.")
+    parser.add_argument("--sizes", default="1000,5000,10000,20000,40000")
+    parser.add_argument("--samples", type=int, default=200)
+    parser.add_argument("--backends", default="log,json")
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(",")]
+    for backend in args.backends.split(","):
+        run(backend, sizes, args.samples)
@@ -0,0 +1,89 @@
+# benchmarks/model_pooling.py
+"""
+Measures what reusing model objects and their connections saves, against
+the fake model server with a simulated connection set-up cost.
+
+Three set-ups go through the real ModelClient and GeminiTransport, with
+fake SDK model objects:
+  - fresh:   a new model object (and connection) per call, the old behaviour
+  - pooled:  the model registry reuses objects and their open connections
+  - warmed:  pooled, plus ModelClient.warm_up() before the first query
+
+Reports first-call latency, steady-state p50/p95, connections opened and
+registry reuse counts.
+
+Usage:
+    python benchmarks/model_pooling.py [--calls 50] [--connect-latency 0.15] [--latency 0.05]
+"""
+
+import os
+import sys
+import time
+import asyncio
+import logging
+import argparse
+import statistics
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from benchmarks.fake_model_server import FakeModelServer, FakeGenerativeModel, fake_model_factory
+from tools.model_client import GeminiTransport, ModelClient, ModelRegistry
+from tools.model_router import ModelRouter
+
+CALL_CLASSES = {"text": {"models": ["flash"], "prefer": "latency"}}
+
+
+class FakeGeminiTransport(GeminiTransport):
+    """GeminiTransport with FakeGenerativeModels in place of the SDK's, and no API key needed."""
+    @property
+    def ready(self) -> bool:
+        return True
+
+
+async def run(client: ModelClient, calls: int, concurrency: int) -> tuple[float, list[float]]:
+    start = time.perf_counter()
+    await client.atext_query("first")
+    first = time.perf_counter() - start
+
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(i: int):
+        async with semaphore:
+            start = time.perf_counter()
+            await client.atext_query(f"request {i}")
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(one(i) for i in range(calls)))
+    return first, sorted(latencies)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Model object / connection reuse benchmark.")
+    parser.add_argument("--calls", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=2)
+    parser.add_argument("--latency", type=float, default=0.05, help="Model response time in seconds.")
+    parser.add_argument("--connect-latency", type=float, default=0.15, help="Set-up cost of a new connection.")
+    args = parser.parse_args()
+
+    server = FakeModelServer(profiles={"flash": {"latency": args.latency}}, connect_latency=args.connect_latency)
+    server.start()
+    logging.disable(logging.WARNING)
+
+    print(f"{'setup':>8} {'first s':>8} {'p50 s':>7} {'p95 s':>7} {'conns':>6} {'created':>8} {'reused':>7}")
+    for name, pooling, warm in (("fresh", False, False), ("pooled", True, False), ("warmed", True, True)):
+        FakeGenerativeModel.connections_opened = 0
+        registry = ModelRegistry(factory=fake_model_factory(server.url), pooling=pooling)
+        client = ModelClient(max_concurrency=args.concurrency, hedging=False, transport=FakeGeminiTransport(registry),
+                             router=ModelRouter(state_path=None, call_classes=CALL_CLASSES))
+        if warm:
+            client.warm_up(call_classes=["text"])
+        first, latencies = asyncio.run(run(client, args.calls, args.concurrency))
+        stats = client.pool_stats()
+        client.close()
+        print(f"{name:>8} {first:>8.3f} {statistics.median(latencies):>7.3f} "
+              f"{latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]:>7.3f} "
+              f"{FakeGenerativeModel.connections_opened:>6} {stats['created']:>8} {stats['reused']:>7}")
+    server.stop()
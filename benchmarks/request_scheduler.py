@@ -0,0 +1,130 @@
+# benchmarks/request_scheduler.py
+"""
+Exercises the request scheduler (tools/request_scheduler.py) through the
+real ModelClient, against the fake model server.
+
+  - rate limit:  a burst larger than the server's requests-per-minute limit:
+                 with no budget and no back-off (every caller runs into the
+                 limit), only backing off after a 429, and with a budget
+                 set just under the server's limit
+  - priority:    WriterAgent-style text queries fill the queue, then
+                 Supervisor validations arrive; their queue wait is compared
+                 with a first-come-first-served scheduler
+  - coalescing:  identical queries sent at once, counting model calls
+
+Usage:
+    python benchmarks/request_scheduler.py [--burst 300] [--rpm 240] [--latency 0.05]
+"""
+
+import os
+import sys
+import time
+import asyncio
+import logging
+import argparse
+import statistics
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from benchmarks.fake_model_server import FakeModelServer, FakeModelTransport
+from tools.model_client import ModelClient
+from tools.model_router import ModelRouter
+from tools.request_scheduler import DEFAULT_PRIORITY, RequestScheduler
+from tools.response_cache import ResponseCache
+
+CALL_CLASSES = {
+    "text": {"models": ["flash"], "prefer": "latency"},
+    "validation": {"models": ["flash"], "prefer": "latency"},
+}
+
+
+class NoBackoffScheduler(RequestScheduler):
+    """Ignores rate-limit errors, like callers that each retry on their own."""
+    def throttle(self, model_name: str, seconds: float = 0.0):
+        pass
+
+
+class FifoScheduler(RequestScheduler):
+    """Serves every call class at the same priority, in arrival order."""
+    def slot(self, model_name: str, priority: int = DEFAULT_PRIORITY, tokens: int = 0):
+        return super().slot(model_name, DEFAULT_PRIORITY, tokens)
+
+
+def make_client(server: FakeModelServer, scheduler: RequestScheduler) -> ModelClient:
+    return ModelClient(hedging=False, transport=FakeModelTransport(server.url), scheduler=scheduler,
+                       router=ModelRouter(state_path=None, call_classes=CALL_CLASSES),
+                       cache=ResponseCache(directory=None, enabled=False))
+
+
+def requests_of(server: FakeModelServer, outcome: str = "requests") -> int:
+    return server.stats.get("flash", {}).get(outcome, 0)
+
+
+async def burst(client: ModelClient, count: int) -> tuple[int, float]:
+    start = time.perf_counter()
+    answers = await asyncio.gather(*(client.atext_query(f"request {i}") for i in range(count)))
+    return sum(1 for answer in answers if answer), time.perf_counter() - start
+
+
+async def mixed(client: ModelClient, writers: int, validations: int) -> list[float]:
+    async def validate(i: int) -> float:
+        await asyncio.sleep(0.05)  # Arrive after the writer queries are queued.
+        start = time.perf_counter()
+        await client.atext_query(f"Is the click at {i} safe?", call_class="validation")
+        return time.perf_counter() - start
+
+    results = await asyncio.gather(*(client.atext_query(f"Write tweet {i}") for i in range(writers)),
+                                   *(validate(i) for i in range(validations)))
+    return results[writers:]
+
+
+async def identical(client: ModelClient, count: int) -> int:
+    answers = await asyncio.gather(*(client.atext_query("List 5 trending hashtags.") for _ in range(count)))
+    return sum(1 for answer in answers if answer)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Request scheduler benchmark: rate limits, priorities, coalescing.")
+    parser.add_argument("--burst", type=int, default=300)
+    parser.add_argument("--rpm", type=float, default=240, help="The server's requests-per-minute limit.")
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+
+    print(f"Rate limit: {args.burst} requests at once, server allows {args.rpm:g}/min")
+    print(f"{'budget':>10} {'ok':>5} {'429s':>5} {'throttles':>10} {'time s':>7}")
+    # The budget leaves a small margin: the client's and the provider's buckets never start at the same instant.
+    for name, scheduler_class, rpm in (("none", NoBackoffScheduler, 0), ("backoff", RequestScheduler, 0),
+                                       ("budget", RequestScheduler, args.rpm * 0.95)):
+        server = FakeModelServer(profiles={"flash": {"latency": args.latency, "rate_limit": args.rpm}})
+        server.start()
+        client = make_client(server, scheduler_class(args.concurrency, rpm=rpm, tpm=0))
+        ok, elapsed = asyncio.run(burst(client, args.burst))
+        stats = client.scheduler_stats()
+        client.close()
+        print(f"{name:>10} {ok:>5} {requests_of(server, 'rate_limited'):>5} {stats['throttles']:>10} {elapsed:>7.2f}")
+        server.stop()
+
+    print("\nPriority: 40 writer queries queued, then 5 validations (2 slots, 0.2s per call)")
+    print(f"{'scheduler':>10} {'validation p50 s':>17} {'max s':>7}")
+    for name, scheduler_class in (("fifo", FifoScheduler), ("priority", RequestScheduler)):
+        server = FakeModelServer(profiles={"flash": {"latency": 0.2}})
+        server.start()
+        client = make_client(server, scheduler_class(2, rpm=0, tpm=0))
+        waits = asyncio.run(mixed(client, 40, 5))
+        client.close()
+        print(f"{name:>10} {statistics.median(waits):>17.2f} {max(waits):>7.2f}")
+        server.stop()
+
+    server = FakeModelServer(profiles={"flash": {"latency": 0.2}})
+    server.start()
+    client = make_client(server, RequestScheduler(args.concurrency, rpm=0, tpm=0))
+    answered = asyncio.run(identical(client, 10))
+    stats = client.scheduler_stats()
+    client.close()
+    print(f"\nCoalescing: 10 identical queries at once -> {answered} answered, "
+          f"{requests_of(server)} model call(s), {stats['coalesced']} joined")
+    server.stop()
@@ -0,0 +1,140 @@
+# benchmarks/response_cache.py
+"""
+Replays a mission against the same page states and measures what the
+response cache saves.
+
+Each step asks a question about a screen, once as a Supervisor-style
+validation (keyed on the exact frame) and once as a Brain-style planning
+step (keyed on the perceptual hash). Each mission runs against the fake
+model server as:
+  - cold:     empty cache, every step is a model call
+  - replay:   same process, same screens
+  - noisy:    screens re-captured with slight pixel noise; only the
+              perceptual key should still hit
+  - changed:  screens with one small button added; nothing may hit
+  - restart:  a new cache instance over the same directory (a new process),
+              replaying the screens from the on-disk tier
+
+Reports hit rate, model calls and wall time per run.
+
+Usage:
+    python benchmarks/response_cache.py [--steps 30] [--latency 0.2]
+"""
+
+import os
+import sys
+import time
+import shutil
+import asyncio
+import logging
+import argparse
+import tempfile
+
+import numpy as np
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from benchmarks.fake_model_server import FakeModelServer, fake_model_factory
+from tools.model_client import GeminiTransport, ModelClient, ModelRegistry
+from tools.model_router import ModelRouter
+from tools.response_cache import ResponseCache
+
+CALL_CLASSES = {"validation": {"models": ["flash"], "prefer": "latency"},
+                "planning": {"models": ["flash"], "prefer": "latency"}}
+PROMPT = """
+        You are a meticulous safety supervisor for an AI agent.
+        The agent wants to perform a mouse click at normalized coordinates (x={x}, y={y}).
+        Respond in JSON only: {{"decision": "Yes/No", "reason": "..."}}.
+        """
+
+
+class FakeGeminiTransport(GeminiTransport):
+    """GeminiTransport with FakeGenerativeModels in place of the SDK's, and no API key needed."""
+    @property
+    def ready(self) -> bool:
+        return True
+
+
+def make_screens(steps: int, seed: int = 0) -> list[np.ndarray]:
+    """Distinct page states: coloured panels and text-like bars on a white page."""
+    rng = np.random.default_rng(seed)
+    screens = []
+    for _ in range(steps):
+        pixels = np.full((720, 1280, 3), 255, dtype=np.uint8)
+        for _ in range(12):
+            top, left = rng.integers(0, 620), rng.integers(0, 1080)
+            pixels[top:top + rng.integers(20, 100), left:left + rng.integers(60, 200)] = rng.integers(0, 255, 3)
+        screens.append(pixels)
+    return screens
+
+
+def add_noise(pixels: np.ndarray, seed: int) -> np.ndarray:
+    """The same screen with +-2 noise per channel, as a lossy re-capture would show it."""
+    rng = np.random.default_rng(seed)
+    noise = rng.integers(-2, 3, pixels.shape)
+    return np.clip(pixels.astype(np.int16) + noise, 0, 255).astype(np.uint8)
+
+
+def add_button(pixels: np.ndarray, seed: int) -> np.ndarray:
+    """The same screen with a 150x60 button drawn somewhere: a real change the cache must not hide."""
+    rng = np.random.default_rng(seed)
+    pixels = pixels.copy()
+    top, left = rng.integers(0, 660), rng.integers(0, 1130)
+    pixels[top:top + 60, left:left + 150] = rng.integers(0, 255, 3)
+    return pixels
+
+
+async def run(client: ModelClient, screens: list[np.ndarray], profile: str) -> float:
+    start = time.perf_counter()
+    for step, pixels in enumerate(screens):
+        await client.avision_query(pixels, PROMPT.format(x=step * 10, y=500), profile=profile)
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Response cache benchmark: replaying a mission.")
+    parser.add_argument("--steps", type=int, default=30)
+    parser.add_argument("--latency", type=float, default=0.2, help="Model response time in seconds.")
+    args = parser.parse_args()
+
+    server = FakeModelServer(profiles={"flash": {"latency": args.latency,
+                                                 "response": '{"decision": "Yes", "reason": "A button."}'}})
+    server.start()
+    logging.disable(logging.WARNING)
+    directory = tempfile.mkdtemp(prefix="response_cache-")
+    screens = make_screens(args.steps)
+    runs = (("cold", screens), ("replay", screens),
+            ("noisy", [add_noise(pixels, i) for i, pixels in enumerate(screens)]),
+            ("changed", [add_button(pixels, i) for i, pixels in enumerate(screens)]),
+            ("restart", screens))
+
+    print(f"{'class':>10} {'run':>8} {'time s':>7} {'calls':>6} {'mem hits':>9} {'disk hits':>10} {'hit rate':>9}")
+    cache = None
+    try:
+        for profile in ("validation", "planning"):
+            shutil.rmtree(directory, ignore_errors=True)
+            cache = ResponseCache(directory=directory)
+            for name, frames in runs:
+                if name == "restart":
+                    cache.close()
+                    cache = ResponseCache(directory=directory)
+                calls_before = server.stats.get("flash", {}).get("requests", 0)
+                client = ModelClient(transport=FakeGeminiTransport(ModelRegistry(factory=fake_model_factory(server.url))),
+                                     router=ModelRouter(state_path=None, call_classes=CALL_CLASSES), cache=cache)
+                before = cache.stats()
+                elapsed = asyncio.run(run(client, frames, profile))
+                client.close()
+                after = cache.stats()
+                memory_hits = after["memory_hits"] - before["memory_hits"]
+                disk_hits = after["disk_hits"] - before["disk_hits"]
+                calls = server.stats.get("flash", {}).get("requests", 0) - calls_before
+                print(f"{profile:>10} {name:>8} {elapsed:>7.2f} {calls:>6} {memory_hits:>9} "
+                      f"{disk_hits:>10} {(memory_hits + disk_hits) / len(frames):>9.0%}")
+            cache.close()
+    finally:
+        if cache:
+            cache.close()
+        server.stop()
+        shutil.rmtree(directory, ignore_errors=True)
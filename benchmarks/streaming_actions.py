@@ -0,0 +1,102 @@
+# benchmarks/streaming_actions.py
+"""
+Measures time-to-first-action: how long a Brain-style planning query takes
+to hand back a usable "action", with and without streaming.
+
+The fake model server writes a Brain-shaped reply (a short thought, the
+action, then a long reasoning paragraph) a few characters at a time. With
+streaming, ModelClient returns once the action member has parsed; without
+it, the whole reply has to arrive first.
+
+A second scenario has the primary model answer in prose. Streaming rejects
+it within the first chunks and hands over to the fallback model, instead of
+waiting for the full prose reply before finding it unusable.
+
+Usage:
+    python benchmarks/streaming_actions.py [--queries 20] [--latency 0.3] [--interval 0.02]
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+import statistics
+
+import numpy as np
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from benchmarks.fake_model_server import FakeModelServer, fake_model_factory
+from tools.model_client import GeminiTransport, ModelClient, ModelRegistry
+from tools.model_router import ModelRouter
+from tools.response_cache import ResponseCache
+
+CALL_CLASSES = {"planning": {"models": ["pro", "flash"], "prefer": "quality"}}
+RESPONSE = json.dumps({
+    "thought": "The search box is empty, so type the query first.",
+    "action": {"action": "type", "text": "weather in Pune", "target": {"label": "Search box"}},
+    "reasoning": "The goal asks for today's weather. " * 20,
+})
+
+
+class StickyRouter(ModelRouter):
+    """Never opens a circuit, so a failing primary stays first and every query pays for it."""
+    def record_failure(self, model_name: str, kind: str = "error"):
+        pass
+
+
+class FakeGeminiTransport(GeminiTransport):
+    """GeminiTransport with FakeGenerativeModels in place of the SDK's, and no API key needed."""
+    @property
+    def ready(self) -> bool:
+        return True
+
+
+async def run(client: ModelClient, pixels, queries: int) -> list[float]:
+    latencies = []
+    for i in range(queries):
+        start = time.perf_counter()
+        text = await client.avision_query(pixels, f"Step {i}: what next?", profile="planning",
+                                          stream_until="action")
+        latencies.append(time.perf_counter() - start)
+        if not text or "action" not in json.loads(text):
+            raise RuntimeError(f"Query {i} returned no action: {text!r}")
+    return sorted(latencies)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time-to-first-action with and without streaming.")
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.3, help="Seconds before the first chunk.")
+    parser.add_argument("--interval", type=float, default=0.02, help="Seconds between chunks.")
+    parser.add_argument("--chunk-chars", type=int, default=24)
+    args = parser.parse_args()
+
+    stream_profile = {"latency": args.latency, "stream_interval": args.interval,
+                      "stream_chunk_chars": args.chunk_chars, "response": RESPONSE}
+    scenarios = {
+        "healthy": {"pro": stream_profile, "flash": stream_profile},
+        "prose": {"pro": {**stream_profile, "invalid_rate": 1.0}, "flash": stream_profile},
+    }
+    pixels = np.zeros((720, 1280, 3), dtype=np.uint8)
+    logging.disable(logging.WARNING)
+
+    print(f"{'scenario':>9} {'mode':>10} {'p50 s':>7} {'p95 s':>7}")
+    for scenario, profiles in scenarios.items():
+        server = FakeModelServer(profiles=profiles)
+        server.start()
+        for mode, streaming in (("buffered", False), ("streaming", True)):
+            registry = ModelRegistry(factory=fake_model_factory(server.url))
+            client = ModelClient(hedging=False, streaming=streaming, transport=FakeGeminiTransport(registry),
+                                 router=StickyRouter(state_path=None, call_classes=CALL_CLASSES),
+                                 cache=ResponseCache(directory=None, enabled=False))
+            latencies = asyncio.run(run(client, pixels, args.queries))
+            client.close()
+            print(f"{scenario:>9} {mode:>10} {statistics.median(latencies):>7.3f} "
+                  f"{latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]:>7.3f}")
+        server.stop()
@@ -0,0 +1,226 @@
+# memory/change_feed.py
+
+import os
+import json
+import socket
+import logging
+import tempfile
+import threading
+
+# Configure logging for this module
+logger = logging.getLogger(__name__)
+
+LOCK_FILE = "memory/memory.lock"
+VERSIONS_FILE = "memory/versions.json"
+SUBSCRIBERS_FILE = "memory/subscribers.json"
+
+# Values up to this size travel inside the notification itself, so readers
+# do not have to touch the store at all. Larger values are re-read by key.
+MAX_INLINE_BYTES = 60000
+
+
+class InterProcessLock:
+    """
+    An exclusive lock on a file, shared by every process that opens the same
+    path (fcntl.flock on POSIX, msvcrt.locking on Windows). Also serializes
+    threads within the process.
+    """
+    def __init__(self, path: str = LOCK_FILE):
+        self.path = path
+        self._thread_lock = threading.Lock()
+        self._handle = None
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+
+    def __enter__(self):
+        self._thread_lock.acquire()
+        try:
+            self._handle = open(self.path, "a+b")
+            if os.name == "nt":
+                import msvcrt
+                self._handle.seek(0)
+                # LK_LOCK retries for ~10s; keep retrying until the other writer is done.
+                while True:
+                    try:
+                        msvcrt.locking(self._handle.fileno(), msvcrt.LK_LOCK, 1)
+                        break
+                    except OSError:
+                        continue
+            else:
+                import fcntl
+                fcntl.flock(self._handle.fileno(), fcntl.LOCK_EX)
+        except Exception:
+            self._thread_lock.release()
+            raise
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if os.name == "nt":
+                import msvcrt
+                self._handle.seek(0)
+                msvcrt.locking(self._handle.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(self._handle.fileno(), fcntl.LOCK_UN)
+            self._handle.close()
+        finally:
+            self._handle = None
+            self._thread_lock.release()
+
+
+class ChangeFeed:
+    """
+    Cross-process change notifications for Memory.
+
+    Every persisted key carries a version counter kept in a small versions
+    file. Writers bump the versions while holding the memory lock and then
+    send one UDP datagram per change to every subscribed process on
+    localhost. Each subscriber runs a listener thread that hands the change
+    (key, version and, when small enough, the stored value) to `on_change`,
+    so readers learn about updates without polling or re-parsing the store.
+    """
+    def __init__(self, on_change=None, versions_path: str = VERSIONS_FILE, subscribers_path: str = SUBSCRIBERS_FILE,
+                 lock: InterProcessLock | None = None):
+        self.on_change = on_change
+        self.versions_path = versions_path
+        self.subscribers_path = subscribers_path
+        self.lock = lock or InterProcessLock()
+        self.pid = os.getpid()
+
+        # Separate sockets for receiving and sending: on Windows a datagram to a
+        # dead subscriber makes the *sending* socket report a reset on recv.
+        self._receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._receiver.bind(("127.0.0.1", 0))
+        self.port = self._receiver.getsockname()[1]
+        self._sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._closed = False
+
+        with self.lock:
+            subscribers = self._read_subscribers()
+            subscribers[str(self.pid)] = self.port
+            self._write_json(self.subscribers_path, subscribers)
+
+        self._listener = threading.Thread(target=self._listen, name="MemoryChangeFeed", daemon=True)
+        self._listener.start()
+
+    def read_versions(self) -> dict[str, int]:
+        return self._read_json(self.versions_path)
+
+    def publish(self, changes: dict, deleted: set) -> dict[str, int]:
+        """
+        Bumps the versions of the changed and deleted keys and notifies the
+        other subscribers. Must be called while holding `self.lock`, right
+        after the batch was written to the store. Returns the new versions.
+        """
+        versions = self.read_versions()
+        bumped = {}
+        for key in list(changes) + list(deleted):
+            bumped[key] = versions.get(key, 0) + 1
+        versions.update(bumped)
+        self._write_json(self.versions_path, versions)
+
+        subscribers = [port for pid, port in self._read_subscribers().items() if int(pid) != self.pid]
+        if not subscribers:
+            return bumped
+
+        for key, version in bumped.items():
+            message = {"pid": self.pid, "key": key, "version": version}
+            if key in deleted:
+                message["deleted"] = True
+            payload = json.dumps(message).encode("utf-8")
+            if key in changes:
+                inline = json.dumps({**message, "value": changes[key]}).encode("utf-8")
+                if len(inline) <= MAX_INLINE_BYTES:
+                    payload = inline
+            for port in subscribers:
+                try:
+                    self._sender.sendto(payload, ("127.0.0.1", port))
+                except OSError as e:
+                    logger.debug(f"Could not notify memory subscriber on port {port}: {e}")
+        return bumped
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            with self.lock:
+                subscribers = self._read_subscribers()
+                subscribers.pop(str(self.pid), None)
+                self._write_json(self.subscribers_path, subscribers)
+        finally:
+            self._receiver.close()
+            self._sender.close()
+
+    # --- Internals ---
+
+    def _listen(self):
+        while not self._closed:
+            try:
+                payload, _ = self._receiver.recvfrom(65535)
+            except ConnectionResetError:
+                continue
+            except OSError:
+                break  # Socket closed by close().
+            try:
+                message = json.loads(payload)
+                if message.get("pid") != self.pid and self.on_change:
+                    self.on_change(message)
+            except Exception as e:
+                logger.error(f"Failed to apply memory change notification: {e}", exc_info=True)
+
+    def _read_subscribers(self) -> dict:
+        """
+        Reads the subscribers file and drops processes that exited without
+        calling close(), rewriting the file if any were dropped. Must be
+        called while holding `self.lock`.
+        """
+        subscribers = self._read_json(self.subscribers_path)
+        live = {pid: port for pid, port in subscribers.items() if _pid_alive(int(pid))}
+        if len(live) != len(subscribers):
+            logger.debug(f"Pruned {len(subscribers) - len(live)} dead memory subscriber(s).")
+            self._write_json(self.subscribers_path, live)
+        return live
+
+    @staticmethod
+    def _read_json(path: str) -> dict:
+        try:
+            with open(path, "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    @staticmethod
+    def _write_json(path: str, data: dict):
+        directory = os.path.dirname(path) or "."
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix=".feed-", suffix=".tmp", dir=directory)
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
+
+def _pid_alive(pid: int) -> bool:
+    """Whether a process with this PID is still running."""
+    if pid == os.getpid():
+        return True
+    if os.name == "nt":
+        import ctypes
+        PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+        STILL_ACTIVE = 259
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(PROCESS_QUERY_LIMITED_INFORMATION, False, pid)
+        if not handle:
+            return False
+        try:
+            exit_code = ctypes.c_ulong()
+            return bool(kernel32.GetExitCodeProcess(handle, ctypes.byref(exit_code))) and exit_code.value == STILL_ACTIVE
+        finally:
+            kernel32.CloseHandle(handle)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # Alive, but owned by another user.
+    return True
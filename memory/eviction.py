@@ -0,0 +1,79 @@
+# memory/eviction.py
+
+from collections import OrderedDict, defaultdict
+
+
+class LruTracker:
+    """Tracks key recency; the victim is the least recently used key. All operations are O(1)."""
+
+    def __init__(self):
+        self._order: OrderedDict[str, None] = OrderedDict()
+
+    def touch(self, key: str):
+        self._order[key] = None
+        self._order.move_to_end(key)
+
+    def remove(self, key: str):
+        self._order.pop(key, None)
+
+    def victim(self, exclude: str | None = None) -> str | None:
+        for key in self._order:
+            if key != exclude:
+                return key
+        return None
+
+
+class LfuTracker:
+    """
+    Tracks key access counts; the victim is the least frequently used key,
+    with ties broken by recency. Keys are kept in per-frequency buckets with
+    a running minimum, so touch/remove/victim are O(1) instead of a scan.
+    """
+
+    def __init__(self):
+        self._counts: dict[str, int] = {}
+        self._buckets: defaultdict[int, OrderedDict[str, None]] = defaultdict(OrderedDict)
+        self._min_count = 0
+
+    def touch(self, key: str):
+        count = self._counts.get(key, 0)
+        if count:
+            bucket = self._buckets[count]
+            del bucket[key]
+            if not bucket:
+                del self._buckets[count]
+                if self._min_count == count:
+                    self._min_count = count + 1
+        else:
+            self._min_count = 1
+        self._counts[key] = count + 1
+        self._buckets[count + 1][key] = None
+
+    def remove(self, key: str):
+        count = self._counts.pop(key, None)
+        if count is None:
+            return
+        bucket = self._buckets[count]
+        del bucket[key]
+        if not bucket:
+            del self._buckets[count]
+            if self._min_count == count:
+                self._min_count = min(self._buckets, default=0)
+
+    def victim(self, exclude: str | None = None) -> str | None:
+        if not self._counts:
+            return None
+        if self._min_count not in self._buckets:
+            self._min_count = min(self._buckets)
+        for key in self._buckets[self._min_count]:
+            if key != exclude:
+                return key
+        # Only the excluded key has the lowest count; fall back to the next bucket.
+        higher = [count for count in self._buckets if count != self._min_count]
+        return next(iter(self._buckets[min(higher)])) if higher else None
+
+
+EVICTION_POLICIES = {
+    "lru": LruTracker,
+    "lfu": LfuTracker,
+}
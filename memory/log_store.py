@@ -0,0 +1,278 @@
+# memory/log_store.py
+
+import json
+import os
+import struct
+import zlib
+import logging
+import threading
+from contextlib import nullcontext
+from memory.stores import MemoryStore
+
+# Configure logging for this module
+logger = logging.getLogger(__name__)
+
+LOG_FILE = "memory/memory.log"
+
+# Each record is a fixed header (payload length, CRC32 of the payload)
+# followed by a compact JSON payload: {"k": key, "v": value} for a write,
+# or {"k": key, "d": 1} for a tombstone.
+RECORD_HEADER = struct.Struct(">II")
+
+# Compact once dead records make up this share of the log...
+DEFAULT_COMPACTION_RATIO = 0.5
+# ...but never bother for logs smaller than this many bytes.
+DEFAULT_COMPACTION_MIN_BYTES = 1024 * 1024
+
+
+class LogStructuredStore(MemoryStore):
+    """
+    An append-only record log with an in-memory key -> (offset, length) index.
+
+    Every write appends one record per changed key, so a write costs
+    O(size of the change) instead of O(total memory). Overwritten and deleted
+    records become garbage; once garbage passes `compaction_ratio` of the
+    log, a background thread copies the live records into a fresh file and
+    swaps it in. On open the log is replayed to rebuild the index, and a torn
+    record at the tail (from a crash mid-append) is truncated away.
+
+    `lock` is the inter-process lock that writers hold while flushing (see
+    memory/change_feed.py). The swap at the end of a compaction holds it
+    too, so no other process can append to the old file as it is replaced.
+    """
+    def __init__(self, path: str = LOG_FILE, compaction_ratio: float = DEFAULT_COMPACTION_RATIO,
+                 compaction_min_bytes: int = DEFAULT_COMPACTION_MIN_BYTES, fsync: bool = True, lock=None):
+        self.path = path
+        self.lock = lock
+        self.compaction_ratio = compaction_ratio
+        self.compaction_min_bytes = compaction_min_bytes
+        self.fsync = fsync
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._lock = threading.RLock()
+        self._index: dict[str, tuple[int, int]] = {}
+        self._live_bytes = 0
+        self._end_offset = 0
+        self._file_stamp = None
+        self._compactor: threading.Thread | None = None
+
+        # Binary append handle for writes, separate read handle for lookups.
+        self._writer = open(self.path, "ab")
+        self._reader = open(self.path, "rb")
+        self._replay()
+
+    # --- MemoryStore API ---
+
+    def load_all(self) -> dict:
+        with self._lock:
+            if self.has_external_changes():
+                self._reopen()
+            return {key: self._read_value(offset, length) for key, (offset, length) in self._index.items()}
+
+    def get(self, key):
+        """Reads a single value straight from its offset in the log."""
+        with self._lock:
+            if self.has_external_changes():
+                self._reopen()
+            location = self._index.get(key)
+            return self._read_value(*location) if location else None
+
+    def write_batch(self, changes: dict, deleted: set | None = None, timestamps: dict | None = None):
+        records = [(key, {"k": key, "v": value}) for key, value in changes.items()]
+        records += [(key, {"k": key, "d": 1}) for key in (deleted or ()) if key not in changes]
+        if not records:
+            return
+
+        with self._lock:
+            buffer = bytearray()
+            placements = []
+            for key, record in records:
+                payload = json.dumps(record, separators=(",", ":")).encode("utf-8")
+                header = RECORD_HEADER.pack(len(payload), zlib.crc32(payload))
+                placements.append((key, "v" in record, self._end_offset + len(buffer), len(header) + len(payload)))
+                buffer += header + payload
+
+            self._writer.write(buffer)
+            self._writer.flush()
+            if self.fsync:
+                os.fsync(self._writer.fileno())
+            self._end_offset += len(buffer)
+
+            for key, is_write, offset, length in placements:
+                self._drop_from_index(key)
+                if is_write:
+                    self._index[key] = (offset, length)
+                    self._live_bytes += length
+            self._file_stamp = self._stat_file()
+
+        self._maybe_schedule_compaction()
+
+    def has_external_changes(self) -> bool:
+        return self._file_stamp != self._stat_file()
+
+    def close(self):
+        compactor = self._compactor
+        if compactor and compactor.is_alive():
+            compactor.join()
+        with self._lock:
+            self._writer.close()
+            self._reader.close()
+
+    # --- Stats & maintenance ---
+
+    @property
+    def garbage_ratio(self) -> float:
+        if not self._end_offset:
+            return 0.0
+        return 1.0 - (self._live_bytes / self._end_offset)
+
+    def __len__(self):
+        return len(self._index)
+
+    def compact(self):
+        """
+        Rewrites the log so that it only contains live records.
+
+        The bulk copy runs without holding the store lock, because records
+        below the snapshot offset never change. Only the records appended
+        while the copy was running, by this process or another one, are
+        carried over under the locks, just before the new file replaces the
+        old one. If another process compacted the log first, this copy is
+        stale and is dropped.
+        """
+        with self._lock:
+            snapshot = dict(self._index)
+            snapshot_end = self._end_offset
+            snapshot_file = self._file_stamp[0] if self._file_stamp else None
+
+        # One temporary file per process: another process may be compacting the same log.
+        tmp_path = f"{self.path}.{os.getpid()}.compact"
+        new_index: dict[str, tuple[int, int]] = {}
+        with open(tmp_path, "wb") as out, open(self.path, "rb") as src:
+            # The file was replaced since our last read; the snapshot's offsets are not for this one.
+            replaced = os.fstat(src.fileno()).st_ino != snapshot_file
+            position = 0
+            for key, (offset, length) in sorted(snapshot.items(), key=lambda item: item[1][0]):
+                if replaced:
+                    break
+                src.seek(offset)
+                out.write(src.read(length))
+                new_index[key] = (position, length)
+                position += length
+
+            # The inter-process lock first, as flushes take it before the store lock.
+            with self.lock or nullcontext(), self._lock:
+                current = self._stat_file()
+                replaced = replaced or current is None or current[0] != snapshot_file
+                if not replaced and self.has_external_changes():
+                    # Pick up the records other processes appended since our last read.
+                    self._reopen()
+                if replaced:
+                    out.close()
+                    src.close()
+                    os.remove(tmp_path)
+                    logger.info(f"Memory log {self.path} was compacted by another process. Skipping.")
+                    return
+                # Carry over everything appended during the copy.
+                src.seek(snapshot_end)
+                tail = src.read(self._end_offset - snapshot_end)
+                # Tombstones are copied too: the key's older record may already
+                # be in the new file and must not come back on replay.
+                for key, is_write, offset, length in self._iter_records(tail, snapshot_end):
+                    out.write(tail[offset - snapshot_end:offset - snapshot_end + length])
+                    new_index.pop(key, None)
+                    if is_write:
+                        new_index[key] = (position, length)
+                    position += length
+
+                out.flush()
+                os.fsync(out.fileno())
+                # Every handle on the old file must be closed before the swap (Windows).
+                out.close()
+                src.close()
+                self._writer.close()
+                self._reader.close()
+                os.replace(tmp_path, self.path)
+                self._writer = open(self.path, "ab")
+                self._reader = open(self.path, "rb")
+                old_size = self._end_offset
+                self._index = new_index
+                self._end_offset = position
+                self._live_bytes = sum(length for _, length in new_index.values())
+                self._file_stamp = self._stat_file()
+
+        logger.info(f"Compacted memory log {self.path}: {old_size} -> {position} bytes.")
+
+    # --- Internals ---
+
+    def _maybe_schedule_compaction(self):
+        if self._end_offset < self.compaction_min_bytes or self.garbage_ratio < self.compaction_ratio:
+            return
+        if self._compactor and self._compactor.is_alive():
+            return
+        self._compactor = threading.Thread(target=self._compact_in_background, name="MemoryLogCompactor", daemon=True)
+        self._compactor.start()
+
+    def _compact_in_background(self):
+        try:
+            self.compact()
+        except Exception as e:
+            logger.error(f"Memory log compaction failed: {e}", exc_info=True)
+
+    def _drop_from_index(self, key):
+        previous = self._index.pop(key, None)
+        if previous:
+            self._live_bytes -= previous[1]
+
+    def _read_value(self, offset: int, length: int):
+        self._reader.seek(offset + RECORD_HEADER.size)
+        payload = self._reader.read(length - RECORD_HEADER.size)
+        return json.loads(payload)["v"]
+
+    def _iter_records(self, data: bytes, base_offset: int = 0):
+        """Yields (key, is_write, offset, length) for every intact record in `data`."""
+        position = 0
+        while position + RECORD_HEADER.size <= len(data):
+            size, crc = RECORD_HEADER.unpack_from(data, position)
+            start = position + RECORD_HEADER.size
+            payload = data[start:start + size]
+            if len(payload) < size or zlib.crc32(payload) != crc:
+                return
+            record = json.loads(payload)
+            yield record["k"], "v" in record, base_offset + position, RECORD_HEADER.size + size
+            position = start + size
+
+    def _replay(self):
+        """Rebuilds the index from the log and truncates a torn tail record, if any."""
+        self._reader.seek(0)
+        data = self._reader.read()
+        self._index = {}
+        self._live_bytes = 0
+        good_end = 0
+        for key, is_write, offset, length in self._iter_records(data):
+            self._drop_from_index(key)
+            if is_write:
+                self._index[key] = (offset, length)
+                self._live_bytes += length
+            good_end = offset + length
+
+        if good_end < len(data):
+            logger.warning(f"Memory log {self.path} has {len(data) - good_end} bytes of torn tail data. Truncating.")
+            self._writer.truncate(good_end)
+            self._writer.flush()
+        self._end_offset = good_end
+        self._file_stamp = self._stat_file()
+
+    def _reopen(self):
+        self._writer.close()
+        self._reader.close()
+        self._writer = open(self.path, "ab")
+        self._reader = open(self.path, "rb")
+        self._replay()
+
+    def _stat_file(self):
+        try:
+            st = os.stat(self.path)
+            return (st.st_ino, st.st_size)
+        except FileNotFoundError:
+            return None
@@ -1,27 +1,565 @@
 # memory/memory.py
 
-import json
 import os
+import gzip
+import json
+import time
+import heapq
+import asyncio
+import logging
+import threading
+from contextlib import nullcontext
+from datetime import datetime
+from memory.stores import MemoryStore, JsonFileStore, compose_key, split_key
+from memory.log_store import LogStructuredStore, LOG_FILE
+from memory.sqlite_store import SqliteStore, SQLITE_FILE
+from memory.eviction import EVICTION_POLICIES
+from memory.change_feed import ChangeFeed, InterProcessLock, LOCK_FILE
+
+# Configure logging for this module
+logger = logging.getLogger(__name__)
 
 MEMORY_FILE = "memory/memory.json"
 
+# Which storage engine backs the shared memory: "json" (the original single
+# document), "log" (append-only record log, see memory/log_store.py) or
+# "sqlite" (WAL-mode database shared by agent processes, see memory/sqlite_store.py).
+MEMORY_BACKEND = os.getenv("MEMORY_BACKEND", "json")
+
+# Seconds between background flushes of dirty keys. Set to 0 to disable the
+# flusher thread; changes are then only persisted by flush() or close().
+DEFAULT_FLUSH_INTERVAL = float(os.getenv("MEMORY_FLUSH_INTERVAL", "2.0"))
+
+# Upper bound on the serialized size of all values, in bytes (0 = unlimited),
+# and which entries are evicted to get back under it: "lru" or "lfu".
+DEFAULT_MAX_BYTES = int(os.getenv("MEMORY_MAX_BYTES", "0"))
+DEFAULT_EVICTION_POLICY = os.getenv("MEMORY_EVICTION_POLICY", "lru")
+
+# Evicted and expired entries are appended here as gzip-compressed JSON lines.
+# Leave MEMORY_ARCHIVE_FILE empty to drop them instead.
+DEFAULT_ARCHIVE_FILE = os.getenv("MEMORY_ARCHIVE_FILE", "memory/archive.jsonl.gz")
+
+# Seconds between sweeps that remove expired keys nobody has read.
+DEFAULT_SWEEP_INTERVAL = float(os.getenv("MEMORY_SWEEP_INTERVAL", "60"))
+
+# Publish every flushed change to other processes using the same memory
+# directory, and listen for theirs (see memory/change_feed.py).
+MEMORY_CHANGE_FEED = os.getenv("MEMORY_CHANGE_FEED", "0") == "1"
+
+# Values saved with a TTL are persisted in this envelope so the expiry
+# survives restarts. Values without a TTL are stored as-is.
+EXPIRES_FIELD = "__expires_at__"
+VALUE_FIELD = "__value__"
+
+# Handoff and reflection keys that were saved in the default namespace
+# before agents had their own, and the namespace each now lives in. They are
+# moved once, when a Memory finds them in the store.
+LEGACY_KEY_NAMESPACES = {
+    "post_content": "WriterAgent",
+    "mission_plan": "DirectorAgent",
+    "system_brain_reflection": "SystemBrain",
+    "self_patcher_suggestions": "SelfPatcher",
+}
+
+
+def create_store(backend: str = MEMORY_BACKEND, lock: InterProcessLock | None = None) -> MemoryStore:
+    """
+    Builds the storage engine for the given backend name. When switching to
+    the log or sqlite backend for the first time, the existing memory.json
+    is migrated. `lock` is held while a new store is initialised, so
+    processes starting together do not each create or migrate it.
+    """
+    if backend == "json":
+        return JsonFileStore(MEMORY_FILE, lock=lock)
+    if backend == "log":
+        store = LogStructuredStore(LOG_FILE, lock=lock)
+    elif backend == "sqlite":
+        store = SqliteStore(SQLITE_FILE)
+    else:
+        raise ValueError(f"Unknown memory backend: '{backend}'")
+
+    with lock or nullcontext():
+        if len(store) == 0 and os.path.exists(MEMORY_FILE):
+            store.import_json(MEMORY_FILE)
+    return store
+
+
 class Memory:
-    def __init__(self):
-        os.makedirs("memory", exist_ok=True)
-        if not os.path.exists(MEMORY_FILE):
-            with open(MEMORY_FILE, "w") as f:
-                json.dump({}, f)
-
-    def save(self, key, value):
-        data = self.load_all()
-        data[key] = value
-        with open(MEMORY_FILE, "w") as f:
-            json.dump(data, f, indent=2)
-
-    def load(self, key):
-        data = self.load_all()
-        return data.get(key)
+    """
+    The shared key/value memory used by agents to hand off context.
+
+    Values are kept in an in-process write-back cache, so load() is a plain
+    dict lookup. save() only marks the key as dirty; dirty keys are handed
+    to the storage engine in batches by a background flusher. The engine is
+    pluggable (see create_store), and the save/load/load_all API is the same
+    regardless of which one is in use.
+
+    Every key belongs to a namespace, normally the name of the agent that
+    owns it (e.g. namespace="WriterAgent"). Keys saved without a namespace
+    live in the default one, which is where pre-namespace keys remain.
+
+    Entries can expire (a per-call `ttl`, a per-namespace TTL or a default
+    TTL) and the total size can be capped with `max_bytes`, evicting by LRU
+    or LFU. Expiry is checked lazily when a key is read and by a periodic
+    sweep over a heap of deadlines, so reads never pay for a full scan.
+    Evicted and expired entries can be kept in a compressed archive.
+
+    Coroutines should use the async counterparts (aload, asave, awatch,
+    aclose), which never run file or database I/O on the event loop thread.
+
+    Flushes hold an inter-process file lock, so processes sharing a store
+    serialize their writes. With the change feed enabled, every flushed key
+    gets a new version number and other processes are notified directly;
+    they update their cache for just that key, and wait_for_change() lets a
+    reader block until a key moves past a known version.
+    """
+    def __init__(self, store: MemoryStore | None = None, flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+                 default_ttl: float | None = None, namespace_ttls: dict[str, float] | None = None,
+                 max_bytes: int = DEFAULT_MAX_BYTES, eviction_policy: str = DEFAULT_EVICTION_POLICY,
+                 archive_path: str | None = DEFAULT_ARCHIVE_FILE, sweep_interval: float = DEFAULT_SWEEP_INTERVAL,
+                 lock_path: str | None = LOCK_FILE, change_feed: bool = MEMORY_CHANGE_FEED):
+        if eviction_policy not in EVICTION_POLICIES:
+            raise ValueError(f"Unknown eviction policy: '{eviction_policy}'")
+
+        # Cross-process write lock, shared with the change feed.
+        self._ipc_lock = InterProcessLock(lock_path) if lock_path else None
+        if change_feed:
+            self._ipc_lock = self._ipc_lock or InterProcessLock()
+
+        self.store = store if store is not None else create_store(lock=self._ipc_lock)
+        self.flush_interval = flush_interval
+        self.default_ttl = default_ttl
+        self.namespace_ttls = dict(namespace_ttls or {})
+        self.max_bytes = max_bytes
+        self.eviction_policy = eviction_policy
+        self.archive_path = archive_path or None
+        self.sweep_interval = sweep_interval
+
+        self._lock = threading.RLock()
+        self._flush_lock = threading.Lock()
+        # Keys whose cached state differs from the store; a dirty key that is
+        # no longer in _data is deleted on the next flush.
+        self._dirty: set[str] = set()
+        # When each key was last saved by this process, for timestamped stores and latest().
+        self._updated_at: dict[str, float] = {}
+        # Futures of awatch() callers, keyed by the storage key they wait on.
+        self._watchers: dict[str, list[tuple[asyncio.AbstractEventLoop, asyncio.Future]]] = {}
+        # The asave() flush that has been scheduled but has not started yet.
+        self._pending_flush: asyncio.Task | None = None
+        # Evicted/expired entries waiting to be appended to the archive by the next flush.
+        self._pending_archive: list[dict] = []
+        self._load_from_store()
+
+        self._feed = None
+        if change_feed:
+            self._feed = ChangeFeed(on_change=self._apply_remote_change, lock=self._ipc_lock)
+        # Last known persisted version of each key; waiters block on _version_changed.
+        self._versions: dict[str, int] = self._feed.read_versions() if self._feed else {}
+        self._version_changed = threading.Condition(self._lock)
+        self._migrate_legacy_keys()
+
+        self._stop_event = threading.Event()
+        self._last_sweep = time.time()
+        self._flusher = None
+        if self.flush_interval > 0:
+            self._flusher = threading.Thread(target=self._flush_loop, name="MemoryFlusher", daemon=True)
+            self._flusher.start()
+
+    # --- Public API ---
+
+    def save(self, key, value, namespace: str | None = None, ttl: float | None = None):
+        """
+        Saves a value. `ttl` (seconds) overrides the namespace and default
+        TTLs for this entry; without any TTL the entry never expires.
+        """
+        composite = compose_key(key, namespace)
+        if ttl is None:
+            ttl = self.namespace_ttls.get(namespace or "", self.default_ttl)
+        expires_at = time.time() + ttl if ttl else None
+
+        with self._lock:
+            changed = composite not in self._data or self._data[composite] != value
+            self._put(composite, value, expires_at)
+            self._updated_at[composite] = time.time()
+            self._dirty.add(composite)
+            if self.max_bytes:
+                self._evict_over_quota(protect=composite)
+            watchers = self._watchers.pop(composite, []) if changed else []
+        for loop, future in watchers:
+            loop.call_soon_threadsafe(_resolve_future, future, value)
+
+    def load(self, key, namespace: str | None = None):
+        composite = compose_key(key, namespace)
+        with self._lock:
+            if composite not in self._data:
+                return None
+            if self._is_expired(composite, time.time()):
+                self._expire(composite)
+                return None
+            self._tracker.touch(composite)
+            return self._data[composite]
 
     def load_all(self):
-        with open(MEMORY_FILE, "r") as f:
-            return json.load(f)
+        now = time.time()
+        with self._lock:
+            return {key: value for key, value in self._data.items() if not self._is_expired(key, now)}
+
+    def delete(self, key, namespace: str | None = None):
+        """Removes a key; the deletion is persisted by the next flush."""
+        with self._lock:
+            self._remove(compose_key(key, namespace))
+
+    def version(self, key, namespace: str | None = None) -> int:
+        """The last persisted version of a key (0 if unknown). Only advances with the change feed enabled."""
+        with self._lock:
+            return self._versions.get(compose_key(key, namespace), 0)
+
+    def wait_for_change(self, key, since_version: int | None = None, namespace: str | None = None,
+                        timeout: float | None = None) -> tuple[int, object] | None:
+        """
+        Blocks until the key's version is greater than `since_version`
+        (default: its current version) and returns (version, value), or
+        None if `timeout` seconds pass first. Requires the change feed for
+        changes made by other processes.
+        """
+        composite = compose_key(key, namespace)
+        with self._version_changed:
+            if since_version is None:
+                since_version = self._versions.get(composite, 0)
+            changed = self._version_changed.wait_for(lambda: self._versions.get(composite, 0) > since_version, timeout)
+            if not changed:
+                return None
+            return self._versions[composite], self.load(key, namespace)
+
+    @property
+    def total_bytes(self) -> int:
+        """The serialized size of all cached values, as counted against max_bytes."""
+        return self._total_bytes
+
+    # --- Async API ---
+
+    async def aload(self, key, namespace: str | None = None):
+        """Async counterpart of load(). Served from the cache, so it never blocks the loop."""
+        return self.load(key, namespace)
+
+    async def asave(self, key, value, namespace: str | None = None, ttl: float | None = None):
+        """
+        Saves a key and waits until it has been persisted. The flush runs in
+        a worker thread, and asave() calls made in the same loop iteration
+        share a single flush.
+        """
+        self.save(key, value, namespace, ttl=ttl)
+        if self._pending_flush is None:
+            self._pending_flush = asyncio.get_running_loop().create_task(self._run_async_flush())
+        # Shielded so a cancelled caller does not cancel the batch other callers wait on.
+        await asyncio.shield(self._pending_flush)
+
+    async def awatch(self, key, namespace: str | None = None, timeout: float | None = None):
+        """
+        Waits until the key is saved with a new value and returns that value.
+        Raises asyncio.TimeoutError if `timeout` seconds pass first.
+        """
+        composite = compose_key(key, namespace)
+        loop = asyncio.get_running_loop()
+        entry = (loop, loop.create_future())
+        with self._lock:
+            self._watchers.setdefault(composite, []).append(entry)
+        try:
+            return await asyncio.wait_for(entry[1], timeout)
+        finally:
+            with self._lock:
+                waiting = self._watchers.get(composite, [])
+                if entry in waiting:
+                    waiting.remove(entry)
+                if not waiting:
+                    self._watchers.pop(composite, None)
+
+    async def aclose(self):
+        """Async counterpart of close(), run in a worker thread."""
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
+
+    async def _run_async_flush(self):
+        # Yield once so every asave() issued in this loop iteration joins the batch.
+        await asyncio.sleep(0)
+        self._pending_flush = None
+        await asyncio.get_running_loop().run_in_executor(None, self.flush)
+
+    # --- Queries ---
+    # Stores with indexes (SqliteStore) answer these directly, after pending
+    # writes are flushed so the results include them. Other stores fall back
+    # to a scan of the in-process cache.
+
+    def query_prefix(self, prefix: str, namespace: str | None = None, limit: int | None = None) -> dict:
+        """Returns the keys in `namespace` that start with `prefix`, in key order."""
+        if hasattr(self.store, "query_prefix"):
+            self.flush()
+            rows = self.store.query_prefix(prefix, namespace or "", limit)
+            return {key: value for key, value, _ in self._live_rows(rows)}
+        matches = sorted(item for item in self._namespace_items(namespace) if item[0].startswith(prefix))
+        return dict(matches[:limit])
+
+    def query_range(self, start: str, end: str, namespace: str | None = None, limit: int | None = None) -> dict:
+        """Returns the keys in `namespace` within the half-open range [start, end), in key order."""
+        if hasattr(self.store, "query_range"):
+            self.flush()
+            rows = self.store.query_range(start, end, namespace or "", limit)
+            return {key: value for key, value, _ in self._live_rows(rows)}
+        matches = sorted(item for item in self._namespace_items(namespace) if start <= item[0] < end)
+        return dict(matches[:limit])
+
+    def latest(self, n: int, namespace: str | None = None) -> list[tuple]:
+        """
+        Returns the `n` most recently saved (key, value, updated_at) entries
+        in `namespace`, newest first. Without a timestamped store, only keys
+        saved by this process carry a timestamp.
+        """
+        if hasattr(self.store, "latest"):
+            self.flush()
+            return self._live_rows(self.store.latest(n, namespace or ""))
+        with self._lock:
+            entries = [
+                (key, value, self._updated_at.get(compose_key(key, namespace), 0.0))
+                for key, value in self._namespace_items(namespace)
+            ]
+        return sorted(entries, key=lambda entry: entry[2], reverse=True)[:n]
+
+    # --- Persistence ---
+
+    def flush(self):
+        """Hands all dirty keys to the storage engine as a single batch."""
+        if not self._dirty and not self._pending_archive:
+            return
+        with self._flush_lock, (self._ipc_lock or nullcontext()):
+            with self._lock:
+                archive, self._pending_archive = self._pending_archive, []
+                if not self._dirty:
+                    changes, deleted, timestamps, dirty_keys = {}, set(), {}, set()
+                else:
+                    # Pick up keys written by other processes since our last read,
+                    # then re-apply our own pending changes on top of them.
+                    if self.store.has_external_changes():
+                        pending = {key: (self._data.get(key, _MISSING), self._expires_at.get(key)) for key in self._dirty}
+                        self._load_from_store()
+                        for key, (value, expires_at) in pending.items():
+                            if value is _MISSING:
+                                self._drop(key)
+                            else:
+                                self._put(key, value, expires_at)
+
+                    changes = {
+                        key: _wrap(self._data[key], self._expires_at.get(key))
+                        for key in self._dirty if key in self._data
+                    }
+                    deleted = {key for key in self._dirty if key not in self._data}
+                    timestamps = {key: self._updated_at[key] for key in changes if key in self._updated_at}
+                    dirty_keys = set(self._dirty)
+                    self._dirty.clear()
+
+            if archive:
+                self._write_archive(archive)
+            if not changes and not deleted:
+                return
+
+            try:
+                self.store.write_batch(changes, deleted, timestamps=timestamps)
+            except Exception:
+                # Keep the keys dirty so the next flush retries them.
+                with self._lock:
+                    self._dirty |= dirty_keys
+                raise
+            logger.debug(f"Flushed {len(changes)} changed and {len(deleted)} deleted memory key(s).")
+
+            if self._feed:
+                bumped = self._feed.publish(changes, deleted)
+                with self._version_changed:
+                    self._versions.update(bumped)
+                    self._version_changed.notify_all()
+
+    def sweep_expired(self) -> int:
+        """Removes every expired key. Returns how many were removed."""
+        removed = 0
+        now = time.time()
+        with self._lock:
+            while self._expiry_heap and self._expiry_heap[0][0] <= now:
+                expires_at, composite = heapq.heappop(self._expiry_heap)
+                # Skip stale heap entries left behind by re-saves and deletes.
+                if self._expires_at.get(composite) == expires_at:
+                    self._expire(composite)
+                    removed += 1
+        if removed:
+            logger.info(f"Memory sweep removed {removed} expired key(s).")
+        return removed
+
+    def close(self):
+        """Stops the background flusher, writes any pending changes and closes the store."""
+        self._stop_event.set()
+        if self._flusher and self._flusher.is_alive():
+            self._flusher.join(timeout=5)
+        self.flush()
+        if self._feed:
+            self._feed.close()
+        self.store.close()
+
+    # --- Internals ---
+
+    def _load_from_store(self):
+        """(Re)builds the cache and its size, expiry and eviction bookkeeping from the store."""
+        self._data: dict = {}
+        self._expires_at: dict[str, float] = {}
+        self._expiry_heap: list[tuple[float, str]] = []
+        self._sizes: dict[str, int] = {}
+        self._total_bytes = 0
+        self._tracker = EVICTION_POLICIES[self.eviction_policy]()
+        for composite, stored in self.store.load_all().items():
+            value, expires_at = _unwrap(stored)
+            self._put(composite, value, expires_at)
+
+    def _migrate_legacy_keys(self):
+        """Moves pre-namespace handoff keys into their agent's namespace (see LEGACY_KEY_NAMESPACES)."""
+        with self._lock:
+            moved = []
+            for key, namespace in LEGACY_KEY_NAMESPACES.items():
+                if key not in self._data:
+                    continue
+                composite = compose_key(key, namespace)
+                # A value already saved in the namespace is newer than the legacy one.
+                if composite not in self._data:
+                    self._put(composite, self._data[key], self._expires_at.get(key))
+                    self._dirty.add(composite)
+                    moved.append(composite)
+                self._remove(key)
+        if self._dirty:
+            self.flush()
+        if moved:
+            logger.info(f"Moved legacy memory keys into their agents' namespaces: {moved}")
+
+    def _put(self, composite: str, value, expires_at: float | None):
+        self._drop(composite)
+        self._data[composite] = value
+        if expires_at:
+            self._expires_at[composite] = expires_at
+            heapq.heappush(self._expiry_heap, (expires_at, composite))
+        if self.max_bytes:
+            size = len(json.dumps(value))
+            self._sizes[composite] = size
+            self._total_bytes += size
+        self._tracker.touch(composite)
+
+    def _drop(self, composite: str):
+        """Forgets a key in the cache only; its expiry heap entry is discarded lazily."""
+        self._data.pop(composite, None)
+        self._expires_at.pop(composite, None)
+        self._total_bytes -= self._sizes.pop(composite, 0)
+        self._tracker.remove(composite)
+
+    def _remove(self, composite: str):
+        if composite in self._data:
+            self._drop(composite)
+            self._dirty.add(composite)
+
+    def _is_expired(self, composite: str, now: float) -> bool:
+        expires_at = self._expires_at.get(composite)
+        return expires_at is not None and expires_at <= now
+
+    def _expire(self, composite: str):
+        self._archive(composite, "expired")
+        self._remove(composite)
+
+    def _evict_over_quota(self, protect: str):
+        while self._total_bytes > self.max_bytes:
+            victim = self._tracker.victim(exclude=protect)
+            if victim is None:
+                break
+            self._archive(victim, self.eviction_policy)
+            self._remove(victim)
+            logger.info(f"Evicted memory key '{victim}' ({self.eviction_policy}) to stay under {self.max_bytes} bytes.")
+
+    def _archive(self, composite: str, reason: str):
+        if not self.archive_path:
+            return
+        namespace, key = split_key(composite)
+        self._pending_archive.append({
+            "namespace": namespace,
+            "key": key,
+            "value": self._data.get(composite),
+            "reason": reason,
+            "archived_at": datetime.now().isoformat()
+        })
+
+    def _write_archive(self, entries: list[dict]):
+        # Each flush appends one gzip member; readers see them as a single stream.
+        os.makedirs(os.path.dirname(self.archive_path) or ".", exist_ok=True)
+        with gzip.open(self.archive_path, "at", encoding="utf-8") as f:
+            for entry in entries:
+                f.write(json.dumps(entry) + "\n")
+
+    def _apply_remote_change(self, message: dict):
+        """Called by the change feed listener when another process flushed a key."""
+        composite, version = message["key"], message["version"]
+        watchers, value = [], None
+        with self._version_changed:
+            if version <= self._versions.get(composite, 0):
+                return
+            self._versions[composite] = version
+            # A local write still waiting to be flushed wins; it is newer than this one.
+            if composite not in self._dirty:
+                if message.get("deleted"):
+                    self._drop(composite)
+                else:
+                    stored = message["value"] if "value" in message else self.store.get(composite)
+                    value, expires_at = _unwrap(stored)
+                    self._put(composite, value, expires_at)
+                    watchers = self._watchers.pop(composite, [])
+            self._version_changed.notify_all()
+        for loop, future in watchers:
+            loop.call_soon_threadsafe(_resolve_future, future, value)
+
+    def _live_rows(self, rows: list[tuple]) -> list[tuple]:
+        """Unwraps TTL envelopes in store query results and drops expired rows."""
+        now = time.time()
+        live = []
+        for key, stored, updated_at in rows:
+            value, expires_at = _unwrap(stored)
+            if expires_at is None or expires_at > now:
+                live.append((key, value, updated_at))
+        return live
+
+    def _namespace_items(self, namespace: str | None) -> list[tuple]:
+        """The live (key, value) pairs of one namespace, with the namespace stripped from the keys."""
+        namespace = namespace or ""
+        now = time.time()
+        items = []
+        with self._lock:
+            for composite, value in self._data.items():
+                item_namespace, key = split_key(composite)
+                if item_namespace == namespace and not self._is_expired(composite, now):
+                    items.append((key, value))
+        return items
+
+    def _flush_loop(self):
+        while not self._stop_event.wait(self.flush_interval):
+            try:
+                if self.sweep_interval and time.time() - self._last_sweep >= self.sweep_interval:
+                    self._last_sweep = time.time()
+                    self.sweep_expired()
+                self.flush()
+            except Exception as e:
+                logger.error(f"Background memory flush failed: {e}", exc_info=True)
+
+
+_MISSING = object()
+
+
+def _wrap(value, expires_at: float | None):
+    return {EXPIRES_FIELD: expires_at, VALUE_FIELD: value} if expires_at else value
+
+
+def _unwrap(stored) -> tuple:
+    if isinstance(stored, dict) and EXPIRES_FIELD in stored and VALUE_FIELD in stored:
+        return stored[VALUE_FIELD], stored[EXPIRES_FIELD]
+    return stored, None
+
+
+def _resolve_future(future: asyncio.Future, value):
+    if not future.done():
+        future.set_result(value)
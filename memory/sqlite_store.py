@@ -0,0 +1,139 @@
+# memory/sqlite_store.py
+
+import json
+import os
+import time
+import sqlite3
+import logging
+import threading
+from memory.stores import MemoryStore, compose_key, split_key
+
+# Configure logging for this module
+logger = logging.getLogger(__name__)
+
+SQLITE_FILE = "memory/memory.db"
+
+# How long a writer waits for another process's write transaction to finish.
+BUSY_TIMEOUT_MS = 5000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS memory (
+    namespace  TEXT NOT NULL,
+    key        TEXT NOT NULL,
+    value      TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (namespace, key)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_memory_updated_at ON memory (namespace, updated_at);
+"""
+
+
+class SqliteStore(MemoryStore):
+    """
+    A SQLite-backed store in WAL mode, safe to share between agent processes.
+
+    Each key lives in its own row under (namespace, key) with the time it was
+    last saved. A batch is a single IMMEDIATE transaction of per-key upserts,
+    so concurrent writers from different processes serialize on SQLite's
+    lock and never overwrite each other's unrelated keys. WAL lets readers
+    run alongside a writer without blocking.
+
+    Besides the MemoryStore API it offers indexed prefix, range and
+    "latest N" queries, so agents can fetch only the rows they need.
+    """
+    def __init__(self, path: str = SQLITE_FILE, busy_timeout_ms: int = BUSY_TIMEOUT_MS):
+        self.path = path
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+
+        # The connection is shared by the caller's threads and Memory's flusher.
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=busy_timeout_ms / 1000,
+                                     isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(f"PRAGMA busy_timeout={busy_timeout_ms}")
+        self._conn.executescript(SCHEMA)
+        # PRAGMA data_version only moves when another connection commits, so
+        # our own writes never count as external changes.
+        self._data_version = self._read_data_version()
+
+    # --- MemoryStore API ---
+
+    def load_all(self) -> dict:
+        with self._lock:
+            # Read before the rows: a commit landing in between is reported next time rather than missed.
+            self._data_version = self._read_data_version()
+            rows = self._conn.execute("SELECT namespace, key, value FROM memory").fetchall()
+        return {compose_key(key, namespace): json.loads(value) for namespace, key, value in rows}
+
+    def write_batch(self, changes: dict, deleted: set | None = None, timestamps: dict | None = None):
+        now = time.time()
+        timestamps = timestamps or {}
+        upserts = [
+            (*split_key(composite), json.dumps(value), timestamps.get(composite, now))
+            for composite, value in changes.items()
+        ]
+        deletes = [split_key(composite) for composite in (deleted or ())]
+
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany(
+                    "INSERT INTO memory (namespace, key, value, updated_at) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT (namespace, key) DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at",
+                    upserts
+                )
+                self._conn.executemany("DELETE FROM memory WHERE namespace = ? AND key = ?", deletes)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def has_external_changes(self) -> bool:
+        with self._lock:
+            return self._read_data_version() != self._data_version
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM memory").fetchone()[0]
+
+    def get(self, key: str):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM memory WHERE namespace = ? AND key = ?", split_key(key)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    # --- Indexed queries ---
+    # Each returns a list of (key, value, updated_at) tuples.
+
+    def query_prefix(self, prefix: str, namespace: str = "", limit: int | None = None) -> list[tuple]:
+        """Keys starting with `prefix`, in key order. Uses the primary key index, not LIKE."""
+        if not prefix:
+            return self._query("namespace = ?", (namespace,), "key", limit)
+        return self._query("namespace = ? AND key >= ? AND key < ?",
+                           (namespace, prefix, prefix + "\uffff"), "key", limit)
+
+    def query_range(self, start: str, end: str, namespace: str = "", limit: int | None = None) -> list[tuple]:
+        """Keys in the half-open range [start, end), in key order."""
+        return self._query("namespace = ? AND key >= ? AND key < ?", (namespace, start, end), "key", limit)
+
+    def latest(self, n: int, namespace: str = "") -> list[tuple]:
+        """The `n` most recently saved keys, newest first."""
+        return self._query("namespace = ?", (namespace,), "updated_at DESC", n)
+
+    def _read_data_version(self) -> int:
+        return self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def _query(self, where: str, params: tuple, order_by: str, limit: int | None) -> list[tuple]:
+        sql = f"SELECT key, value, updated_at FROM memory WHERE {where} ORDER BY {order_by}"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params = params + (limit,)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [(key, json.loads(value), updated_at) for key, value, updated_at in rows]
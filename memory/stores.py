@@ -0,0 +1,134 @@
+# memory/stores.py
+
+import json
+import os
+import tempfile
+import logging
+from contextlib import nullcontext
+
+# Configure logging for this module
+logger = logging.getLogger(__name__)
+
+
+# Agents keep their keys apart by namespace. Stores that have no notion of
+# namespaces persist them as a flat "<namespace>/<key>" string; keys in the
+# default namespace keep their plain name, so existing memory.json files
+# remain valid.
+NAMESPACE_SEPARATOR = "/"
+
+
+def compose_key(key: str, namespace: str | None = None) -> str:
+    """Builds the flat storage key for a key in the given namespace."""
+    return f"{namespace}{NAMESPACE_SEPARATOR}{key}" if namespace else key
+
+
+def split_key(composite_key: str) -> tuple[str, str]:
+    """Splits a flat storage key back into (namespace, key). The default namespace is ''."""
+    namespace, separator, key = composite_key.partition(NAMESPACE_SEPARATOR)
+    return (namespace, key) if separator else ("", composite_key)
+
+
+class MemoryStore:
+    """
+    The storage engine interface behind Memory.
+
+    Memory keeps every value in its own in-process cache, so a store only has
+    to load the full key space once and then persist batches of changed keys.
+    """
+
+    def load_all(self) -> dict:
+        """Returns every stored key and value."""
+        raise NotImplementedError
+
+    def write_batch(self, changes: dict, deleted: set | None = None, timestamps: dict | None = None):
+        """
+        Persists a batch of changed keys and removes the deleted ones.
+        `timestamps` maps changed keys to the time they were saved, for
+        stores that keep per-key timestamps.
+        """
+        raise NotImplementedError
+
+    def get(self, key: str):
+        """Returns one stored value. Stores with an index override this to avoid a full load."""
+        return self.load_all().get(key)
+
+    def has_external_changes(self) -> bool:
+        """Reports whether another process has written to the store since we last read or wrote it."""
+        return False
+
+    def close(self):
+        """Releases any file handles or background workers held by the store."""
+        pass
+
+    def import_json(self, json_path: str) -> int:
+        """
+        Migrates an existing single-document memory.json into this store.
+        Returns the number of keys imported.
+        """
+        with open(json_path, "r") as f:
+            data = json.load(f)
+        self.write_batch(data)
+        logger.info(f"Imported {len(data)} memory keys from {json_path}.")
+        return len(data)
+
+
+class JsonFileStore(MemoryStore):
+    """
+    The original single-document backend: the whole key space lives in one
+    pretty-printed JSON file that is rewritten atomically on every batch.
+    Simple and human-readable, but each write costs O(total memory).
+
+    `lock` is the inter-process lock the writers share (see
+    memory/change_feed.py); a missing file is only created while holding it,
+    so processes starting together cannot replace each other's first writes.
+    """
+    def __init__(self, path: str, lock=None):
+        self.path = path
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        if not os.path.exists(self.path):
+            with lock or nullcontext():
+                if not os.path.exists(self.path):
+                    self._atomic_write({})
+        self._doc: dict = {}
+        self._file_stamp = None
+
+    def load_all(self) -> dict:
+        with open(self.path, "r") as f:
+            text = f.read()
+        # An empty file (e.g. left by a pre-atomic version of this store) holds no keys.
+        self._doc = json.loads(text) if text.strip() else {}
+        self._file_stamp = self._stat_file()
+        return dict(self._doc)
+
+    def write_batch(self, changes: dict, deleted: set | None = None, timestamps: dict | None = None):
+        doc = dict(self._doc)
+        doc.update(changes)
+        for key in deleted or ():
+            doc.pop(key, None)
+        self._atomic_write(doc)
+        self._doc = doc
+        self._file_stamp = self._stat_file()
+
+    def has_external_changes(self) -> bool:
+        return self._file_stamp != self._stat_file()
+
+    def _stat_file(self):
+        try:
+            st = os.stat(self.path)
+            return (st.st_mtime_ns, st.st_size)
+        except FileNotFoundError:
+            return None
+
+    def _atomic_write(self, data: dict):
+        directory = os.path.dirname(self.path) or "."
+        fd, tmp_path = tempfile.mkstemp(prefix=".memory-", suffix=".tmp", dir=directory)
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(data, f, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
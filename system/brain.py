@@ -3,11 +3,12 @@
 import logging
 import asyncio
 import json
-import re
+import time
 import numpy as np
 from tools.web_controller import WebController
 from tools.perception_controller import PerceptionController
-from tools.gemini_ui_vision import smart_vision_query
+from tools.capture_engine import get_capture_engine
+from tools.gemini_ui_vision import asmart_vision_query
 from system.agentos_core import AgentOSCore
 from agents.supervisor import SupervisorAgent
 
@@ -15,6 +16,10 @@ from agents.supervisor import SupervisorAgent
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# How long perception waits for a frame captured after the last action
+# before falling back to a direct capture.
+FRAME_WAIT_TIMEOUT = 2.0
+
 class Brain:
     """
     The central cognitive system for AgentOS. It orchestrates the entire
@@ -29,17 +34,23 @@ class Brain:
         self.supervisor = supervisor
         self.web_controller: WebController = self.core.web_controller
         self.perception_controller = PerceptionController()
+        # Background grabber; perception reads its frames instead of capturing inline.
+        self.capture_engine = get_capture_engine()
+        # Monotonic time at which the last action finished.
+        self.last_action_at = 0.0
         # The history stores the chain of thought for the mission
         self.history = []
 
     async def _initialize_connections(self) -> bool:
         """Connects to necessary external resources, like the browser."""
         logger.info("Brain initializing connections...")
+        self.capture_engine.start()
         return await self.web_controller.connect()
 
     async def _shutdown_connections(self):
         """Gracefully disconnects from external resources."""
         logger.info("Brain shutting down connections...")
+        self.capture_engine.stop()
         await self.web_controller.close()
 
     async def perceive_environment(self) -> dict:
@@ -47,16 +58,28 @@ class Brain:
         Gathers a multimodal understanding of the current environment.
         """
         logger.info("🧠 Perceiving environment...")
-        
-        full_screen_pixels, _ = self.perception_controller.capture_primary_monitor()
+
+        # Use the newest buffered frame, as long as it shows the screen after the last action.
+        frame = self.capture_engine.latest()
+        if frame is None or frame[0] <= self.last_action_at:
+            frame = await asyncio.to_thread(self.capture_engine.first_after, self.last_action_at, FRAME_WAIT_TIMEOUT)
+        if frame is not None:
+            _, full_screen_pixels, _ = frame
+        else:
+            logger.warning("No fresh frame from the capture engine. Capturing the screen directly.")
+            full_screen_pixels, _ = self.perception_controller.capture_primary_monitor()
         if full_screen_pixels is None:
             return {"error": "Screen capture failed."}
 
+        # Regions that changed since the previous step (the whole screen on the first one).
+        dirty_rects = self.perception_controller.changed_regions(full_screen_pixels, caller="Brain")
+
         dom_tree = await self.web_controller.extract_full_dom_with_bounding_rects()
         
         observation = {
             "dom_tree": dom_tree,
-            "full_screenshot_pixels": full_screen_pixels
+            "full_screenshot_pixels": full_screen_pixels,
+            "dirty_rects": dirty_rects
         }
         
         logger.info(f"Perception complete. Found {len(dom_tree) if dom_tree else 0} visible DOM elements.")
@@ -66,6 +89,10 @@ class Brain:
         """
         Uses Gemini 1.5 Pro to decide the next best action by reasoning about
         the mission goal and the history of previous steps.
+
+        The reply is streamed and returned as soon as its "action" is
+        complete; the model writes a one-line "thought" before the action and
+        any longer "reasoning" after it, which is not waited for.
         """
         logger.info("🤔 Thinking... Deciding next action with Gemini 1.5 Pro.")
         
@@ -89,18 +116,19 @@ class Brain:
 
         Based on the goal and history, what is the single next logical step?
         Available Actions: BROWSE(url), TYPE(selector, text), CLICK(selector), FINISH(reason), FAIL(reason).
-        Respond with a single JSON object with your "reasoning" and the "action" to take.
-        Example: {{"reasoning": "I need to log in first.", "action": {{"name": "TYPE", "selector": "#username", "text": "my_user"}}}}
+        Respond with a single JSON object, in this order: a one-sentence "thought", the "action" to take,
+        then optionally any longer "reasoning".
+        Example: {{"thought": "I need to log in first.", "action": {{"name": "TYPE", "selector": "#username", "text": "my_user"}}, "reasoning": "..."}}
         """
         
-        response_text = smart_vision_query(observation["full_screenshot_pixels"], prompt, models=["gemini-1.5-pro-latest"])
+        response_text = await asmart_vision_query(observation["full_screenshot_pixels"], prompt, profile="planning", stream_until="action",
+                                                  caller="Brain")
         if not response_text:
             return {"action": {"name": "FAIL", "reason": "Vision model failed to respond."}}
             
         try:
-            match = re.search(r'\{.*\}', response_text, re.DOTALL)
-            if not match: raise json.JSONDecodeError("No JSON object found", response_text, 0)
-            return json.loads(match.group(0))
+            # A streamed reply arrives as a clean JSON object holding the members up to the action.
+            return json.loads(response_text)
         except json.JSONDecodeError:
             logger.error(f"Failed to parse JSON from brain's decision response: {response_text}")
             return {"action": {"name": "FAIL", "reason": "Could not parse decision from vision model."}}
@@ -119,7 +147,7 @@ class Brain:
         action_name = action.get("name").lower()
         
         # The Brain now gets approval from the supervisor BEFORE executing the action.
-        is_approved = self.supervisor.approve_action("Brain", action_name, action, goal)
+        is_approved = await self.supervisor.approve_action("Brain", action_name, action, goal)
         if not is_approved:
             return False
             
@@ -156,6 +184,9 @@ class Brain:
                 if "error" in observation:
                     self.history.append({"thought": "Perception failed, cannot continue."})
                     break
+                if self.history and "outcome" in self.history[-1]:
+                    # Tells the model whether its last action had any visible effect.
+                    self.history[-1]["screen_changed"] = bool(observation["dirty_rects"])
 
                 decision = await self.decide_next_action(goal, observation)
                 if not decision:
@@ -163,7 +194,7 @@ class Brain:
                     break
 
                 action = decision.get("action")
-                thought = decision.get("reasoning")
+                thought = decision.get("thought") or decision.get("reasoning")
                 
                 self.history.append({"thought": thought, "action": action})
 
@@ -172,6 +203,7 @@ class Brain:
                     break
                 
                 success = await self.execute_action(action, goal, observation["full_screenshot_pixels"])
+                self.last_action_at = time.monotonic()
                 self.history[-1]["outcome"] = "Success" if success else "Failure"
                 
                 if not success:
@@ -0,0 +1,111 @@
+# system/error_aggregator.py
+
+import re
+import hashlib
+from datetime import datetime
+
+# Keep at most this many distinct agent names per fingerprint.
+MAX_AGENTS_PER_FINGERPRINT = 16
+
+# Normalization rules, applied in order. Each replaces the variable part of a
+# message with a placeholder so that repeats of the same error collapse.
+_NORMALIZERS = [
+    (re.compile(r"https?://\S+"), "<url>"),
+    (re.compile(r"(?:[A-Za-z]:)?(?:[\\/][\w.\-]+){2,}[\\/]?"), "<path>"),
+    (re.compile(r"(['\"`]).*?\1"), "<str>"),
+    # CSS selectors: "#id", ".class", "div[data-testid=x]", and chains of them.
+    (re.compile(r"(?<![\w<])(?:\w*(?:[#.][A-Za-z_][\w\-]*|\[[\w\-]+(?:[~|^$*]?=[^\]]*)?\]))+"), "<selector>"),
+    (re.compile(r"\b0x[0-9a-fA-F]+\b|\b[0-9a-fA-F]{12,}\b"), "<hex>"),
+    (re.compile(r"\d+(?:\.\d+)?"), "<num>"),
+]
+# Leading status emoji and symbols ("❌ ", "⚠️ ") carry no information.
+_LEADING_SYMBOLS = re.compile(r"^[^\w<]+")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_message(message: str) -> str:
+    """Reduces an error message to its stable pattern (numbers, paths, selectors etc. replaced)."""
+    pattern = str(message)
+    for regex, placeholder in _NORMALIZERS:
+        pattern = regex.sub(placeholder, pattern)
+    pattern = _LEADING_SYMBOLS.sub("", pattern)
+    return _WHITESPACE.sub(" ", pattern).strip().lower()
+
+
+def fingerprint_message(message: str) -> tuple[str, str]:
+    """Returns (fingerprint, pattern) for an error message."""
+    pattern = normalize_message(message)
+    return hashlib.sha1(pattern.encode("utf-8")).hexdigest()[:12], pattern
+
+
+class ErrorAggregator:
+    """
+    Streaming, de-duplicating aggregation of error log entries.
+
+    Messages are fingerprinted by their normalized pattern, and each
+    fingerprint keeps only a count, first/last seen times, one sample
+    message and the (capped) set of affected agents. Memory therefore grows
+    with the number of distinct errors, not with the number of error lines.
+    The state round-trips through to_list()/from_list() for persistence, and
+    two aggregators can be merged.
+    """
+    def __init__(self):
+        self.errors: dict[str, dict] = {}
+
+    def add(self, agent: str, message: str, timestamp: str | None = None):
+        fingerprint, pattern = fingerprint_message(message)
+        seen_at = timestamp or datetime.now().isoformat()
+        record = self.errors.get(fingerprint)
+        if record is None:
+            self.errors[fingerprint] = {
+                "fingerprint": fingerprint,
+                "pattern": pattern,
+                "sample": message,
+                "count": 1,
+                "first_seen": seen_at,
+                "last_seen": seen_at,
+                "agents": [agent]
+            }
+            return
+        record["count"] += 1
+        record["first_seen"] = min(record["first_seen"], seen_at)
+        record["last_seen"] = max(record["last_seen"], seen_at)
+        if agent not in record["agents"] and len(record["agents"]) < MAX_AGENTS_PER_FINGERPRINT:
+            record["agents"].append(agent)
+
+    def add_entry(self, entry: dict):
+        """Adds an agent log entry (as written by AgentShell.log)."""
+        self.add(entry.get("agent", "unknown"), entry.get("message", "No message"), entry.get("timestamp"))
+
+    def merge(self, other: "ErrorAggregator"):
+        for fingerprint, theirs in other.errors.items():
+            ours = self.errors.get(fingerprint)
+            if ours is None:
+                self.errors[fingerprint] = {**theirs, "agents": list(theirs["agents"])}
+                continue
+            ours["count"] += theirs["count"]
+            ours["first_seen"] = min(ours["first_seen"], theirs["first_seen"])
+            ours["last_seen"] = max(ours["last_seen"], theirs["last_seen"])
+            for agent in theirs["agents"]:
+                if agent not in ours["agents"] and len(ours["agents"]) < MAX_AGENTS_PER_FINGERPRINT:
+                    ours["agents"].append(agent)
+
+    @property
+    def total(self) -> int:
+        return sum(record["count"] for record in self.errors.values())
+
+    def top(self, n: int | None = None) -> list[dict]:
+        """Aggregates ordered by count (then most recent), at most `n` of them."""
+        ranked = sorted(self.errors.values(), key=lambda r: (r["count"], r["last_seen"]), reverse=True)
+        return ranked[:n]
+
+    def to_list(self) -> list[dict]:
+        return self.top()
+
+    @classmethod
+    def from_list(cls, records: list[dict] | None) -> "ErrorAggregator":
+        aggregator = cls()
+        for record in records or []:
+            if "fingerprint" in record:
+                aggregator.errors[record["fingerprint"]] = {**record, "agents": list(record.get("agents", []))}
+        return aggregator
@@ -0,0 +1,219 @@
+# system/log_scanner.py
+
+import os
+import json
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from memory.memory import Memory
+from system.error_aggregator import ErrorAggregator
+
+try:
+    import orjson
+except ImportError:  # Optional; the standard json module is used instead.
+    orjson = None
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Memory key (in the consumer's namespace) that holds the per-file checkpoints.
+CHECKPOINT_KEY = "log_scan_checkpoints"
+
+# Worker processes for aggregate(). 1 keeps the analysis in this process.
+DEFAULT_WORKERS = int(os.getenv("LOG_SCAN_WORKERS", "1"))
+# "auto" uses orjson when it is installed, "json" forces the standard parser.
+DEFAULT_JSON_PARSER = os.getenv("LOG_SCAN_JSON_PARSER", "auto")
+# Files are split into line-aligned shards of about this many bytes.
+DEFAULT_SHARD_BYTES = 64 * 1024 * 1024
+# Below this much unread data a process pool costs more than it saves.
+MIN_PARALLEL_BYTES = 8 * 1024 * 1024
+
+
+def _json_loads(parser: str):
+    if parser == "orjson" or (parser == "auto" and orjson is not None):
+        if orjson is None:
+            raise ImportError("orjson is not installed.")
+        return orjson.loads
+    return json.loads
+
+
+def _aggregate_shard(path: str, start: int, end: int, level: str, parser: str) -> tuple[int, int, list[dict]]:
+    """
+    Aggregates the `level` entries of the complete lines in bytes [start, end)
+    of a log file. Runs in a worker process. Returns (offset reached,
+    malformed line count, aggregate records).
+    """
+    loads = _json_loads(parser)
+    aggregator = ErrorAggregator()
+    malformed = 0
+    offset = start
+    with open(path, "rb") as f:
+        f.seek(start)
+        while offset < end:
+            raw = f.readline(end - offset)
+            if not raw.endswith(b"\n"):
+                break  # Partially written line; pick it up next time.
+            offset += len(raw)
+            if not raw.strip():
+                continue
+            try:
+                entry = loads(raw)
+            except ValueError:  # Bad JSON or bad UTF-8 (orjson.JSONDecodeError is a ValueError too)
+                entry = None
+            if not isinstance(entry, dict):
+                malformed += 1
+                continue
+            if entry.get("level") == level:
+                aggregator.add_entry(entry)
+    return offset, malformed, aggregator.to_list()
+
+
+class LogScanner:
+    """
+    Incremental reader for the agents' JSON-line log files.
+
+    For every file it remembers the byte offset up to which lines have been
+    processed, plus the file's inode and size. A scan resumes at the stored
+    offset, so each run only parses what was appended since the last one.
+    A changed inode (the file was rotated or replaced) or a size below the
+    offset (the file was truncated) restarts that file from byte 0. A final
+    line without a newline is still being written and is left for next time.
+
+    Checkpoints live in shared memory under the consumer's namespace, so
+    SystemBrain and SelfPatcher each keep their own position while sharing
+    this engine. They are only persisted by commit(), after the caller has
+    processed the lines, so a crash mid-scan re-reads rather than skips.
+
+    aggregate() is the analysis path: it splits the unread part of every
+    file into line-aligned shards, aggregates each shard (in a process pool
+    when `workers` > 1) and merges the partial aggregates here.
+    """
+    def __init__(self, log_folder: str, memory: Memory, consumer: str, suffix: str = ".json",
+                 workers: int = DEFAULT_WORKERS, json_parser: str = DEFAULT_JSON_PARSER,
+                 shard_bytes: int = DEFAULT_SHARD_BYTES):
+        self.log_folder = log_folder
+        self.memory = memory
+        self.consumer = consumer
+        self.suffix = suffix
+        self.workers = max(1, workers)
+        self.json_parser = json_parser
+        self.shard_bytes = shard_bytes
+        self._loads = _json_loads(json_parser)
+        self.checkpoints: dict = dict(self.memory.load(CHECKPOINT_KEY, namespace=self.consumer) or {})
+        # Lines that failed to parse in the current scan, per file.
+        self.malformed: dict[str, int] = {}
+
+    def scan(self):
+        """Yields (filename, entry) for every complete log line appended since the last commit."""
+        self.malformed = {}
+        for filename in self._log_files():
+            yield from self._scan_file(filename)
+
+    def aggregate(self, aggregator: ErrorAggregator, level: str = "error") -> int:
+        """
+        Adds every `level` entry appended since the last commit to `aggregator`.
+        Returns the number of entries added.
+        """
+        self.malformed = {}
+        shards = []  # (filename, path, start, end, is_last_shard_of_file)
+        stats = {}
+        for filename in self._log_files():
+            path = os.path.join(self.log_folder, filename)
+            try:
+                st = os.stat(path)
+                start = self._start_offset(filename, st)
+                bounds = self._shard_bounds(path, start, st.st_size)
+            except OSError as e:
+                logger.error(f"Could not read log file {path}: {e}")
+                continue
+            stats[filename] = st
+            if not bounds:
+                self.checkpoints[filename] = {"offset": start, "inode": st.st_ino, "size": st.st_size}
+            for i, (shard_start, shard_end) in enumerate(bounds):
+                shards.append((filename, path, shard_start, shard_end, i == len(bounds) - 1))
+
+        pending = sum(end - start for _, _, start, end, _ in shards)
+        if self.workers > 1 and len(shards) > 1 and pending >= MIN_PARALLEL_BYTES:
+            with ProcessPoolExecutor(max_workers=min(self.workers, len(shards))) as pool:
+                futures = [pool.submit(_aggregate_shard, path, start, end, level, self.json_parser)
+                           for _, path, start, end, _ in shards]
+                results = [future.result() for future in futures]
+        else:
+            results = [_aggregate_shard(path, start, end, level, self.json_parser)
+                       for _, path, start, end, _ in shards]
+
+        added = 0
+        for (filename, _, _, _, last), (offset, malformed, records) in zip(shards, results):
+            partial = ErrorAggregator.from_list(records)
+            added += partial.total
+            aggregator.merge(partial)
+            if malformed:
+                self.malformed[filename] = self.malformed.get(filename, 0) + malformed
+            if last:
+                st = stats[filename]
+                self.checkpoints[filename] = {"offset": offset, "inode": st.st_ino, "size": st.st_size}
+        return added
+
+    def commit(self):
+        """Persists the checkpoints reached by the last scan."""
+        self.memory.save(CHECKPOINT_KEY, dict(self.checkpoints), namespace=self.consumer)
+
+    def _log_files(self) -> list[str]:
+        if not os.path.exists(self.log_folder):
+            return []
+        return [name for name in sorted(os.listdir(self.log_folder)) if name.endswith(self.suffix)]
+
+    def _shard_bounds(self, path: str, start: int, size: int) -> list[tuple[int, int]]:
+        """Splits bytes [start, size) of a file into shards that begin and end on line boundaries."""
+        bounds = []
+        with open(path, "rb") as f:
+            while start < size:
+                end = start + self.shard_bytes
+                if end >= size:
+                    end = size
+                else:
+                    f.seek(end)
+                    f.readline()  # Move the cut to just after the next newline.
+                    end = min(f.tell(), size)
+                bounds.append((start, end))
+                start = end
+        return bounds
+
+    def _start_offset(self, filename: str, st: os.stat_result) -> int:
+        checkpoint = self.checkpoints.get(filename)
+        if not checkpoint:
+            return 0
+        if checkpoint.get("inode") != st.st_ino:
+            logger.info(f"Log file {filename} was rotated or replaced. Scanning it from the start.")
+            return 0
+        if st.st_size < checkpoint.get("offset", 0):
+            logger.info(f"Log file {filename} was truncated. Scanning it from the start.")
+            return 0
+        return checkpoint.get("offset", 0)
+
+    def _scan_file(self, filename: str):
+        path = os.path.join(self.log_folder, filename)
+        try:
+            st = os.stat(path)
+            offset = self._start_offset(filename, st)
+            if offset == st.st_size:
+                return
+            with open(path, "rb") as f:
+                f.seek(offset)
+                for raw in iter(f.readline, b""):
+                    if not raw.endswith(b"\n"):
+                        break  # Partially written line; pick it up next time.
+                    offset += len(raw)
+                    if not raw.strip():
+                        continue
+                    try:
+                        entry = self._loads(raw)
+                    except ValueError:  # Bad JSON or bad UTF-8
+                        entry = None
+                    if not isinstance(entry, dict):
+                        self.malformed[filename] = self.malformed.get(filename, 0) + 1
+                        continue
+                    yield filename, entry
+        except OSError as e:
+            logger.error(f"Could not read log file {path}: {e}")
+            return
+        self.checkpoints[filename] = {"offset": offset, "inode": st.st_ino, "size": st.st_size}
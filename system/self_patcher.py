@@ -1,12 +1,14 @@
 # system/self_patcher.py
 
 import os
-import json
 import logging
 from agents.agent_shell import AgentShell
 from memory.memory import Memory
 from system.agentos_core import AgentOSCore
 from agents.supervisor import SupervisorAgent
+from agents.log_sink import get_log_sink
+from system.log_scanner import LogScanner
+from system.error_aggregator import ErrorAggregator
 from datetime import datetime
 
 # Configure logging
@@ -22,47 +24,49 @@ class SelfPatcherAgent(AgentShell):
         super().__init__(name=name, core=core, memory=memory, supervisor=supervisor)
         self.log_folder = "logs"
         self.task_context = "Scan system logs for errors and suggest patches."
+        self.scanner = LogScanner(self.log_folder, self.memory, consumer=self.name)
 
-    def _scan_logs_for_failures(self) -> list[str]:
-        """Scans all .json log files for entries with a level of 'error'."""
+    def _scan_logs_for_failures(self, aggregator: ErrorAggregator) -> int:
+        """
+        Feeds the error entries appended since the last scan into the aggregator.
+        Returns the number of new error lines found.
+        """
         self.log("Scanning logs for failure signatures...")
-        actions_needed = []
 
         if not os.path.exists(self.log_folder):
             self.log(f"Log folder '{self.log_folder}' not found. Nothing to scan.", level="warning")
-            return []
+            return 0
 
-        for filename in os.listdir(self.log_folder):
-            if filename.endswith(".json"):
-                path = os.path.join(self.log_folder, filename)
-                try:
-                    with open(path, "r", encoding="utf-8") as f:
-                        for line in f:
-                            try:
-                                entry = json.loads(line)
-                                if entry.get("level") == "error":
-                                    error_message = f"Restart agent '{entry.get('agent', 'unknown')}' due to error: {entry.get('message', 'No message')}"
-                                    actions_needed.append(error_message)
-                            except json.JSONDecodeError:
-                                continue # Skip malformed log lines
-                except Exception as e:
-                    self.log(f"Could not read log file {path}: {e}", level="error")
-        
-        return actions_needed
+        # Make sure records still buffered in this process are on disk before reading.
+        get_log_sink().flush()
+
+        # Malformed log lines are skipped by the scanner.
+        return self.scanner.aggregate(aggregator)
 
     def run(self):
         """The main execution logic for the SelfPatcherAgent."""
-        actions = self._scan_logs_for_failures()
+        previous = self.memory.load("self_patcher_suggestions", namespace=self.name) or {}
+        aggregator = ErrorAggregator.from_list(previous.get("errors"))
+        found = self._scan_logs_for_failures(aggregator)
 
-        if not actions:
+        if not found:
+            self.scanner.commit()
             self.log("Scan complete. No patching actions needed.")
             return
 
+        # One suggestion per distinct failure, not one per log line.
+        actions = [
+            f"Restart agent(s) {', '.join(repr(agent) for agent in record['agents'])} due to error "
+            f"(seen {record['count']}x): {record['sample']}"
+            for record in aggregator.top()
+        ]
         patch_plan = {
             "timestamp": datetime.now().isoformat(),
-            "suggested_actions": actions
+            "suggested_actions": actions,
+            "errors": aggregator.to_list()
         }
 
         # Use the shared memory instance to save the suggestions
-        self.memory.save("self_patcher_suggestions", patch_plan)
-        self.log(f"Scan complete. Found {len(actions)} potential issues and saved patch plan to memory.")
+        self.memory.save("self_patcher_suggestions", patch_plan, namespace=self.name)
+        self.scanner.commit()
+        self.log(f"Scan complete. Found {found} new errors; patch plan covers {len(actions)} distinct issues.")
@@ -1,17 +1,21 @@
 # system/system_brain.py
 
 import os
-import json
 import logging
 from agents.agent_shell import AgentShell
 from memory.memory import Memory
 from system.agentos_core import AgentOSCore
 from agents.supervisor import SupervisorAgent
+from agents.log_sink import get_log_sink
+from system.log_scanner import LogScanner
+from system.error_aggregator import ErrorAggregator
 from datetime import datetime
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
+NOMINAL_INSIGHT = "All systems nominal. No errors found in logs."
+
 class SystemBrainAgent(AgentShell):
     """
     Reflects on agent logs to provide insights and summaries.
@@ -26,36 +30,39 @@ class SystemBrainAgent(AgentShell):
     def run(self):
         """The main execution logic for the SystemBrainAgent."""
         self.log("Reviewing agent logs for insights...")
-        thoughts = []
 
         if not os.path.exists(self.log_folder):
             self.log(f"Log folder '{self.log_folder}' not found. Nothing to review.", level="warning")
             return
 
-        for filename in os.listdir(self.log_folder):
-            if filename.endswith(".json"):
-                path = os.path.join(self.log_folder, filename)
-                try:
-                    with open(path, "r", encoding="utf-8") as f:
-                        for line in f:
-                            try:
-                                entry = json.loads(line)
-                                # Check for log entries that are explicitly errors
-                                if entry.get("level") == "error":
-                                    thoughts.append(f"Found an error for agent '{entry.get('agent', 'unknown')}': {entry.get('message', 'No message')}")
-                            except json.JSONDecodeError:
-                                # This can happen if a log file is corrupted or partially written
-                                self.log(f"Skipping malformed line in {filename}", level="warning")
-                                continue
-                except Exception as e:
-                    self.log(f"Could not read log file {path}: {e}", level="error")
-        
+        # Make sure records still buffered in this process are on disk before reading.
+        get_log_sink().flush()
+
+        # Repeated errors are folded into one aggregate per fingerprint, continuing
+        # from the aggregate of previous reviews.
+        previous = self.memory.load("system_brain_reflection", namespace=self.name) or {}
+        aggregator = ErrorAggregator.from_list(previous.get("errors"))
+
+        # Only lines appended since the previous review are read.
+        # Large backlogs are split across worker processes (LOG_SCAN_WORKERS).
+        scanner = LogScanner(self.log_folder, self.memory, consumer=self.name)
+        new_errors = scanner.aggregate(aggregator)
+        for filename, count in scanner.malformed.items():
+            # This can happen if a log file is corrupted or partially written
+            self.log(f"Skipped {count} malformed line(s) in {filename}", level="warning")
+
+        insights = [
+            f"Error seen {record['count']}x for {', '.join(record['agents'])} "
+            f"(last at {record['last_seen']}): {record['sample']}"
+            for record in aggregator.top()
+        ]
         summary = {
             "timestamp": datetime.now().isoformat(),
-            "insights": thoughts or ["All systems nominal. No errors found in logs."]
+            "insights": insights or [NOMINAL_INSIGHT],
+            "errors": aggregator.to_list()
         }
         
         # Use the shared memory instance to save the reflection
-        self.memory.save("system_brain_reflection", summary)
-        self.log(f"Reflection complete. Found {len(thoughts)} important insights.")
-
+        self.memory.save("system_brain_reflection", summary, namespace=self.name)
+        scanner.commit()
+        self.log(f"Reflection complete. Found {new_errors} new errors across {len(aggregator.errors)} distinct issues.")
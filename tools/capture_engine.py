@@ -0,0 +1,141 @@
+# tools/capture_engine.py
+
+import os
+import time
+import logging
+import threading
+from collections import deque
+import mss
+from tools.perception_controller import PerceptionController
+
+# Configure logging for this module
+logger = logging.getLogger(__name__)
+
+# Frames captured per second by the background thread.
+DEFAULT_CAPTURE_FPS = float(os.getenv("CAPTURE_FPS", "4"))
+# Number of most recent frames kept in the ring buffer.
+DEFAULT_BUFFER_SIZE = int(os.getenv("CAPTURE_BUFFER_SIZE", "8"))
+
+
+class CaptureEngine:
+    """
+    A long-lived screen grabber for the primary monitor.
+
+    A single background thread owns one mss instance (so the display
+    connection and monitor enumeration happen once) and captures frames at
+    `fps` into a fixed-size ring buffer. Every frame is stored as a
+    (timestamp, pixels, monitor_info) tuple, where the timestamp is
+    time.monotonic() taken right before the grab. Callers read the newest
+    frame instantly with latest(), or wait for the first frame captured after
+    a point in time with first_after(), e.g. to see the result of an action.
+    """
+    def __init__(self, fps: float = DEFAULT_CAPTURE_FPS, buffer_size: int = DEFAULT_BUFFER_SIZE, monitor_index: int = 1):
+        self.fps = fps
+        self.monitor_index = monitor_index
+        self._frames: deque = deque(maxlen=buffer_size)
+        self._condition = threading.Condition()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="CaptureEngine", daemon=True)
+        self._thread.start()
+        logger.info(f"Capture engine started at {self.fps:g} FPS.")
+
+    def stop(self, timeout: float = 5.0):
+        if not self._thread:
+            return
+        self._stop.set()
+        with self._condition:
+            self._condition.notify_all()
+        self._thread.join(timeout)
+        self._thread = None
+        logger.info("Capture engine stopped.")
+
+    def latest(self, max_age: float | None = None):
+        """
+        Returns the newest (timestamp, pixels, monitor_info) frame, or None if
+        there is none (or it is older than `max_age` seconds).
+        """
+        with self._condition:
+            if not self._frames:
+                return None
+            frame = self._frames[-1]
+        if max_age is not None and time.monotonic() - frame[0] > max_age:
+            return None
+        return frame
+
+    def first_after(self, t: float, timeout: float | None = None):
+        """
+        Returns the oldest buffered frame captured after monotonic time `t`,
+        waiting up to `timeout` seconds for one to arrive. Returns None on
+        timeout or if the engine is not running.
+        """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        with self._condition:
+            while True:
+                for frame in self._frames:
+                    if frame[0] > t:
+                        return frame
+                if not self.running:
+                    return None
+                remaining = deadline - time.monotonic() if deadline is not None else None
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._condition.wait(remaining)
+
+    def frames(self) -> list:
+        """A snapshot of the ring buffer, oldest first."""
+        with self._condition:
+            return list(self._frames)
+
+    # --- Capture thread ---
+
+    def _run(self):
+        interval = 1.0 / self.fps if self.fps > 0 else 0.0
+        try:
+            with mss.mss() as sct:
+                monitor = sct.monitors[self.monitor_index]
+                next_capture = time.monotonic()
+                while not self._stop.is_set():
+                    captured_at = time.monotonic()
+                    try:
+                        pixels = PerceptionController.to_pixels(sct.grab(monitor))
+                    except Exception as e:
+                        logger.error(f"Background capture failed: {e}", exc_info=True)
+                        pixels = None
+                    if pixels is not None:
+                        with self._condition:
+                            if len(self._frames) == self._frames.maxlen:
+                                # Hand the oldest frame's RGB buffer back for reuse, unless a caller holds it.
+                                self._frames[0][1].recycle()
+                            self._frames.append((captured_at, pixels, monitor))
+                            self._condition.notify_all()
+                    next_capture = max(next_capture + interval, time.monotonic())
+                    self._stop.wait(next_capture - time.monotonic())
+        except Exception as e:
+            logger.error(f"Capture engine could not open the screen grabber: {e}", exc_info=True)
+        finally:
+            # Wake any first_after() waiters so they can see the engine has stopped.
+            with self._condition:
+                self._condition.notify_all()
+
+
+_shared_engine: CaptureEngine | None = None
+_shared_engine_lock = threading.Lock()
+
+
+def get_capture_engine() -> CaptureEngine:
+    """Returns the process-wide capture engine (not started until start() is called)."""
+    global _shared_engine
+    with _shared_engine_lock:
+        if _shared_engine is None:
+            _shared_engine = CaptureEngine()
+        return _shared_engine
@@ -0,0 +1,127 @@
+# tools/change_detector.py
+
+import os
+import logging
+import threading
+import numpy as np
+from tools.frame import ScreenFrame
+
+# Configure logging for this module
+logger = logging.getLogger(__name__)
+
+# Side length, in screen pixels, of the tiles the screen is compared in.
+DEFAULT_TILE_SIZE = int(os.getenv("CHANGE_TILE_SIZE", "32"))
+# Only every Nth pixel in each direction is compared.
+DEFAULT_SAMPLE_STEP = int(os.getenv("CHANGE_SAMPLE_STEP", "4"))
+# A tile is dirty when its mean absolute per-channel difference (0-255)
+# exceeds this. Keeps cursor blinks, anti-aliasing and video noise out.
+DEFAULT_NOISE_THRESHOLD = float(os.getenv("CHANGE_NOISE_THRESHOLD", "4.0"))
+
+
+class ChangeDetector:
+    """
+    Tiled screen-change detection.
+
+    Each frame is reduced to a downsampled intensity grid (a strided view,
+    so a ScreenFrame is never converted to RGB), compared against the
+    previous grid seen by the same caller, and the per-tile mean difference
+    is computed in one vectorized pass. Tiles above the noise threshold are
+    merged into dirty rectangles ({"left", "top", "width", "height"} in
+    screen pixels). Every caller keeps its own baseline, so the Brain and
+    the Supervisor do not reset each other's view of what changed.
+    """
+    def __init__(self, tile_size: int = DEFAULT_TILE_SIZE, sample_step: int = DEFAULT_SAMPLE_STEP,
+                 noise_threshold: float = DEFAULT_NOISE_THRESHOLD):
+        if tile_size % sample_step:
+            raise ValueError("tile_size must be a multiple of sample_step.")
+        self.tile_size = tile_size
+        self.sample_step = sample_step
+        self.noise_threshold = noise_threshold
+        self._baselines: dict[str, tuple[tuple, np.ndarray]] = {}
+        self._lock = threading.Lock()
+
+    def compare(self, caller: str, pixels) -> list[dict]:
+        """
+        Returns the dirty rectangles between `pixels` and the last frame this
+        caller compared, then makes `pixels` the caller's new baseline. The
+        first frame (or a resolution change) is reported as fully dirty.
+        """
+        shape, grid = self._grid(pixels)
+        with self._lock:
+            previous = self._baselines.get(caller)
+            self._baselines[caller] = (shape, grid)
+        if previous is None or previous[0] != shape:
+            return [{"left": 0, "top": 0, "width": shape[1], "height": shape[0]}]
+        return self._dirty_rects(self._dirty_tiles(previous[1], grid), shape)
+
+    def has_changed(self, caller: str, pixels) -> bool:
+        return bool(self.compare(caller, pixels))
+
+    def reset(self, caller: str | None = None):
+        """Forgets one caller's baseline, or all of them."""
+        with self._lock:
+            if caller is None:
+                self._baselines.clear()
+            else:
+                self._baselines.pop(caller, None)
+
+    # --- Internals ---
+
+    def _grid(self, pixels) -> tuple[tuple, np.ndarray]:
+        if isinstance(pixels, ScreenFrame):
+            channels = pixels.bgra[..., :3]  # Channel order does not matter for a sum.
+        else:
+            channels = np.asarray(pixels)
+        step = self.sample_step
+        sampled = channels[::step, ::step]
+        if sampled.ndim == 3:
+            grid = sampled.sum(axis=2, dtype=np.int16)
+        else:
+            grid = sampled.astype(np.int16) * 3
+        return channels.shape[:2], grid
+
+    def _dirty_tiles(self, before: np.ndarray, after: np.ndarray) -> np.ndarray:
+        cells = self.tile_size // self.sample_step
+        diff = np.abs(after - before)
+        rows = np.arange(0, diff.shape[0], cells)
+        cols = np.arange(0, diff.shape[1], cells)
+        # Per-tile sums in one pass; edge tiles may hold fewer cells.
+        sums = np.add.reduceat(np.add.reduceat(diff, rows, axis=0, dtype=np.int32), cols, axis=1)
+        counts = np.outer(np.diff(np.append(rows, diff.shape[0])), np.diff(np.append(cols, diff.shape[1])))
+        # The grid holds channel sums, so divide by 3 for a per-channel mean.
+        return sums / (counts * 3) > self.noise_threshold
+
+    def _dirty_rects(self, dirty: np.ndarray, shape: tuple) -> list[dict]:
+        """Merges dirty tiles into rectangles: runs along each row, then identical runs down columns."""
+        height, width = shape
+        tile = self.tile_size
+        open_rects: dict[tuple[int, int], dict] = {}
+        rects = []
+        for row in range(dirty.shape[0]):
+            # Start/end columns of each run of dirty tiles in this row.
+            edges = np.flatnonzero(np.diff(np.concatenate(([False], dirty[row], [False])).astype(np.int8)))
+            runs = list(zip(edges[::2].tolist(), edges[1::2].tolist()))
+            still_open = {}
+            for run in runs:
+                rect = open_rects.pop(run, None)
+                if rect is None:
+                    rect = {"left": run[0] * tile, "top": row * tile, "width": 0, "height": 0}
+                    rect["width"] = min(run[1] * tile, width) - rect["left"]
+                    rects.append(rect)
+                rect["height"] = min((row + 1) * tile, height) - rect["top"]
+                still_open[run] = rect
+            open_rects = still_open
+        return rects
+
+
+_shared_detector: ChangeDetector | None = None
+_shared_detector_lock = threading.Lock()
+
+
+def get_change_detector() -> ChangeDetector:
+    """Returns the process-wide change detector."""
+    global _shared_detector
+    with _shared_detector_lock:
+        if _shared_detector is None:
+            _shared_detector = ChangeDetector()
+        return _shared_detector
@@ -1,8 +1,9 @@
-from PIL import Image, ImageDraw, ImageFont
+from PIL import ImageDraw, ImageFont
 import os
+from tools.frame import to_pil_image
 
 def draw_button_overlay(pixel_array, elements, output_path):
-    img = Image.fromarray(pixel_array.astype("uint8"), "RGB")
+    img = to_pil_image(pixel_array, copy=True)
     draw = ImageDraw.Draw(img)
 
     # Load a font (fallback to default if not available)
@@ -0,0 +1,175 @@
+# tools/frame.py
+
+import hashlib
+import threading
+from contextlib import contextmanager
+import numpy as np
+from PIL import Image
+
+# Most RGB buffers kept around for reuse, per frame shape.
+MAX_POOLED_BUFFERS = 4
+
+
+class RgbBufferPool:
+    """
+    Reusable RGB pixel buffers, so converting a stream of frames does not
+    allocate a fresh full-screen array every time. A frame only hands its
+    buffer back if the buffer never left the frame (see ScreenFrame.lease_rgb).
+    """
+    def __init__(self, max_buffers: int = MAX_POOLED_BUFFERS):
+        self.max_buffers = max_buffers
+        self._free: dict[tuple, list[np.ndarray]] = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, shape: tuple) -> np.ndarray:
+        with self._lock:
+            free = self._free.get(shape)
+            if free:
+                return free.pop()
+        return np.empty(shape, dtype=np.uint8)
+
+    def release(self, buffer: np.ndarray):
+        with self._lock:
+            free = self._free.setdefault(buffer.shape, [])
+            if len(free) < self.max_buffers:
+                free.append(buffer)
+
+
+_default_pool = RgbBufferPool()
+
+
+class ScreenFrame:
+    """
+    A captured screen image that wraps the grabber's raw BGRA buffer without
+    copying it.
+
+    `bgra` is an np.frombuffer view of the raw bytes and `rgb_view` a
+    zero-copy, strided RGB view of it. A contiguous RGB array is only built
+    on first use (np.asarray(frame), frame.rgb), into a pooled buffer, and
+    then cached. to_image() lets PIL decode the BGRA bytes directly, so
+    encoding a frame never materializes an RGB array at all.
+
+    The pooled buffer is reused by later frames, so it is only recycled when
+    no caller can still hold it. Once it has been handed out through `rgb`
+    or np.asarray(), it belongs to the caller and is never recycled;
+    lease_rgb() lends it for the length of a `with` block instead.
+
+    Frames behave like the (height, width, 3) uint8 arrays they replace:
+    NumPy and the helpers below accept either.
+    """
+    def __init__(self, raw, width: int, height: int, pool: RgbBufferPool | None = None):
+        self.raw = raw
+        self.width = width
+        self.height = height
+        self.bgra = np.frombuffer(raw, dtype=np.uint8).reshape(height, width, 4)
+        self._pool = pool or _default_pool
+        self._rgb: np.ndarray | None = None
+        # Set once the RGB buffer has been handed out; it can no longer be recycled.
+        self._rgb_escaped = False
+        self._rgb_leases = 0
+        self._digest: str | None = None
+
+    @classmethod
+    def from_grab(cls, sct_img, pool: RgbBufferPool | None = None) -> "ScreenFrame":
+        """Wraps an mss screenshot. `sct_img.raw` is kept as-is, not converted."""
+        return cls(sct_img.raw, sct_img.width, sct_img.height, pool=pool)
+
+    @property
+    def shape(self) -> tuple:
+        return (self.height, self.width, 3)
+
+    @property
+    def dtype(self):
+        return np.uint8
+
+    @property
+    def size(self) -> tuple:
+        """(width, height), as in PIL."""
+        return (self.width, self.height)
+
+    @property
+    def digest(self) -> str:
+        """SHA1 of the frame's pixels, computed once (frames are never modified)."""
+        if self._digest is None:
+            self._digest = hashlib.sha1(self.bgra).hexdigest()
+        return self._digest
+
+    @property
+    def rgb_view(self) -> np.ndarray:
+        """RGB channels as a strided view of the BGRA buffer (no copy, not contiguous)."""
+        return self.bgra[..., 2::-1]
+
+    @property
+    def rgb(self) -> np.ndarray:
+        """A contiguous RGB array, converted once and cached. The caller may keep it."""
+        self._rgb_escaped = True
+        return self._convert()
+
+    @contextmanager
+    def lease_rgb(self):
+        """
+        Lends the contiguous RGB array for the `with` block. Neither the array
+        nor any view of it may be used after the block, as recycle() can then
+        hand the buffer to another frame.
+        """
+        self._rgb_leases += 1
+        try:
+            yield self._convert()
+        finally:
+            self._rgb_leases -= 1
+
+    def __array__(self, dtype=None, copy=None):
+        if copy:
+            return np.array(self._convert(), dtype=dtype, copy=True)
+        return self.rgb if dtype is None else self.rgb.astype(dtype, copy=False)
+
+    def to_image(self) -> Image.Image:
+        """An independent RGB PIL image, decoded straight from the BGRA bytes."""
+        return Image.frombuffer("RGB", self.size, self.raw, "raw", "BGRX", 0, 1)
+
+    def tobytes(self) -> bytes:
+        return self._convert().tobytes()
+
+    def recycle(self):
+        """
+        Returns the cached RGB buffer to the pool, unless it was handed out
+        through `rgb`/np.asarray() or is leased right now. The frame stays
+        usable and converts again if asked.
+        """
+        if self._rgb is not None and not self._rgb_escaped and not self._rgb_leases:
+            rgb, self._rgb = self._rgb, None
+            self._pool.release(rgb)
+
+    def _convert(self) -> np.ndarray:
+        if self._rgb is None:
+            rgb = self._pool.acquire(self.shape)
+            np.copyto(rgb, self.rgb_view)
+            self._rgb = rgb
+        return self._rgb
+
+
+def as_pixels(pixels) -> np.ndarray:
+    """Returns the pixels as a uint8 array, copying only if they are not uint8 already."""
+    return np.asarray(pixels, dtype=np.uint8)
+
+
+def to_pil_image(pixels, copy: bool = False) -> Image.Image:
+    """
+    Converts a ScreenFrame or RGB array to a PIL image. Images built from an
+    array may share its memory; pass copy=True before drawing on them.
+    """
+    if isinstance(pixels, ScreenFrame):
+        return pixels.to_image()
+    img = Image.fromarray(as_pixels(pixels), "RGB")
+    return img.copy() if copy else img
+
+
+def crop_pixels(pixels, rect: dict) -> np.ndarray:
+    """
+    Returns the {"left", "top", "width", "height"} region of a ScreenFrame or
+    RGB array as a contiguous RGB array. Only the region is converted.
+    """
+    top, left = rect["top"], rect["left"]
+    bottom, right = top + rect["height"], left + rect["width"]
+    source = pixels.rgb_view if isinstance(pixels, ScreenFrame) else as_pixels(pixels)
+    return np.ascontiguousarray(source[top:bottom, left:right])
@@ -1,23 +1,354 @@
 # tools/gemini_cli.py
 import os
+import time
+import uuid
+import base64
+import signal
+import asyncio
 import subprocess
+import logging
+import threading
+from collections import deque
 from dotenv import load_dotenv
+from tools.telemetry import get_telemetry, record_call
 
 load_dotenv()
 GEMINI_CLI = os.getenv("GEMINI_CLI")
 
-def ask_gemini_with_file(prompt_text: str, image_path: str = None) -> str:
+# Configure logging for this module
+logger = logging.getLogger(__name__)
+
+# Interpreter that hosts the workers: "powershell", "pwsh", "bash" or "sh".
+DEFAULT_CLI_SHELL = os.getenv("GEMINI_CLI_SHELL", "powershell" if os.name == "nt" else "bash")
+# Worker processes kept running, i.e. prompts in flight at once.
+DEFAULT_CLI_WORKERS = int(os.getenv("GEMINI_CLI_WORKERS", "2"))
+# Seconds one prompt may take before its worker is killed and restarted.
+DEFAULT_CLI_TIMEOUT = float(os.getenv("GEMINI_CLI_TIMEOUT", "300"))
+# Whether prompts go through the worker pool ("1") or one CLI process each ("0").
+# The pool only pays off where interpreter start-up is slow (PowerShell); for
+# bash/sh, starting the CLI directly costs about the same and holds no processes.
+DEFAULT_CLI_POOL = os.getenv("GEMINI_CLI_POOL", "1" if DEFAULT_CLI_SHELL in ("powershell", "pwsh") else "0") == "1"
+
+# A worker that crashes this many times within RESTART_WINDOW seconds is not restarted again.
+MAX_RESTARTS = 5
+RESTART_WINDOW = 60.0
+# Longest line of CLI output read at once (generated code can be long).
+MAX_LINE_BYTES = 16 * 1024 * 1024
+
+# Worker loops. Each reads one base64-encoded prompt per line, pipes it into
+# the CLI, then writes the CLI's output followed by "<sentinel> <exit code>".
+_POWERSHELL_LOOP = r"""
+[Console]::OutputEncoding = [Text.Encoding]::UTF8
+while ($null -ne ($line = [Console]::In.ReadLine())) {
+    $prompt = [Text.Encoding]::UTF8.GetString([Convert]::FromBase64String($line))
+    $output = $prompt | & $env:AGENTOS_GEMINI_CLI --yolo 2>$null
+    $code = $LASTEXITCODE
+    if ($null -ne $output) { [Console]::Out.WriteLine(($output -join "`n")) }
+    [Console]::Out.WriteLine("$env:AGENTOS_CLI_SENTINEL $code")
+    [Console]::Out.Flush()
+}
+"""
+_POSIX_LOOP = r"""
+while IFS= read -r line; do
+    printf '%s' "$line" | base64 -d | "$AGENTOS_GEMINI_CLI" --yolo 2>/dev/null
+    code=$?
+    printf '\n%s %s\n' "$AGENTOS_CLI_SENTINEL" "$code"
+done
+"""
+SHELL_COMMANDS = {
+    "powershell": ["powershell", "-NoProfile", "-NonInteractive", "-ExecutionPolicy", "Bypass", "-Command", _POWERSHELL_LOOP],
+    "pwsh": ["pwsh", "-NoProfile", "-NonInteractive", "-Command", _POWERSHELL_LOOP],
+    "bash": ["bash", "-c", _POSIX_LOOP],
+    "sh": ["sh", "-c", _POSIX_LOOP],
+}
+
+
+class GeminiCliError(RuntimeError):
+    """A prompt could not be answered: the worker timed out, crashed or could not be started."""
+
+
+class CliWorker:
+    """
+    One long-lived interpreter process running the worker loop, so a prompt
+    costs a CLI invocation instead of a fresh shell start-up as well.
+    Prompts travel base64-encoded on one line each; the answer ends at a
+    per-worker sentinel line carrying the CLI's exit code.
+    """
+    def __init__(self, worker_id: int, shell: str, cli_path: str):
+        self.worker_id = worker_id
+        self.shell = shell
+        self.cli_path = cli_path
+        self.sentinel = f"__AGENTOS_CLI_DONE_{uuid.uuid4().hex}__"
+        self.process: asyncio.subprocess.Process | None = None
+        self.requests = 0
+        self._starts: deque = deque()
+
+    @property
+    def alive(self) -> bool:
+        return self.process is not None and self.process.returncode is None
+
+    async def ask(self, prompt: str, timeout: float) -> str:
+        if not self.alive:
+            await self._start()
+        self.requests += 1
+        try:
+            self.process.stdin.write(base64.b64encode(prompt.encode("utf-8")) + b"\n")
+            await self.process.stdin.drain()
+            return await asyncio.wait_for(self._read_answer(), timeout)
+        except asyncio.TimeoutError:
+            await self.stop()
+            raise GeminiCliError(f"Gemini CLI worker {self.worker_id} timed out after {timeout:g}s. Restarting it.")
+        except asyncio.CancelledError:
+            # The worker is mid-answer; its output would be read by the next prompt.
+            await self.stop()
+            raise
+        except (BrokenPipeError, ConnectionResetError) as e:
+            await self.stop()
+            raise GeminiCliError(f"Gemini CLI worker {self.worker_id} crashed: {e}")
+
+    async def stop(self):
+        """Kills the worker along with any CLI process it started (they share its output pipe)."""
+        if self.process is None:
+            return
+        process, self.process = self.process, None
+        try:
+            if os.name == "nt":
+                killer = await asyncio.create_subprocess_exec(
+                    "taskkill", "/F", "/T", "/PID", str(process.pid),
+                    stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL)
+                await killer.wait()
+            else:
+                os.killpg(process.pid, signal.SIGKILL)
+        except (ProcessLookupError, OSError):
+            pass
+        try:
+            await asyncio.wait_for(process.wait(), 5)
+        except asyncio.TimeoutError:
+            logger.warning(f"Gemini CLI worker {self.worker_id} (pid {process.pid}) did not exit after being killed.")
+
+    async def _start(self):
+        now = time.monotonic()
+        while self._starts and now - self._starts[0] > RESTART_WINDOW:
+            self._starts.popleft()
+        if len(self._starts) >= MAX_RESTARTS:
+            raise GeminiCliError(f"Gemini CLI worker {self.worker_id} keeps crashing. Not restarting it.")
+        if self._starts:
+            # Back off a little more after each recent crash.
+            await asyncio.sleep(min(10.0, 0.5 * 2 ** (len(self._starts) - 1)))
+        self._starts.append(time.monotonic())
+        try:
+            self.process = await asyncio.create_subprocess_exec(
+                *SHELL_COMMANDS[self.shell],
+                stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL,
+                env={**os.environ, "AGENTOS_GEMINI_CLI": self.cli_path, "AGENTOS_CLI_SENTINEL": self.sentinel},
+                limit=MAX_LINE_BYTES,
+                start_new_session=(os.name != "nt"),  # Own process group, so stop() can kill the CLI too.
+            )
+        except OSError as e:
+            raise GeminiCliError(f"Could not start {self.shell} for the Gemini CLI: {e}")
+        logger.info(f"Started Gemini CLI worker {self.worker_id} ({self.shell}, pid {self.process.pid}).")
+
+    async def _read_answer(self) -> str:
+        lines = []
+        while True:
+            raw = await self.process.stdout.readline()
+            if not raw:
+                await self.stop()
+                raise GeminiCliError(f"Gemini CLI worker {self.worker_id} exited unexpectedly. Restarting it.")
+            line = raw.decode("utf-8", errors="ignore").rstrip("\r\n")
+            if line.startswith(self.sentinel):
+                code = line[len(self.sentinel):].strip()
+                if code not in ("0", ""):
+                    logger.warning(f"Gemini CLI exited with code {code}.")
+                return "\n".join(lines).strip()
+            lines.append(line)
+
+
+class GeminiCliPool:
+    """
+    A fixed set of CliWorkers answering prompts concurrently, one prompt per
+    worker at a time. Workers start on first use and are restarted after a
+    timeout or crash (see CliWorker).
+
+    Like the model client, the pool runs on a private event loop in a
+    background thread: async callers await ask(), which never blocks their
+    loop, and sync callers use ask_sync().
+    """
+    def __init__(self, size: int = DEFAULT_CLI_WORKERS, shell: str = DEFAULT_CLI_SHELL, cli_path: str | None = None,
+                 timeout: float = DEFAULT_CLI_TIMEOUT):
+        if shell not in SHELL_COMMANDS:
+            raise ValueError(f"Unsupported Gemini CLI shell: '{shell}'")
+        self.timeout = timeout
+        self.workers = [CliWorker(i, shell, cli_path or GEMINI_CLI) for i in range(size)]
+        self._loop = asyncio.new_event_loop()
+        self._idle: asyncio.Queue | None = None
+        self._thread = threading.Thread(target=self._loop.run_forever, name="GeminiCliPool", daemon=True)
+        self._thread.start()
+
+    async def ask(self, prompt: str, timeout: float | None = None) -> str:
+        future = asyncio.run_coroutine_threadsafe(self._ask(prompt, timeout or self.timeout), self._loop)
+        return await asyncio.wrap_future(future)
+
+    def ask_sync(self, prompt: str, timeout: float | None = None) -> str:
+        if threading.current_thread() is self._thread:
+            raise RuntimeError("Sync CLI calls cannot be made from the pool's own loop.")
+        return asyncio.run_coroutine_threadsafe(self._ask(prompt, timeout or self.timeout), self._loop).result()
+
+    def stats(self) -> dict:
+        return {
+            "workers": len(self.workers),
+            "alive": sum(1 for worker in self.workers if worker.alive),
+            "requests": sum(worker.requests for worker in self.workers),
+        }
+
+    def close(self):
+        """Stops every worker process and the pool's event loop."""
+        if self._loop.is_closed():
+            return
+        asyncio.run_coroutine_threadsafe(self._stop_workers(), self._loop).result(timeout=10)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+        self._loop.close()
+
+    # --- Internals (run on the pool's loop) ---
+
+    async def _ask(self, prompt: str, timeout: float) -> str:
+        if self._idle is None:
+            self._idle = asyncio.Queue()
+            for worker in self.workers:
+                self._idle.put_nowait(worker)
+        worker = await self._idle.get()
+        try:
+            return await worker.ask(prompt, timeout)
+        finally:
+            self._idle.put_nowait(worker)
+
+    async def _stop_workers(self):
+        await asyncio.gather(*(worker.stop() for worker in self.workers), return_exceptions=True)
+
+
+_shared_pool: GeminiCliPool | None = None
+_shared_pool_lock = threading.Lock()
+
+
+def get_cli_pool() -> GeminiCliPool:
+    """Returns the process-wide Gemini CLI worker pool."""
+    global _shared_pool
     if not GEMINI_CLI:
         raise Exception("GEMINI_CLI path not found in .env")
-    command = ["powershell", "-ExecutionPolicy", "Bypass", "-File", GEMINI_CLI, "--yolo"]
+    with _shared_pool_lock:
+        if _shared_pool is None:
+            _shared_pool = GeminiCliPool()
+        return _shared_pool
+
+
+def direct_cli_command(shell: str = DEFAULT_CLI_SHELL, cli_path: str | None = None) -> list[str]:
+    """The command that answers one prompt (read from stdin) in a fresh CLI process."""
+    cli_path = cli_path or GEMINI_CLI
+    if not cli_path:
+        raise Exception("GEMINI_CLI path not found in .env")
+    if shell in ("powershell", "pwsh"):
+        return [shell, "-NoProfile", "-ExecutionPolicy", "Bypass", "-File", cli_path, "--yolo"]
+    return [cli_path, "--yolo"]
+
+
+def run_cli_direct(prompt: str, timeout: float | None = None, shell: str = DEFAULT_CLI_SHELL,
+                   cli_path: str | None = None) -> str:
+    """Answers one prompt in its own CLI process, killed after `timeout` seconds."""
+    timeout = timeout or DEFAULT_CLI_TIMEOUT
+    try:
+        process = subprocess.Popen(direct_cli_command(shell, cli_path), stdin=subprocess.PIPE,
+                                   stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                   start_new_session=(os.name != "nt"))  # Own process group, see _kill_process_tree().
+    except OSError as e:
+        raise GeminiCliError(f"Could not start the Gemini CLI: {e}")
+    try:
+        stdout, _ = process.communicate(prompt.encode("utf-8"), timeout=timeout)
+    except BaseException as e:
+        _kill_process_tree(process.pid)
+        process.communicate()
+        if isinstance(e, subprocess.TimeoutExpired):
+            raise GeminiCliError(f"Gemini CLI timed out after {timeout:g}s.")
+        raise
+    if process.returncode:
+        logger.warning(f"Gemini CLI exited with code {process.returncode}.")
+    return stdout.decode("utf-8", errors="ignore").strip()
+
+
+async def arun_cli_direct(prompt: str, timeout: float | None = None, shell: str = DEFAULT_CLI_SHELL,
+                          cli_path: str | None = None) -> str:
+    """Async counterpart of run_cli_direct(); the CLI is killed on timeout or cancellation."""
+    timeout = timeout or DEFAULT_CLI_TIMEOUT
+    try:
+        process = await asyncio.create_subprocess_exec(
+            *direct_cli_command(shell, cli_path),
+            stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL,
+            start_new_session=(os.name != "nt"),
+        )
+    except OSError as e:
+        raise GeminiCliError(f"Could not start the Gemini CLI: {e}")
+    try:
+        stdout, _ = await asyncio.wait_for(process.communicate(prompt.encode("utf-8")), timeout)
+    except asyncio.TimeoutError:
+        _kill_process_tree(process.pid)
+        await process.wait()
+        raise GeminiCliError(f"Gemini CLI timed out after {timeout:g}s.")
+    except asyncio.CancelledError:
+        _kill_process_tree(process.pid)
+        raise
+    if process.returncode:
+        logger.warning(f"Gemini CLI exited with code {process.returncode}.")
+    return stdout.decode("utf-8", errors="ignore").strip()
+
+
+def _kill_process_tree(pid: int):
+    """Kills a CLI process and anything it started, which may still hold its output pipe."""
+    try:
+        if os.name == "nt":
+            subprocess.run(["taskkill", "/F", "/T", "/PID", str(pid)],
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        else:
+            os.killpg(pid, signal.SIGKILL)
+    except (ProcessLookupError, OSError):
+        pass
+
+
+async def aask_gemini_with_file(prompt_text: str, image_path: str = None, timeout: float | None = None,
+                                caller: str = "gemini-cli") -> str:
+    """
+    Sends a prompt (and optionally an image path) to the Gemini CLI without blocking the event loop.
+    The call is recorded in the model telemetry under `caller`.
+    """
+    if image_path:
+        prompt_text += f"\n[FILE:{image_path}]"
+    started, answer = time.monotonic(), None
+    try:
+        if DEFAULT_CLI_POOL:
+            answer = await get_cli_pool().ask(prompt_text, timeout)
+        else:
+            answer = await arun_cli_direct(prompt_text, timeout)
+        return answer
+    finally:
+        _record(caller, started, prompt_text, answer, image_path)
+
+
+def ask_gemini_with_file(prompt_text: str, image_path: str = None, timeout: float | None = None,
+                         caller: str = "gemini-cli") -> str:
     if image_path:
         prompt_text += f"\n[FILE:{image_path}]"
-    result = subprocess.run(
-        command,
-        input=prompt_text,
-        capture_output=True,
-        text=True,
-        encoding="utf-8",
-        errors="ignore"
-    )
-    return result.stdout.strip()
+    started, answer = time.monotonic(), None
+    try:
+        if DEFAULT_CLI_POOL:
+            answer = get_cli_pool().ask_sync(prompt_text, timeout)
+        else:
+            answer = run_cli_direct(prompt_text, timeout)
+        return answer
+    finally:
+        _record(caller, started, prompt_text, answer, image_path)
+
+
+def _record(caller: str, started: float, prompt_text: str, answer: str | None, image_path: str | None):
+    # The CLI reports no token counts, so they are estimated from the text.
+    image_bytes = os.path.getsize(image_path) if image_path and os.path.exists(image_path) else None
+    record_call(get_telemetry(), caller, "gemini-cli", started, "ok" if answer else "failed", prompt_text, answer,
+                image_bytes=image_bytes)
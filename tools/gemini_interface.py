@@ -1,10 +1,28 @@
 # tools/gemini_interface.py
 
+import os
 import json
-import numpy as np
+import time
+import logging
 import tempfile
-from PIL import Image, ImageDraw
-from .gemini_cli import ask_gemini_with_file
+from contextlib import contextmanager
+from PIL import ImageDraw
+from .gemini_cli import ask_gemini_with_file, aask_gemini_with_file
+from .gemini_ui_vision import is_parseable_json
+from .model_client import get_model_client
+from .frame import to_pil_image
+
+# Configure logging for this module
+logger = logging.getLogger(__name__)
+
+# "api" sends the frame to the model in memory; "cli" hands it to the Gemini CLI as a temporary PNG.
+UI_LOCATOR_BACKEND = os.getenv("UI_LOCATOR_BACKEND", "api")
+# Temporary PNGs for the CLI carry this prefix, so leftovers from a crashed run can be found and removed.
+CLI_IMAGE_PREFIX = "agentos-ui-"
+# CLI images older than this many seconds are treated as leftovers.
+STALE_CLI_IMAGE_AGE = 3600
+
+_stale_images_swept = False
 
 
 def strip_code_wrappers(text):
@@ -24,60 +42,153 @@ def ask_gemini(prompt_text):
     return ask_gemini_with_file(prompt_text)
 
 
-def find_buttons_with_metadata(pixel_array, target_label="Post", multi=True):
+def _prepare_locator_query(labels: list[str], backend: str) -> tuple[list[str], str | None]:
     """
-    Uses Gemini to locate UI buttons by label.
-    Returns bounding box, confidence, and context.
+    The part of a locator query shared by the sync and async versions: drops
+    duplicate labels (keeping their order) and builds the prompt, or returns
+    no prompt if no labels are left.
     """
-    try:
-        img = Image.fromarray(pixel_array.astype("uint8"), "RGB")
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".png") as tmp:
-            img.save(tmp.name, format="PNG")
-            image_path = tmp.name
-    except Exception as e:
-        raise Exception(f"[Gemini Interface] ❌ Failed to convert pixel array to image: {e}")
+    labels = list(dict.fromkeys(labels))
+    if not labels:
+        return labels, None
+    logger.info("Locating %s in one query (%s).", labels, backend)
+    return labels, _locator_prompt(labels)
+
 
-    prompt = f"""
+def _locator_prompt(labels: list[str]) -> str:
+    example = {label: [{"x_min": 500, "y_min": 200, "x_max": 570, "y_max": 240,
+                        "confidence": 0.93, "context": "popup composer"}] for label in labels[:2]}
+    return f"""
 You are a visual UI assistant.
 
 TASK:
-Find all buttons labeled "{target_label}" in the attached screenshot.
-
-Respond with valid JSON list of objects:
-[
-  {{
-    "label": "Post",
-    "x_min": 500,
-    "y_min": 200,
-    "x_max": 570,
-    "y_max": 240,
-    "confidence": 0.93,
-    "context": "popup composer"
-  }},
-  ...
-]
-
-✅ Use bounding box keys: x_min, y_min, x_max, y_max.
-✅ Only include buttons that match the label and are likely intended for the user.
+Find every UI element labeled with one of these labels in the attached screenshot: {json.dumps(labels)}
+
+Respond with one valid JSON object that has every label above as a key. Each value is a
+list of the matching elements (an empty list if there are none), for example:
+{json.dumps(example, indent=2)}
+
+✅ Use bounding box keys: x_min, y_min, x_max, y_max, in pixels of the screenshot.
+✅ Only include elements that match the label and are likely intended for the user.
 ✅ Add a 'confidence' score and a brief 'context' string.
 
 Respond with **valid JSON only**. No extra words.
 """
 
-    print(f"[Gemini Interface] 🧠 Analyzing UI for: '{target_label}' (multi={multi})")
-    response = ask_gemini_with_file(prompt, image_path)
 
+def _group_by_label(parsed, labels: list[str]) -> dict[str, list]:
+    """Maps the model's answer onto the requested labels (matched case-insensitively)."""
+    by_key = {label.casefold(): label for label in labels}
+    result = {label: [] for label in labels}
+    if isinstance(parsed, list):  # A flat list of elements, each naming its label.
+        items = [(element.get("label", ""), [element]) for element in parsed if isinstance(element, dict)]
+    elif isinstance(parsed, dict):
+        items = [(key, value if isinstance(value, list) else [value]) for key, value in parsed.items()]
+    else:
+        items = []
+    for key, elements in items:
+        label = by_key.get(str(key).strip().casefold())
+        if label is None:
+            continue
+        for element in elements:
+            if isinstance(element, dict):
+                result[label].append({**element, "label": label})
+    return result
+
+
+def _parse_locator_response(response: str | None, labels: list[str]) -> dict[str, list]:
+    if not response:
+        logger.warning("No response from the model while locating %s.", labels)
+        return {label: [] for label in labels}
     try:
-        cleaned = strip_code_wrappers(response)
-        parsed = json.loads(cleaned)
+        return _group_by_label(json.loads(strip_code_wrappers(response)), labels)
+    except Exception:
+        logger.error("Failed to parse Gemini response:\n%s", response)
+        return {label: [] for label in labels}
 
-        if isinstance(parsed, dict):
-            parsed = [parsed]
 
-        return parsed
-    except Exception as e:
-        print(f"[Gemini Interface] ❌ Failed to parse Gemini response:\n{response}")
-        return []
+@contextmanager
+def cli_image_file(pixel_array):
+    """
+    Writes the frame to a temporary PNG for the Gemini CLI's [FILE:] handoff
+    and deletes it when the block exits, whether or not the call succeeded.
+    Leftovers from earlier runs are swept on first use.
+    """
+    global _stale_images_swept
+    if not _stale_images_swept:
+        _stale_images_swept = True
+        cleanup_stale_cli_images()
+    fd, image_path = tempfile.mkstemp(prefix=CLI_IMAGE_PREFIX, suffix=".png")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            to_pil_image(pixel_array).save(f, format="PNG")
+        yield image_path
+    finally:
+        try:
+            os.remove(image_path)
+        except OSError:
+            pass
+
+
+def cleanup_stale_cli_images(max_age: float = STALE_CLI_IMAGE_AGE) -> int:
+    """Removes CLI handoff images left behind by runs that died mid-call. Returns how many were removed."""
+    directory = tempfile.gettempdir()
+    cutoff = time.time() - max_age
+    removed = 0
+    for name in os.listdir(directory):
+        if not (name.startswith(CLI_IMAGE_PREFIX) and name.endswith(".png")):
+            continue
+        path = os.path.join(directory, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                removed += 1
+        except OSError:
+            pass
+    return removed
+
+
+def find_ui_elements(pixel_array, labels: list[str], backend: str = UI_LOCATOR_BACKEND) -> dict[str, list]:
+    """
+    Locates every label in `labels` with a single model query. Returns
+    {label: [element, ...]} with an entry (possibly empty) for each label;
+    elements carry x_min/y_min/x_max/y_max, confidence and context.
+    """
+    labels, prompt = _prepare_locator_query(labels, backend)
+    if not labels:
+        return {}
+    if backend == "cli":
+        with cli_image_file(pixel_array) as image_path:
+            response = ask_gemini_with_file(prompt, image_path)
+    else:
+        response = get_model_client().vision_query(pixel_array, prompt, profile="analysis", validator=is_parseable_json)
+    return _parse_locator_response(response, labels)
+
+
+async def afind_ui_elements(pixel_array, labels: list[str], backend: str = UI_LOCATOR_BACKEND) -> dict[str, list]:
+    """Like find_ui_elements, without blocking the caller's event loop."""
+    labels, prompt = _prepare_locator_query(labels, backend)
+    if not labels:
+        return {}
+    if backend == "cli":
+        with cli_image_file(pixel_array) as image_path:
+            response = await aask_gemini_with_file(prompt, image_path)
+    else:
+        response = await get_model_client().avision_query(pixel_array, prompt, profile="analysis",
+                                                          validator=is_parseable_json)
+    return _parse_locator_response(response, labels)
+
+
+def find_buttons_with_metadata(pixel_array, target_label="Post", multi=True):
+    """
+    Uses Gemini to locate UI buttons by label.
+    Returns bounding box, confidence, and context.
+    To locate several labels, call find_ui_elements once instead of this per label.
+    """
+    buttons = find_ui_elements(pixel_array, [target_label])[target_label]
+    if not multi and buttons:
+        return [max(buttons, key=lambda b: b.get("confidence", 0))]
+    return buttons
 
 
 def save_debug_visualization(pixel_array, buttons, filename="debug_output.png"):
@@ -85,7 +196,7 @@ def save_debug_visualization(pixel_array, buttons, filename="debug_output.png"):
     Saves an annotated debug image with bounding boxes and metadata.
     """
     try:
-        img = Image.fromarray(np.array(pixel_array).astype("uint8"), "RGB").copy()
+        img = to_pil_image(pixel_array, copy=True)
         draw = ImageDraw.Draw(img)
 
         for button in buttons:
@@ -102,6 +213,6 @@ def save_debug_visualization(pixel_array, buttons, filename="debug_output.png"):
                 draw.text((x + 8, y - 10), f"{label} ({confidence:.2f})", fill="yellow")
 
         img.save(filename)
-        print(f"[Gemini Interface] 📸 Debug image saved to '{filename}'")
+        logger.info("Debug image saved to '%s'.", filename)
     except Exception as e:
-        print(f"[Gemini Interface] ❌ Failed to save debug visualization: {e}")
+        logger.error("Failed to save debug visualization: %s", e)
@@ -1,8 +1,11 @@
 # tools/gemini_model_api.py
 
 import os
+import time
 import google.generativeai as genai
 from dotenv import load_dotenv
+from tools.model_client import get_model_client, get_model_registry
+from tools.telemetry import get_telemetry, record_call
 
 load_dotenv()
 
@@ -16,12 +19,15 @@ genai.configure(api_key=GEMINI_API_KEY)
 
 # === Core Wrapper ===
 
-def ask_gemini_with_file(prompt, image_path, model_name="models/gemini-1.5-flash-latest"):
+def ask_gemini_with_file(prompt, image_path, model_name="models/gemini-1.5-flash-latest", caller="gemini-api"):
     """
-    Sends a prompt and image file to the specified Gemini model.
+    Sends a prompt and image file to the specified Gemini model. The model
+    object (and its connection) is shared with other calls to the same model.
+    The call is recorded in the model telemetry under `caller`.
     """
+    started, image_data = time.monotonic(), None
     try:
-        model = genai.GenerativeModel(model_name)
+        model = get_model_registry().get(model_name)
         with open(image_path, "rb") as f:
             image_data = f.read()
 
@@ -34,10 +40,14 @@ def ask_gemini_with_file(prompt, image_path, model_name="models/gemini-1.5-flash
                 )
             )
         ])
+        record_call(get_telemetry(), caller, model_name, started, "ok", prompt, response.text,
+                    image_bytes=len(image_data), usage=getattr(response, "usage_metadata", None))
         return response.text
 
     except Exception as e:
         print(f"[Gemini] ❌ Model call failed ({model_name}): {e}")
+        record_call(get_telemetry(), caller, model_name, started, "failed", prompt, None,
+                    image_bytes=len(image_data) if image_data else None)
         raise
 
 
@@ -45,16 +55,20 @@ def ask_gemini_with_file(prompt, image_path, model_name="models/gemini-1.5-flash
 
 def smart_vision_query(prompt, image_path):
     """
-    Tries Gemini 1.5 Flash first. If it fails, falls back to 1.5 Pro.
+    Asks the vision models in the order the model router picks (normally
+    Gemini 1.5 Flash, then Pro). If the first fails, or is slower than
+    usual, the next is raced against it and the first answer wins.
     """
     try:
-        print("[Gemini API] ⚡ Trying Gemini Flash...")
-        return ask_gemini_with_file(prompt, image_path, model_name="models/gemini-1.5-flash-latest")
-    except Exception as flash_error:
-        print(f"[Gemini API] ⚠️ Flash failed, trying Pro...\n{flash_error}")
-        try:
-            print("[Gemini API] 🧠 Trying Gemini Pro...")
-            return ask_gemini_with_file(prompt, image_path, model_name="models/gemini-1.5-pro-latest")
-        except Exception as pro_error:
-            print(f"[Gemini API] ❌ Pro model also failed:\n{pro_error}")
-            return "[]"
+        with open(image_path, "rb") as f:
+            image_data = f.read()
+    except OSError as e:
+        print(f"[Gemini API] ❌ Could not read image {image_path}: {e}")
+        return "[]"
+
+    print("[Gemini API] ⚡ Querying vision models (hedged)...")
+    response = get_model_client().image_query(image_data, "image/png", prompt, call_class="vision")
+    if response is None:
+        print("[Gemini API] ❌ All vision models failed.")
+        return "[]"
+    return response
@@ -3,12 +3,17 @@
 import os
 import json
 import re
+import copy
+import threading
 import google.generativeai as genai
-from PIL import Image
-from io import BytesIO
+from collections import OrderedDict
 import numpy as np
 import logging
 from dotenv import load_dotenv
+from tools.frame import crop_pixels
+from tools.image_encoder import get_image_encoder
+from tools.model_client import get_model_client
+from tools.image_hash import tile_hashes
 
 # Load environment variables at the top of the module
 load_dotenv()
@@ -24,59 +29,67 @@ if GEMINI_API_KEY:
 else:
     logger.warning("GEMINI_API_KEY environment variable not set. API calls will fail.")
 
-# Define model constants for easy management
-DEFAULT_MODELS = ["gemini-1.5-flash-latest", "gemini-1.5-pro-latest"]
+# UI analysis results are cached per screen tile of this many pixels a side...
+VISION_CACHE_TILE_SIZE = int(os.getenv("VISION_CACHE_TILE_SIZE", "256"))
+# ...for at most this many (task, tile) entries.
+VISION_CACHE_MAX_ENTRIES = int(os.getenv("VISION_CACHE_MAX_ENTRIES", "2048"))
+# When more than this fraction of tiles changed, the full frame is re-analysed.
+VISION_CACHE_MAX_DIRTY_FRACTION = 0.5
 
 
-def encode_image_to_webp_bytes(pixels: np.ndarray) -> bytes | None:
+def encode_image_to_webp_bytes(pixels: np.ndarray, profile: str = "default") -> bytes | None:
     """
-    Compresses a NumPy RGB image array to in-memory WebP bytes.
+    Compresses a NumPy RGB image array (or ScreenFrame) to in-memory WebP bytes,
+    using the downscale and quality settings of the caller's encoding profile.
     """
     try:
-        img = Image.fromarray(pixels.astype("uint8"), "RGB")
-        buffer = BytesIO()
-        img.save(buffer, format="WEBP", quality=95)
-        return buffer.getvalue()
+        return get_image_encoder().encode(pixels, profile)
     except Exception as e:
         logger.error(f"Failed to encode image to WebP bytes: {e}", exc_info=True)
         return None
 
 
-def smart_vision_query(pixels: np.ndarray, prompt: str, models=DEFAULT_MODELS) -> str | None:
+async def asmart_vision_query(pixels: np.ndarray, prompt: str, models=None, profile: str = "default",
+                              timeout: float | None = None, validator=None, stream_until: str | None = None,
+                              cache_ttl: float | None = None, caller: str | None = None) -> str | None:
     """
-    Performs a vision query using in-memory image data, with a model fallback system.
+    Performs a vision query without blocking the caller's event loop, with a
+    model fallback system (hedged: a slow model is raced against the next one).
+    `profile` selects how the image is encoded (see tools.image_encoder) and
+    which models the router picks (see tools.model_router) unless `models`
+    is given; `timeout` bounds each model attempt; `validator` rejects
+    unusable answers. `stream_until` streams a JSON reply and returns once
+    that member is complete (see ModelClient.avision_query). `cache_ttl`
+    overrides how long the answer is cached (0: not cached). `caller` names
+    the asking agent in the model telemetry.
     """
-    if not GEMINI_API_KEY:
-        logger.error("Cannot make API call without API key.")
-        return None
+    return await get_model_client().avision_query(pixels, prompt, models=models, profile=profile, timeout=timeout,
+                                                  validator=validator, stream_until=stream_until, cache_ttl=cache_ttl,
+                                                  caller=caller)
 
-    image_bytes = encode_image_to_webp_bytes(pixels)
-    if not image_bytes:
-        return None # Error is already logged
 
-    image_part = {
-        "mime_type": "image/webp",
-        "data": image_bytes
-    }
+def smart_vision_query(pixels: np.ndarray, prompt: str, models=None, profile: str = "default",
+                       timeout: float | None = None, validator=None, stream_until: str | None = None,
+                       cache_ttl: float | None = None, caller: str | None = None) -> str | None:
+    """
+    Performs a vision query using in-memory image data, with a model fallback system.
+    Blocks until the answer arrives; async code should await asmart_vision_query().
+    """
+    return get_model_client().vision_query(pixels, prompt, models=models, profile=profile, timeout=timeout,
+                                           validator=validator, stream_until=stream_until, cache_ttl=cache_ttl,
+                                           caller=caller)
 
-    for model_name in models:
-        try:
-            logger.info(f"Querying model `{model_name}`...")
-            model = genai.GenerativeModel(model_name)
-            response = model.generate_content(
-                [prompt, image_part],
-                generation_config={"temperature": 0.1}, # Low temp for deterministic UI analysis
-                stream=False
-            )
-            if response and response.text:
-                logger.info(f"Model `{model_name}` succeeded.")
-                return response.text
-        except Exception as e:
-            logger.warning(f"Model `{model_name}` failed: {e}")
-            continue # Try the next model
-
-    logger.error("All models failed to generate a response.")
-    return None
+
+def is_parseable_json(response_text: str) -> bool:
+    """True if the response contains a JSON object or array that parses. Used to reject unusable answers."""
+    match = re.search(r'(\{.*\}|\[.*\])', response_text, re.DOTALL)
+    if not match:
+        return False
+    try:
+        json.loads(match.group(0))
+        return True
+    except json.JSONDecodeError:
+        return False
 
 
 def _parse_json_from_response(response_text: str) -> dict | list | None:
@@ -100,10 +113,141 @@ def _parse_json_from_response(response_text: str) -> dict | list | None:
         return None
 
 
-def analyze_ui_elements_from_pixels(pixels: np.ndarray, task_prompt: str) -> list:
+class RegionVisionCache:
+    """
+    An LRU cache of UI analysis results per screen tile.
+
+    Entries are keyed by (task prompt, tile position, perceptual hash of the
+    tile) and hold the elements whose box centre lies in that tile, in
+    full-frame coordinates. A lookup splits a new frame into tiles whose
+    content was already analysed (hits) and dirty tiles (misses), so only
+    the region covering the dirty tiles needs a new model call.
+    """
+    def __init__(self, tile_size: int = VISION_CACHE_TILE_SIZE, max_entries: int = VISION_CACHE_MAX_ENTRIES):
+        self.tile_size = tile_size
+        self.max_entries = max_entries
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, task_prompt: str, hashes: np.ndarray) -> tuple[list, list[tuple[int, int]]]:
+        """Returns (cached elements of the unchanged tiles, positions of the dirty tiles)."""
+        elements, dirty = [], []
+        with self._lock:
+            for row in range(hashes.shape[0]):
+                for col in range(hashes.shape[1]):
+                    key = (task_prompt, row, col, hashes[row, col].tobytes())
+                    cached = self._entries.get(key)
+                    if cached is None:
+                        dirty.append((row, col))
+                        self.misses += 1
+                    else:
+                        self._entries.move_to_end(key)
+                        elements.extend(copy.deepcopy(cached))
+                        self.hits += 1
+        return elements, dirty
+
+    def store(self, task_prompt: str, hashes: np.ndarray, tiles: list[tuple[int, int]], elements: list) -> list:
+        """
+        Caches `elements` (full-frame coordinates) under the given tiles and
+        returns the ones that belong to them. Elements centred elsewhere are
+        already covered by cached tiles and are dropped.
+        """
+        by_tile = {tile: [] for tile in tiles}
+        for element in elements:
+            tile = self._tile_of(element)
+            if tile in by_tile:
+                by_tile[tile].append(element)
+        with self._lock:
+            for (row, col), tile_elements in by_tile.items():
+                key = (task_prompt, row, col, hashes[row, col].tobytes())
+                self._entries[key] = copy.deepcopy(tile_elements)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return [element for tile_elements in by_tile.values() for element in tile_elements]
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": len(self._entries)
+        }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _tile_of(self, element: dict) -> tuple[int, int] | None:
+        box = element.get("bounding_box") if isinstance(element, dict) else None
+        try:
+            center_x = (box["x_min"] + box["x_max"]) / 2
+            center_y = (box["y_min"] + box["y_max"]) / 2
+        except (TypeError, KeyError):
+            return None
+        return int(center_y // self.tile_size), int(center_x // self.tile_size)
+
+
+region_cache = RegionVisionCache()
+
+
+def _offset_elements(elements: list, left: int, top: int) -> list:
+    """Moves element boxes from crop coordinates back to full-frame coordinates."""
+    for element in elements:
+        box = element.get("bounding_box") if isinstance(element, dict) else None
+        if isinstance(box, dict):
+            for key, offset in (("x_min", left), ("x_max", left), ("y_min", top), ("y_max", top)):
+                if isinstance(box.get(key), (int, float)):
+                    box[key] += offset
+    return elements
+
+
+def analyze_ui_elements_from_pixels(pixels: np.ndarray, task_prompt: str, use_cache: bool = True) -> list:
     """
     A high-level function specifically for getting a LIST of UI elements.
+
+    With `use_cache`, results are reused per screen tile (see RegionVisionCache):
+    an unchanged screen costs no model call, and a small change only sends the
+    changed region.
     """
+    if not use_cache:
+        return _query_ui_elements(pixels, task_prompt) or []
+
+    hashes = tile_hashes(pixels, region_cache.tile_size)
+    cached, dirty = region_cache.lookup(task_prompt, hashes)
+    if not dirty:
+        logger.info("UI analysis served entirely from the region cache.")
+        return cached
+
+    tile_count = hashes.shape[0] * hashes.shape[1]
+    if len(dirty) > tile_count * VISION_CACHE_MAX_DIRTY_FRACTION:
+        elements = _query_ui_elements(pixels, task_prompt)
+        dirty = [(row, col) for row in range(hashes.shape[0]) for col in range(hashes.shape[1])]
+        cached = []
+    else:
+        # Query only the smallest rectangle covering the dirty tiles.
+        tile = region_cache.tile_size
+        height, width = pixels.shape[:2]
+        left = min(col for _, col in dirty) * tile
+        top = min(row for row, _ in dirty) * tile
+        right = min((max(col for _, col in dirty) + 1) * tile, width)
+        bottom = min((max(row for row, _ in dirty) + 1) * tile, height)
+        region = {"left": left, "top": top, "width": right - left, "height": bottom - top}
+        logger.info(f"{len(dirty)}/{tile_count} screen tiles changed. Re-analysing region {region}.")
+        elements = _query_ui_elements(crop_pixels(pixels, region), task_prompt, is_crop=True)
+        if elements is not None:
+            elements = _offset_elements(elements, left, top)
+
+    if elements is None:
+        return []  # The query failed; nothing is cached, so the next call retries.
+    return cached + region_cache.store(task_prompt, hashes, dirty, elements)
+
+
+def _query_ui_elements(pixels: np.ndarray, task_prompt: str, is_crop: bool = False) -> list | None:
+    """Asks the vision model for the UI elements in `pixels`. Returns None if the query failed."""
     system_prompt = (
         "You are an expert UI analyst. Your task is to detect all UI elements relevant to the user's goal "
         "from the provided screen capture. For each element, you must return:\n"
@@ -114,14 +258,21 @@ def analyze_ui_elements_from_pixels(pixels: np.ndarray, task_prompt: str) -> lis
         "Respond in a valid JSON list format ONLY. Do not include markdown fences or any other text."
     )
 
+    if is_crop:
+        system_prompt += (
+            "\n\nThe image is a cropped region of the screen. Give coordinates relative to the "
+            "top-left corner of this image."
+        )
+
     full_prompt = f"{system_prompt}\n\nUSER TASK:\n`{task_prompt}`"
     
-    response_text = smart_vision_query(pixels, full_prompt)
+    response_text = smart_vision_query(pixels, full_prompt, profile="analysis", validator=is_parseable_json,
+                                       caller="UIAnalysis")
 
     if not response_text:
-        return []
+        return None
 
     parsed_json = _parse_json_from_response(response_text)
     # Ensure the result is a list, as expected by the caller
-    return parsed_json if isinstance(parsed_json, list) else []
+    return parsed_json if isinstance(parsed_json, list) else None
 
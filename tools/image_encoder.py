@@ -0,0 +1,148 @@
+# tools/image_encoder.py
+
+import os
+import asyncio
+import logging
+import threading
+from io import BytesIO
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+import numpy as np
+from PIL import Image
+from tools.frame import to_pil_image
+from tools.image_hash import frame_digest
+
+# Configure logging for this module
+logger = logging.getLogger(__name__)
+
+# Per-call-site encoding settings. `max_side` caps the longer image side in
+# pixels (None keeps full resolution); `quality` is the WebP quality.
+ENCODING_PROFILES = {
+    # Brain planning reads page structure and text: moderate downscale.
+    "planning": {"max_side": int(os.getenv("ENCODE_PLANNING_MAX_SIDE", "1920")), "quality": 85},
+    # Supervisor click validation only needs to recognise the target element.
+    "validation": {"max_side": int(os.getenv("ENCODE_VALIDATION_MAX_SIDE", "1280")), "quality": 70},
+    # UI element analysis returns pixel boxes, so it keeps full resolution.
+    "analysis": {"max_side": None, "quality": 90},
+    # The previous behaviour, for callers that do not pick a profile.
+    "default": {"max_side": None, "quality": 95},
+}
+
+# Threads encoding images; PIL releases the GIL while it encodes.
+DEFAULT_ENCODER_WORKERS = int(os.getenv("ENCODER_WORKERS", "2"))
+# Encoded images kept for reuse, keyed by frame content and profile.
+DEFAULT_ENCODE_CACHE_SIZE = int(os.getenv("ENCODE_CACHE_SIZE", "16"))
+
+
+def scale_for(size: tuple, profile: str = "default") -> float:
+    """
+    The factor by which an image of `size` (width, height) is scaled under
+    `profile`. Coordinates on the full frame multiply by it to land on the
+    encoded image.
+    """
+    max_side = ENCODING_PROFILES[profile]["max_side"]
+    longest = max(size)
+    if not max_side or longest <= max_side:
+        return 1.0
+    return max_side / longest
+
+
+class ImageEncoder:
+    """
+    Encodes frames to WebP for vision uploads on a thread pool.
+
+    Each call site names a profile (downscale target and quality). Results
+    are cached by (frame content, profile), and an encode already running
+    for the same key is shared rather than repeated. A request is also
+    served by a cached encode of the same frame at equal or higher fidelity,
+    so the Supervisor validating the frame the Brain just planned on reuses
+    the Brain's upload instead of encoding the frame again.
+    """
+    def __init__(self, workers: int = DEFAULT_ENCODER_WORKERS, cache_size: int = DEFAULT_ENCODE_CACHE_SIZE):
+        self.cache_size = cache_size
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ImageEncoder")
+        self._cache: OrderedDict[tuple, Future] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def submit(self, pixels, profile: str = "default") -> Future:
+        """Starts (or joins) the encode of `pixels` under `profile`. The future yields WebP bytes."""
+        if profile not in ENCODING_PROFILES:
+            raise ValueError(f"Unknown encoding profile: '{profile}'")
+        digest = frame_digest(pixels)
+        key = (digest, profile)
+        with self._lock:
+            future = self._cache.get(key)
+            if future is not None:
+                self._cache.move_to_end(key)
+            else:
+                future = self._cached_at_least(digest, profile)
+            if future is not None:
+                self.hits += 1
+                return future
+            self.misses += 1
+            future = self._pool.submit(self._encode, pixels, profile)
+            self._cache[key] = future
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        future.add_done_callback(lambda f: self._forget_failure(key, f))
+        return future
+
+    def encode(self, pixels, profile: str = "default") -> bytes:
+        return self.submit(pixels, profile).result()
+
+    async def aencode(self, pixels, profile: str = "default") -> bytes:
+        return await asyncio.wrap_future(self.submit(pixels, profile))
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / total if total else 0.0}
+
+    def close(self):
+        self._pool.shutdown(wait=True)
+
+    # --- Internals ---
+
+    @staticmethod
+    def _encode(pixels, profile: str) -> bytes:
+        settings = ENCODING_PROFILES[profile]
+        img = to_pil_image(pixels)
+        scale = scale_for(img.size, profile)
+        if scale < 1.0:
+            size = (max(1, round(img.width * scale)), max(1, round(img.height * scale)))
+            img = img.resize(size, Image.Resampling.BILINEAR, reducing_gap=2.0)
+        buffer = BytesIO()
+        img.save(buffer, format="WEBP", quality=settings["quality"])
+        return buffer.getvalue()
+
+    def _cached_at_least(self, digest: str, profile: str) -> Future | None:
+        """A cached encode of the same frame whose size and quality are no lower than `profile` asks for."""
+        wanted = ENCODING_PROFILES[profile]
+        for (cached_digest, cached_profile), future in self._cache.items():
+            if cached_digest != digest:
+                continue
+            have = ENCODING_PROFILES[cached_profile]
+            size_ok = have["max_side"] is None or (wanted["max_side"] is not None and have["max_side"] >= wanted["max_side"])
+            if size_ok and have["quality"] >= wanted["quality"]:
+                return future
+        return None
+
+    def _forget_failure(self, key: tuple, future: Future):
+        if future.cancelled() or future.exception() is not None:
+            with self._lock:
+                if self._cache.get(key) is future:
+                    del self._cache[key]
+
+
+_shared_encoder: ImageEncoder | None = None
+_shared_encoder_lock = threading.Lock()
+
+
+def get_image_encoder() -> ImageEncoder:
+    """Returns the process-wide image encoder."""
+    global _shared_encoder
+    with _shared_encoder_lock:
+        if _shared_encoder is None:
+            _shared_encoder = ImageEncoder()
+        return _shared_encoder
@@ -0,0 +1,98 @@
+# tools/image_hash.py
+
+import hashlib
+import numpy as np
+from tools.frame import ScreenFrame
+
+# Bits per side of a difference hash; 8 gives a 64-bit hash.
+DEFAULT_HASH_SIZE = 8
+# Bits are only set where intensity rises by more than this (channel sum,
+# 0-765), so compression noise in flat areas does not flip them.
+NOISE_MARGIN = 12
+# Each tile's mean colour is appended to its hash at this many levels per channel.
+COLOR_LEVELS = 16
+
+
+def _channels(pixels) -> np.ndarray:
+    # ScreenFrames are viewed in RGB order, so a frame and its RGB copy hash the same way.
+    if isinstance(pixels, ScreenFrame):
+        return pixels.bgra[..., 2::-1]
+    channels = np.asarray(pixels)
+    return channels[..., None] if channels.ndim == 2 else channels
+
+
+def _cell_starts(length: int, cell: int, count: int) -> np.ndarray:
+    """Start coordinates of `count` equal cells inside every `cell`-sized span of `length`, flattened."""
+    starts = np.arange(0, length, cell)
+    spans = np.minimum(cell, length - starts)
+    return (starts[:, None] + spans[:, None] * np.arange(count)[None, :] // count).ravel()
+
+
+def _cell_means(channels: np.ndarray, ys: np.ndarray, xs: np.ndarray) -> np.ndarray:
+    """Per-channel mean of every cell starting at (ys[i], xs[j]), shape (len(ys), len(xs), channels)."""
+    sums = np.add.reduceat(np.add.reduceat(channels, ys, axis=0, dtype=np.float32), xs, axis=1)
+    # reduceat returns the single element at a start that repeats (spans shorter than the cell count).
+    heights = np.maximum(np.diff(ys, append=channels.shape[0]), 1)
+    widths = np.maximum(np.diff(xs, append=channels.shape[1]), 1)
+    return sums / (heights[:, None, None] * widths[None, :, None])
+
+
+def tile_hashes(pixels, tile_size: int, hash_size: int = DEFAULT_HASH_SIZE) -> np.ndarray:
+    """
+    Difference hashes (dHash) of every tile_size x tile_size tile of the
+    image, computed together in one vectorized pass. Returns an array of
+    shape (tile_rows, tile_cols, hash_size**2 // 8 + 3): one packed hash per
+    tile, followed by the tile's quantized mean colour.
+
+    Each tile is averaged down to a hash_size x (hash_size + 1) grid and
+    every bit records whether intensity rises left to right, so hashes
+    survive small noise and compression but change when the tile's content
+    does. Every pixel counts towards its cell's average, so a small change
+    anywhere in the tile moves it; the mean colour tells apart flat tiles,
+    whose gradient bits are all zero.
+    """
+    channels = _channels(pixels)
+    height, width = channels.shape[:2]
+    rows, cols = -(-height // tile_size), -(-width // tile_size)
+    ys = _cell_starts(height, tile_size, hash_size)
+    xs = _cell_starts(width, tile_size, hash_size + 1)
+    means = _cell_means(channels, ys, xs)
+    if means.shape[-1] == 1:
+        means = np.repeat(means, 3, axis=-1)
+    cells = means.reshape(rows, hash_size, cols, hash_size + 1, 3)
+    intensity = cells.sum(axis=-1)
+    bits = intensity[..., 1:] - intensity[..., :-1] > NOISE_MARGIN  # (rows, hash_size, cols, hash_size)
+    bits = bits.transpose(0, 2, 1, 3).reshape(rows, cols, hash_size * hash_size)
+    heights = np.maximum(np.diff(ys, append=height), 1).reshape(rows, hash_size)
+    widths = np.maximum(np.diff(xs, append=width), 1).reshape(cols, hash_size + 1)
+    areas = heights[:, :, None, None] * widths[None, None, :, :]
+    colors = (cells * areas[..., None]).sum(axis=(1, 3)) / areas.sum(axis=(1, 3))[..., None]
+    colors = np.minimum(colors * COLOR_LEVELS // 256, COLOR_LEVELS - 1).astype(np.uint8)
+    return np.concatenate([np.packbits(bits, axis=-1), colors], axis=-1)
+
+
+def perceptual_hash(pixels, tile_size: int = 256) -> str:
+    """
+    A hex digest of the image's tile hashes (see tile_hashes), for keying
+    caches by what is on screen: frames that differ only by noise share it,
+    a change to any tile's content gives a new one.
+    """
+    hashes = tile_hashes(pixels, tile_size)
+    return hashlib.sha1(repr(hashes.shape).encode("ascii") + hashes.tobytes()).hexdigest()
+
+
+def frame_digest(pixels) -> str:
+    """
+    A hex digest of the exact pixels, for caches that must not match a frame
+    that differs at all. Computed once per ScreenFrame.
+    """
+    if isinstance(pixels, ScreenFrame):
+        return pixels.digest
+    array = np.ascontiguousarray(pixels)
+    return hashlib.sha1(array).hexdigest() + str(array.shape)
+
+
+def hamming_distance(a: bytes | np.ndarray, b: bytes | np.ndarray) -> int:
+    """Number of differing bits between two hashes of the same size."""
+    x = np.bitwise_xor(np.frombuffer(bytes(a), dtype=np.uint8), np.frombuffer(bytes(b), dtype=np.uint8))
+    return int(np.unpackbits(x).sum())
@@ -0,0 +1,160 @@
+# tools/json_stream.py
+
+import json
+
+# Text allowed before the opening '{' (a code fence, "Here is the JSON:"...).
+# A reply that has not started its object by then is rejected.
+MAX_PREAMBLE_CHARS = 200
+
+_CLOSERS = {"}": "{", "]": "["}
+
+
+class JsonStreamError(ValueError):
+    """The streamed text cannot be (or can no longer become) the expected JSON object."""
+
+
+class JsonStreamParser:
+    """
+    Parses one JSON object from text that arrives in chunks, reporting each
+    top-level member as soon as its value is complete.
+
+    feed() tracks strings, escapes and bracket nesting as the text comes in,
+    so `{"action": {...}, "reasoning": "...` yields the action the moment its
+    closing brace arrives, without waiting for the rest of the reply.
+    Problems are raised as soon as they are visible: no object started
+    within MAX_PREAMBLE_CHARS, a mismatched bracket, a malformed member.
+    Text after the object (trailing prose, a closing code fence) is ignored.
+    """
+    def __init__(self, max_preamble: int = MAX_PREAMBLE_CHARS):
+        self.max_preamble = max_preamble
+        self.members: dict = {}   # Completed top-level members, in arrival order.
+        self.done = False         # The top-level object has closed.
+        self._text = ""
+        self._pos = 0             # Next character of _text to scan.
+        self._start = None        # Index of the top-level '{'.
+        self._stack: list[str] = []
+        self._in_string = False
+        self._escape = False
+        self._key = None          # Key of the member being read.
+        self._key_start = None
+        self._value_start = None
+        self._expect = "key"      # At depth 1: "key", "colon", "value", "comma"
+
+    def feed(self, chunk: str) -> list[tuple[str, object]]:
+        """Adds text. Returns the (key, value) members completed by it."""
+        if self.done or not chunk:
+            return []
+        self._text += chunk
+        completed = []
+        text = self._text
+        while self._pos < len(text) and not self.done:
+            i = self._pos
+            ch = text[i]
+            self._pos += 1
+            if self._start is None:
+                if ch == "{":
+                    self._start = i
+                    self._stack.append("{")
+                elif i >= self.max_preamble:
+                    raise JsonStreamError(f"No JSON object in the first {self.max_preamble} characters.")
+                continue
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if len(self._stack) == 1:
+                        self._end_string(i, completed)
+                continue
+            if ch == '"':
+                self._in_string = True
+                if len(self._stack) == 1:
+                    self._begin_string(i)
+                continue
+            if ch in " \t\r\n":
+                continue
+            if len(self._stack) == 1:
+                self._top_level_char(i, ch, completed)
+            elif ch in "{[":
+                self._stack.append(ch)
+            elif ch in "}]":
+                if self._stack[-1] != _CLOSERS[ch]:
+                    raise JsonStreamError(f"Mismatched '{ch}' at offset {i}.")
+                self._stack.pop()
+                if len(self._stack) == 1:
+                    self._complete(i + 1, completed)
+        return completed
+
+    def close(self) -> dict:
+        """Ends the stream. Returns the whole object, or raises if it never closed."""
+        if not self.done:
+            raise JsonStreamError("The reply ended before its JSON object was complete.")
+        return self.members
+
+    # --- Internals: depth 1 is directly inside the top-level object ---
+
+    def _begin_string(self, i: int):
+        if self._expect == "key":
+            self._key_start = i
+        elif self._expect == "value" and self._value_start is None:
+            self._value_start = i
+        else:
+            raise JsonStreamError(f"Unexpected string at offset {i}.")
+
+    def _end_string(self, i: int, completed: list):
+        if self._expect == "key":
+            self._key = json.loads(self._text[self._key_start:i + 1])
+            self._expect = "colon"
+        else:
+            self._complete(i + 1, completed)
+
+    def _top_level_char(self, i: int, ch: str, completed: list):
+        if self._expect == "colon":
+            if ch != ":":
+                raise JsonStreamError(f"Expected ':' at offset {i}, got '{ch}'.")
+            self._expect = "value"
+            self._value_start = None
+        elif self._expect == "value":
+            if self._value_start is None:
+                if ch in "]}":
+                    raise JsonStreamError(f"Missing value at offset {i}.")
+                self._value_start = i
+                if ch in "{[":
+                    self._stack.append(ch)
+            elif ch in ",}":
+                # The end of a number, true, false or null.
+                self._complete(i, completed)
+                self._top_level_char(i, ch, completed)
+            elif ch in "{[]:":
+                raise JsonStreamError(f"Unexpected '{ch}' at offset {i}.")
+        elif ch == ",":
+            if self._expect != "comma":
+                raise JsonStreamError(f"Unexpected ',' at offset {i}.")
+            self._expect = "key"
+        elif ch == "}":
+            if self._expect == "key" and self.members:
+                raise JsonStreamError(f"Trailing ',' before offset {i}.")
+            self._stack.pop()
+            self.done = True
+        else:
+            raise JsonStreamError(f"Unexpected '{ch}' at offset {i}.")
+
+    def _complete(self, end: int, completed: list):
+        raw = self._text[self._value_start:end]
+        try:
+            value = json.loads(raw)
+        except json.JSONDecodeError as e:
+            raise JsonStreamError(f"Member '{self._key}' is not valid JSON: {e}")
+        self.members[self._key] = value
+        completed.append((self._key, value))
+        self._expect = "comma"
+        self._value_start = None
+
+
+def parse_json_object(text: str) -> dict:
+    """Parses the first JSON object in a complete reply, ignoring text around it."""
+    parser = JsonStreamParser(max_preamble=len(text))
+    parser.feed(text)
+    return parser.close()
@@ -0,0 +1,640 @@
+# tools/model_client.py
+
+import os
+import json
+import time
+import hashlib
+import asyncio
+import logging
+import threading
+from contextlib import aclosing
+import google.generativeai as genai
+from dotenv import load_dotenv
+from tools.image_encoder import get_image_encoder
+from tools.image_hash import frame_digest, perceptual_hash
+from tools.model_router import CALL_CLASSES, get_model_router
+from tools.json_stream import JsonStreamError, JsonStreamParser, parse_json_object
+from tools.response_cache import CACHE_TTLS, EXACT_IMAGE_CLASSES, get_response_cache
+from tools.request_scheduler import RequestScheduler, estimate_tokens, priority_of
+from tools import telemetry
+from tools.telemetry import get_telemetry
+
+# Load environment variables at the top of the module
+load_dotenv()
+
+# Configure logging for this module
+logger = logging.getLogger(__name__)
+
+# Configure the API key once
+GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+if GEMINI_API_KEY:
+    genai.configure(api_key=GEMINI_API_KEY)
+
+# Low temperature for deterministic UI analysis.
+VISION_GENERATION_CONFIG = {"temperature": 0.1}
+# Model calls in flight at once, across all agents.
+DEFAULT_MAX_CONCURRENCY = int(os.getenv("MODEL_MAX_CONCURRENCY", "4"))
+# Seconds one model attempt may take before it is abandoned and the next model is tried.
+DEFAULT_TIMEOUT = float(os.getenv("MODEL_TIMEOUT", "60"))
+
+# Hedging: when a model has not answered within its recent latency
+# percentile, the next model in the fallback order is started alongside it.
+DEFAULT_HEDGING = os.getenv("MODEL_HEDGING", "1") == "1"
+DEFAULT_HEDGE_PERCENTILE = float(os.getenv("MODEL_HEDGE_PERCENTILE", "95"))
+# Hedge delay (seconds) used until a model has enough latency samples.
+DEFAULT_HEDGE_DELAY = float(os.getenv("MODEL_HEDGE_DELAY", "2.0"))
+MIN_HEDGE_DELAY = 0.05
+
+# Stream replies that are read as JSON objects, so they can be used (or
+# rejected) before the model has finished writing them.
+DEFAULT_STREAMING = os.getenv("MODEL_STREAMING", "1") == "1"
+
+# Reuse model objects, and the SDK clients and channels they hold, across calls.
+DEFAULT_MODEL_POOLING = os.getenv("MODEL_POOLING", "1") == "1"
+# Call classes whose models are warmed up by ModelClient.warm_up() by default.
+DEFAULT_WARMUP_CLASSES = ("planning", "validation", "text")
+
+
+def _gemini_model(model_name: str, generation_config: dict | None):
+    return genai.GenerativeModel(model_name, generation_config=generation_config)
+
+
+class ModelRegistry:
+    """
+    Process-wide model objects, one per (model name, generation config).
+
+    Building a GenerativeModel per call throws away the SDK client it
+    creates and, with it, any open channel to the API. The registry hands
+    out the same object for the same model and settings instead, and counts
+    how often one was reused. With pooling off it builds a new object every
+    time, as before.
+    """
+    def __init__(self, factory=None, pooling: bool = DEFAULT_MODEL_POOLING):
+        self.factory = factory or _gemini_model
+        self.pooling = pooling
+        self._models: dict[tuple, object] = {}
+        self._counts: dict[tuple, dict] = {}
+        self._lock = threading.Lock()
+
+    def get(self, model_name: str, generation_config: dict | None = None):
+        key = (model_name, json.dumps(generation_config, sort_keys=True) if generation_config else "")
+        with self._lock:
+            counts = self._counts.setdefault(key, {"created": 0, "reused": 0, "warmed": False})
+            model = self._models.get(key)
+            if model is not None:
+                counts["reused"] += 1
+                return model
+            counts["created"] += 1
+            model = self.factory(model_name, generation_config)
+            if self.pooling:
+                self._models[key] = model
+            return model
+
+    def mark_warmed(self, model_name: str, generation_config: dict | None = None):
+        key = (model_name, json.dumps(generation_config, sort_keys=True) if generation_config else "")
+        with self._lock:
+            self._counts.setdefault(key, {"created": 0, "reused": 0, "warmed": False})["warmed"] = True
+
+    def stats(self) -> dict:
+        """Objects created and reused in total and per (model, config)."""
+        with self._lock:
+            created = sum(c["created"] for c in self._counts.values())
+            reused = sum(c["reused"] for c in self._counts.values())
+            return {
+                "pooled_models": len(self._models),
+                "created": created,
+                "reused": reused,
+                "reuse_rate": reused / (created + reused) if created + reused else 0.0,
+                "models": {f"{name} {config}".strip(): dict(counts) for (name, config), counts in self._counts.items()},
+            }
+
+    def clear(self):
+        with self._lock:
+            self._models.clear()
+
+
+class GeminiTransport:
+    """Sends generate requests through the google.generativeai SDK's async API."""
+    def __init__(self, registry: ModelRegistry | None = None):
+        self.registry = registry or get_model_registry()
+
+    @property
+    def ready(self) -> bool:
+        return bool(GEMINI_API_KEY)
+
+    async def generate(self, model_name: str, contents: list, generation_config: dict | None) -> str | None:
+        model = self.registry.get(model_name, generation_config)
+        response = await model.generate_content_async(contents)
+        telemetry.note_usage(getattr(response, "usage_metadata", None))
+        return response.text if response else None
+
+    async def stream(self, model_name: str, contents: list, generation_config: dict | None):
+        """Yields the reply's text as it is generated."""
+        model = self.registry.get(model_name, generation_config)
+        response = await model.generate_content_async(contents, stream=True)
+        async for chunk in response:
+            # Only the last chunk carries the final counts; earlier ones are overwritten.
+            telemetry.note_usage(getattr(chunk, "usage_metadata", None))
+            try:
+                text = chunk.text
+            except ValueError:
+                continue  # A chunk without text parts, e.g. the final one carrying only metadata.
+            if text:
+                yield text
+
+    async def warm_up(self, model_name: str, generation_config: dict | None):
+        """Builds the model object and opens its channel with a free token-count request."""
+        model = self.registry.get(model_name, generation_config)
+        await model.count_tokens_async("ping")
+        self.registry.mark_warmed(model_name, generation_config)
+
+    def stats(self) -> dict:
+        return self.registry.stats()
+
+
+class ModelClient:
+    """
+    A non-blocking client for Gemini text and vision queries.
+
+    All model calls run on a private event loop in a background thread, so
+    the SDK's async transport always lives on one loop no matter which
+    thread or loop the caller is on. Async callers await the a* methods,
+    which never block their own loop (Playwright keeps running); sync
+    callers use the plain methods, which wait for the result.
+
+    A request scheduler (tools.request_scheduler) bounds the number of calls
+    in flight, keeps each model within its requests- and tokens-per-minute
+    budget, and lets higher-priority call classes go first. Every model
+    attempt has a timeout, and cancelling the awaiting caller cancels the
+    request. Identical queries in flight at the same time share one call.
+
+    Each call names a call class (planning, validation, analysis, vision,
+    text); the model router (tools.model_router) picks the models and their
+    order for it, skipping models whose circuit is open, and is told how
+    every attempt went. Models are tried in that order. With hedging on, the
+    next model is also started as soon as the current one fails or exceeds
+    its p95 latency, instead of only after its full timeout; the first valid
+    response wins and the other requests are cancelled.
+
+    Answers are kept in the response cache (tools.response_cache) for the
+    call class's TTL. `cache_ttl` overrides it per call site; 0 opts out.
+
+    Every query is recorded in the model telemetry (tools.telemetry) under
+    its `caller` (the call class if not given): model attempts, tokens,
+    image bytes, time to first byte and latency.
+    """
+    def __init__(self, max_concurrency: int = DEFAULT_MAX_CONCURRENCY, timeout: float = DEFAULT_TIMEOUT,
+                 hedging: bool = DEFAULT_HEDGING, hedge_percentile: float = DEFAULT_HEDGE_PERCENTILE,
+                 hedge_delay: float = DEFAULT_HEDGE_DELAY, transport=None, router=None,
+                 streaming: bool = DEFAULT_STREAMING, cache=None, scheduler=None, telemetry=None):
+        self.timeout = timeout
+        self.streaming = streaming
+        self.hedging = hedging
+        self.hedge_percentile = hedge_percentile
+        self.hedge_delay = hedge_delay
+        self.transport = transport or GeminiTransport()
+        self.router = router or get_model_router()
+        self.cache = cache or get_response_cache()
+        self.scheduler = scheduler or RequestScheduler(max_concurrency)
+        self.telemetry = telemetry or get_telemetry()
+        self._stats = {"requests": 0, "hedged_requests": 0, "hedge_wins": 0, "failed_requests": 0, "wins": {}}
+        self._flights: dict[tuple, list] = {}
+        self._coalesced = 0
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="ModelClient", daemon=True)
+        self._thread.start()
+
+    # --- Async API ---
+
+    async def avision_query(self, pixels, prompt: str, models=None, profile: str = "default",
+                            timeout: float | None = None, validator=None, call_class: str | None = None,
+                            stream_until: str | None = None, cache_ttl: float | None = None,
+                            caller: str | None = None) -> str | None:
+        """
+        Asks the models about an image. Returns None if every model failed.
+        `models` overrides the router's candidates for the call class, which
+        defaults to the encoding profile's name. `validator(text)` can reject
+        answers (e.g. ones without parseable JSON) so that the next model's
+        answer is used.
+
+        With `stream_until`, the reply must be a JSON object and is streamed:
+        the query returns as soon as that top-level member is complete, as a
+        JSON object of the members received so far (later members are not
+        waited for). A reply that cannot be such an object fails as soon as
+        that shows, handing over to the next model.
+        """
+        call_class = call_class or _vision_call_class(profile)
+        return await self._await(self._vision_query(pixels, prompt, models, profile, timeout, validator, call_class,
+                                                    stream_until, cache_ttl, caller))
+
+    async def aimage_query(self, image_bytes: bytes, mime_type: str, prompt: str, models=None,
+                           timeout: float | None = None, validator=None, call_class: str = "vision",
+                           cache_ttl: float | None = None, caller: str | None = None) -> str | None:
+        """Like avision_query, for an already encoded image."""
+        return await self._await(self._image_query(image_bytes, mime_type, prompt, models, timeout, validator,
+                                                   call_class, cache_ttl, caller))
+
+    async def atext_query(self, prompt: str, models=None, generation_config: dict | None = None,
+                          timeout: float | None = None, validator=None, call_class: str = "text",
+                          cache_ttl: float | None = None, caller: str | None = None) -> str | None:
+        """A text-only query. Returns None if every model failed."""
+        return await self._await(self._cached(
+            lambda: self._query([prompt], models, call_class, generation_config, timeout, validator),
+            call_class, cache_ttl, models, prompt, "", generation_config, caller=caller, validator=validator,
+            timeout=timeout
+        ))
+
+    # --- Sync wrappers ---
+
+    def vision_query(self, pixels, prompt: str, models=None, profile: str = "default",
+                     timeout: float | None = None, validator=None, call_class: str | None = None,
+                     stream_until: str | None = None, cache_ttl: float | None = None,
+                     caller: str | None = None) -> str | None:
+        call_class = call_class or _vision_call_class(profile)
+        return self._wait(self._vision_query(pixels, prompt, models, profile, timeout, validator, call_class,
+                                             stream_until, cache_ttl, caller))
+
+    def image_query(self, image_bytes: bytes, mime_type: str, prompt: str, models=None,
+                    timeout: float | None = None, validator=None, call_class: str = "vision",
+                    cache_ttl: float | None = None, caller: str | None = None) -> str | None:
+        return self._wait(self._image_query(image_bytes, mime_type, prompt, models, timeout, validator, call_class,
+                                            cache_ttl, caller))
+
+    def text_query(self, prompt: str, models=None, generation_config: dict | None = None,
+                   timeout: float | None = None, validator=None, call_class: str = "text",
+                   cache_ttl: float | None = None, caller: str | None = None) -> str | None:
+        return self._wait(self._cached(
+            lambda: self._query([prompt], models, call_class, generation_config, timeout, validator),
+            call_class, cache_ttl, models, prompt, "", generation_config, caller=caller, validator=validator,
+            timeout=timeout
+        ))
+
+    def hedge_stats(self) -> dict:
+        """Request, hedge and win counters, plus the current hedge delay per model."""
+        stats = {**self._stats, "wins": dict(self._stats["wins"])}
+        requests = stats["requests"]
+        stats["hedge_rate"] = stats["hedged_requests"] / requests if requests else 0.0
+        stats["hedge_win_rate"] = stats["hedge_wins"] / stats["hedged_requests"] if stats["hedged_requests"] else 0.0
+        stats["hedge_delays"] = {model: self._hedge_delay(model) for model in self.router.stats()}
+        return stats
+
+    async def awarm_up(self, call_classes=DEFAULT_WARMUP_CLASSES, timeout: float | None = None) -> dict:
+        """
+        Builds and connects the models the router would pick first for each
+        call class, so the first real query does not pay for it. Returns
+        {model: True/False}. Failures are logged and otherwise ignored.
+        """
+        return await self._await(self._warm_up(list(call_classes), timeout))
+
+    def warm_up(self, call_classes=DEFAULT_WARMUP_CLASSES, timeout: float | None = None) -> dict:
+        return self._wait(self._warm_up(list(call_classes), timeout))
+
+    def pool_stats(self) -> dict:
+        """Model object and connection reuse counts reported by the transport."""
+        return self.transport.stats() if hasattr(self.transport, "stats") else {}
+
+    def cache_stats(self) -> dict:
+        """Response cache hits, misses and hit rates, per call class."""
+        return self.cache.stats()
+
+    def scheduler_stats(self) -> dict:
+        """Queue depth and wait times per priority, rate-limit pauses, and queries that shared a call."""
+        return self._wait(self._scheduler_stats())
+
+    def close(self):
+        """Stops the client's event loop and saves the router state. Pending requests are cancelled."""
+        if self._loop.is_closed():
+            return
+        if threading.current_thread() is not self._thread:
+            try:
+                asyncio.run_coroutine_threadsafe(self._cancel_pending(), self._loop).result(timeout=5)
+            except Exception as e:
+                logger.warning(f"Failed to cancel pending model requests: {e}")
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+        self._loop.close()
+        self.router.save()
+
+    # --- Internals (run on the client's loop) ---
+
+    async def _vision_query(self, pixels, prompt: str, models: list[str] | None, profile: str, timeout: float | None,
+                            validator, call_class: str, stream_until: str | None = None,
+                            cache_ttl: float | None = None, caller: str | None = None) -> str | None:
+        async def query() -> str | None:
+            try:
+                image_bytes = await get_image_encoder().aencode(pixels, profile)
+            except Exception as e:
+                logger.error(f"Failed to encode image for vision query: {e}", exc_info=True)
+                return None
+            telemetry.update_call(image_bytes=len(image_bytes))
+            image_part = {"mime_type": "image/webp", "data": image_bytes}
+            return await self._query([prompt, image_part], models, call_class, VISION_GENERATION_CONFIG, timeout,
+                                     validator, stream_until)
+
+        # Keyed by what is on screen rather than the exact pixels, so near-identical frames share answers,
+        # except where an answer about a slightly different screen would be wrong. Hashing a full frame
+        # takes milliseconds, so it runs off the loop.
+        digest = frame_digest if call_class in EXACT_IMAGE_CLASSES else perceptual_hash
+        image_id = await asyncio.get_running_loop().run_in_executor(None, digest, pixels)
+        return await self._cached(query, call_class, cache_ttl, models, prompt, image_id, VISION_GENERATION_CONFIG,
+                                  stream_until, caller, validator, timeout)
+
+    async def _image_query(self, image_bytes: bytes, mime_type: str, prompt: str, models: list[str] | None,
+                           timeout: float | None, validator, call_class: str, cache_ttl: float | None,
+                           caller: str | None = None) -> str | None:
+        contents = [prompt, {"mime_type": mime_type, "data": image_bytes}]
+
+        async def query() -> str | None:
+            telemetry.update_call(image_bytes=len(image_bytes))
+            return await self._query(contents, models, call_class, VISION_GENERATION_CONFIG, timeout, validator)
+
+        image_id = hashlib.sha1(image_bytes).hexdigest()
+        return await self._cached(query, call_class, cache_ttl, models, prompt, image_id, VISION_GENERATION_CONFIG,
+                                  caller=caller, validator=validator, timeout=timeout)
+
+    async def _cached(self, query, call_class: str, cache_ttl: float | None, models: list[str] | None, prompt: str,
+                      image_id: str, generation_config: dict | None, stream_until: str | None = None,
+                      caller: str | None = None, validator=None, timeout: float | None = None) -> str | None:
+        """
+        Runs `query()` unless the response cache has its answer, and caches
+        what it returns. An identical query already in flight is joined
+        instead of starting another call. Records the query's telemetry.
+
+        `validator` and `timeout` are the ones `query()` runs with. A cached
+        answer the validator rejects is not used, and only flights with the
+        same validator and timeout are joined, so no caller gets an answer
+        its own checks would have refused.
+        """
+        call = telemetry.begin_call(caller or call_class, call_class)
+        status, text = "failed", None
+        try:
+            ttl = self._cache_ttl(call_class, cache_ttl)
+            key = self.cache.key(call_class, models, prompt, image_id, generation_config, stream_until or "")
+            if ttl:
+                text = await self.cache.aget(key, call_class)
+                if text is not None and (validator is None or validator(text)):
+                    logger.info(f"Answered '{call_class}' query from the response cache.")
+                    status = "cached"
+                    return text
+                text = None
+            flight_key = (key, validator, timeout)
+            flight = self._flights.get(flight_key)
+            joined = flight is not None
+            if not joined:
+                task = asyncio.ensure_future(query())  # Inherits `call`, so the query fills it in.
+                flight = self._flights[flight_key] = [task, 0]
+                task.add_done_callback(lambda done: self._landed(flight_key, key, done, ttl))
+            else:
+                self._coalesced += 1
+                logger.info(f"Joining an identical '{call_class}' query already in flight.")
+            flight[1] += 1
+            try:
+                text = await asyncio.shield(flight[0])
+            except asyncio.CancelledError:
+                # The call is only abandoned once every caller waiting on it has gone.
+                flight[1] -= 1
+                if flight[1] == 0:
+                    flight[0].cancel()
+                raise
+            if text is not None:
+                status = "coalesced" if joined else "ok"
+            return text
+        except asyncio.CancelledError:
+            status = "cancelled"
+            raise
+        finally:
+            self.telemetry.record(telemetry.finish_call(call, status, text))
+
+    def _landed(self, flight_key: tuple, key: str, task: asyncio.Task, ttl: float):
+        if self._flights.get(flight_key, [None])[0] is task:
+            del self._flights[flight_key]
+        if ttl and not task.cancelled() and task.exception() is None:
+            self.cache.put(key, task.result(), ttl)
+
+    def _cache_ttl(self, call_class: str, cache_ttl: float | None) -> float:
+        if not self.cache.enabled:
+            return 0.0
+        return CACHE_TTLS.get(call_class, 0.0) if cache_ttl is None else cache_ttl
+
+    async def _warm_up(self, call_classes: list[str], timeout: float | None) -> dict:
+        if not self.transport.ready or not hasattr(self.transport, "warm_up"):
+            return {}
+        targets = {}
+        for call_class in call_classes:
+            generation_config = None if call_class == "text" else VISION_GENERATION_CONFIG
+            for model_name in self.router.order(call_class):
+                targets[(model_name, json.dumps(generation_config))] = (model_name, generation_config)
+                self.router.release(model_name)
+
+        async def warm(model_name: str, generation_config: dict | None) -> bool:
+            try:
+                await asyncio.wait_for(self.transport.warm_up(model_name, generation_config), timeout or self.timeout)
+                return True
+            except Exception as e:
+                logger.warning(f"Warm-up of model `{model_name}` failed: {e}")
+                return False
+
+        results = await asyncio.gather(*(warm(*target) for target in targets.values()))
+        warmed = {}
+        for (model_name, _), ok in zip(targets.values(), results):
+            warmed[model_name] = warmed.get(model_name, True) and ok
+        logger.info(f"Warmed up {sum(results)}/{len(results)} model configuration(s).")
+        return warmed
+
+    async def _query(self, contents: list, models: list[str] | None, call_class: str, generation_config: dict | None,
+                     timeout: float | None, validator, stream_until: str | None = None) -> str | None:
+        if not self.transport.ready:
+            logger.error("Cannot make API call without API key.")
+            return None
+        self._stats["requests"] += 1
+        remaining = self.router.order(call_class, models)
+        candidates = list(remaining)
+        pending: dict[asyncio.Task, str] = {}
+        hedges: set[asyncio.Task] = set()
+        hedged = False
+
+        priority, tokens = priority_of(call_class), estimate_tokens(contents)
+        telemetry.update_call(_prompt_tokens_estimate=tokens)
+
+        def launch(as_hedge: bool = False):
+            model_name = remaining.pop(0)
+            task = asyncio.ensure_future(self._attempt(model_name, contents, generation_config, timeout, validator,
+                                                       stream_until, priority, tokens))
+            pending[task] = model_name
+            if as_hedge:
+                hedges.add(task)
+
+        launch()
+        try:
+            while pending:
+                # Wait for the newest attempt up to its hedge delay, if there is a model left to race.
+                newest = next(reversed(pending.values()))
+                delay = self._hedge_delay(newest) if self.hedging and remaining else None
+                done, _ = await asyncio.wait(pending, timeout=delay, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    logger.info(f"Model `{newest}` is slower than {delay:.2f}s. Hedging with `{remaining[0]}`.")
+                    if not hedged:
+                        hedged = True
+                        self._stats["hedged_requests"] += 1
+                    launch(as_hedge=True)
+                    continue
+                for task in done:
+                    model_name = pending.pop(task)
+                    text = task.result()
+                    if text is not None:
+                        telemetry.update_call(fallback_hops=candidates.index(model_name))
+                        self._stats["wins"][model_name] = self._stats["wins"].get(model_name, 0) + 1
+                        if task in hedges:
+                            self._stats["hedge_wins"] += 1
+                        return text
+                # A failed attempt hands over to the next model straight away.
+                if remaining:
+                    launch()
+        finally:
+            for task in pending:
+                task.cancel()
+            # Cancelled and never-started attempts give back any probe slot the router handed out.
+            for model_name in [*pending.values(), *remaining]:
+                self.router.release(model_name)
+        self._stats["failed_requests"] += 1
+        logger.error("All models failed to generate a response.")
+        return None
+
+    async def _attempt(self, model_name: str, contents: list, generation_config: dict | None, timeout: float | None,
+                       validator, stream_until: str | None = None, priority: int = 0, tokens: int = 0) -> str | None:
+        """One model call. Returns the text, or None if it failed, timed out or was rejected."""
+        attempt = telemetry.begin_attempt(model_name)
+        try:
+            # Latency is measured from the start of the call, not from joining the queue.
+            async with self.scheduler.slot(model_name, priority, tokens):
+                telemetry.attempt_started()
+                logger.info(f"Querying model `{model_name}`...")
+                start = time.monotonic()
+                if stream_until:
+                    text = await self._generate_json(model_name, contents, generation_config, timeout, stream_until)
+                else:
+                    text = await self._generate(model_name, contents, generation_config, timeout)
+                elapsed = time.monotonic() - start
+        except JsonStreamError as e:
+            logger.warning(f"Model `{model_name}` returned an unusable response: {e}")
+            attempt["outcome"] = "parse"
+            self.router.record_failure(model_name, "parse")
+            return None
+        except asyncio.TimeoutError:
+            logger.warning(f"Model `{model_name}` timed out after {timeout or self.timeout:g}s.")
+            attempt["outcome"] = "timeout"
+            self.router.record_failure(model_name, "timeout")
+            return None
+        except Exception as e:
+            logger.warning(f"Model `{model_name}` failed: {e}")
+            attempt["outcome"] = "error"
+            if _is_rate_limited(e):
+                attempt["outcome"] = "rate_limited"
+                self.scheduler.throttle(model_name)
+            self.router.record_failure(model_name, "error")
+            return None
+        # A reply that is not streamed arrives in one piece.
+        attempt["latency"], attempt["ttfb"] = elapsed, attempt["ttfb"] or elapsed
+        if not text:
+            logger.warning(f"Model `{model_name}` returned an empty response.")
+            attempt["outcome"] = "empty"
+            self.router.record_failure(model_name, "error")
+            return None
+        if validator and not validator(text):
+            logger.warning(f"Model `{model_name}` returned an unusable response.")
+            attempt["outcome"] = "parse"
+            self.router.record_failure(model_name, "parse")
+            return None
+        attempt["outcome"] = "ok"
+        self.router.record_success(model_name, elapsed)
+        logger.info(f"Model `{model_name}` succeeded in {elapsed:.2f}s.")
+        return text
+
+    async def _generate(self, model_name: str, contents: list, generation_config: dict | None,
+                        timeout: float | None) -> str | None:
+        return await asyncio.wait_for(
+            self.transport.generate(model_name, contents, generation_config),
+            timeout or self.timeout
+        )
+
+    async def _generate_json(self, model_name: str, contents: list, generation_config: dict | None,
+                             timeout: float | None, until: str) -> str:
+        """Reads the reply as a JSON object until member `until` is complete. Returns the members so far as JSON."""
+        async def read() -> dict:
+            if not (self.streaming and hasattr(self.transport, "stream")):
+                members = parse_json_object(await self.transport.generate(model_name, contents, generation_config) or "")
+            else:
+                parser = JsonStreamParser()
+                async with aclosing(self.transport.stream(model_name, contents, generation_config)) as chunks:
+                    async for chunk in chunks:
+                        telemetry.note_first_byte()
+                        if any(key == until for key, _ in parser.feed(chunk)) or parser.done:
+                            break
+                members = parser.members if until in parser.members else parser.close()
+            if until not in members:
+                raise JsonStreamError(f"The reply has no '{until}' member.")
+            return members
+
+        return json.dumps(await asyncio.wait_for(read(), timeout or self.timeout))
+
+    async def _scheduler_stats(self) -> dict:
+        return {**self.scheduler.stats(), "coalesced": self._coalesced, "in_flight_queries": len(self._flights)}
+
+    async def _cancel_pending(self):
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _hedge_delay(self, model_name: str) -> float:
+        latency = self.router.latency_percentile(model_name, self.hedge_percentile)
+        if latency is None:
+            return self.hedge_delay
+        return max(MIN_HEDGE_DELAY, latency)
+
+    async def _await(self, coro):
+        future = asyncio.run_coroutine_threadsafe(coro, self._loop)
+        # Cancelling the awaiting task cancels the wrapped future and with it the request.
+        return await asyncio.wrap_future(future)
+
+    def _wait(self, coro):
+        if threading.current_thread() is self._thread:
+            coro.close()
+            raise RuntimeError("Sync model calls cannot be made from the model client's own loop.")
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+
+def _is_rate_limited(error: Exception) -> bool:
+    """Whether a model error is the provider's rate limit (HTTP 429 / ResourceExhausted)."""
+    return getattr(error, "code", None) == 429 or type(error).__name__ == "ResourceExhausted" or "429" in str(error)
+
+
+def _vision_call_class(profile: str) -> str:
+    """Vision calls are routed by their encoding profile's name when it is a call class."""
+    return profile if profile in CALL_CLASSES else "vision"
+
+
+_shared_registry: ModelRegistry | None = None
+_shared_registry_lock = threading.Lock()
+
+
+def get_model_registry() -> ModelRegistry:
+    """Returns the process-wide model registry."""
+    global _shared_registry
+    with _shared_registry_lock:
+        if _shared_registry is None:
+            _shared_registry = ModelRegistry()
+        return _shared_registry
+
+
+_shared_client: ModelClient | None = None
+_shared_client_lock = threading.Lock()
+
+
+def get_model_client() -> ModelClient:
+    """Returns the process-wide model client, starting its loop thread on first use."""
+    global _shared_client
+    with _shared_client_lock:
+        if _shared_client is None:
+            _shared_client = ModelClient()
+        return _shared_client
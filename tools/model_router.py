@@ -0,0 +1,297 @@
+# tools/model_router.py
+
+import os
+import json
+import time
+import logging
+import tempfile
+import threading
+from collections import deque
+
+# Configure logging for this module
+logger = logging.getLogger(__name__)
+
+ROUTER_STATE_FILE = os.getenv("MODEL_ROUTER_STATE_FILE", "memory/model_router.json")
+
+# Candidate models per call class, in order of preference. "quality" classes
+# keep that order and only demote unhealthy models; "latency" classes try
+# the healthy model with the lowest median latency first.
+CALL_CLASSES = {
+    "planning": {"models": ["gemini-1.5-pro-latest", "gemini-1.5-flash-latest"], "prefer": "quality"},
+    "validation": {"models": ["gemini-1.5-flash-latest", "gemini-1.5-pro-latest"], "prefer": "latency"},
+    "analysis": {"models": ["gemini-1.5-flash-latest", "gemini-1.5-pro-latest"], "prefer": "latency"},
+    "vision": {"models": ["gemini-1.5-flash-latest", "gemini-1.5-pro-latest"], "prefer": "latency"},
+    "text": {"models": ["gemini-1.5-flash-latest"], "prefer": "latency"},
+}
+
+# Outcomes (and latencies) remembered per model.
+HEALTH_WINDOW = 200
+# Rates and percentiles are only trusted after this many outcomes.
+MIN_HEALTH_SAMPLES = 5
+# A model whose recent errors and unusable answers exceed this rate is tried after healthy ones.
+DEGRADED_FAILURE_RATE = 0.25
+
+# Circuit breaker: opens after this many failures in a row, or when at least
+# half of the last BREAKER_RATE_WINDOW outcomes failed.
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("MODEL_BREAKER_FAILURES", "3"))
+BREAKER_FAILURE_RATE = 0.5
+BREAKER_RATE_WINDOW = 20
+# Seconds an open circuit waits before a half-open probe; doubles each time a probe fails.
+BREAKER_COOLDOWN = float(os.getenv("MODEL_BREAKER_COOLDOWN", "30"))
+BREAKER_MAX_COOLDOWN = 900.0
+# A probe that never reports back frees its slot after this many seconds.
+PROBE_TIMEOUT = 120.0
+
+# Seconds between state file writes caused by ordinary outcomes (breaker changes save at once).
+SAVE_INTERVAL = 10.0
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+FAILURE_KINDS = ("error", "timeout", "parse")
+
+
+class ModelHealth:
+    """Rolling outcome and latency history of one model, plus its circuit breaker state."""
+    def __init__(self):
+        self.outcomes: deque = deque(maxlen=HEALTH_WINDOW)   # "ok", "error", "timeout" or "parse"
+        self.latencies: deque = deque(maxlen=HEALTH_WINDOW)  # Seconds, successful calls only.
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.open_count = 0          # Opens since the circuit last closed; sets the cooldown.
+        self.opened_until = 0.0      # Wall-clock time at which an open circuit may be probed.
+        self.probe_started = None    # Monotonic time of the half-open probe in flight, if any.
+
+    def latency_percentile(self, p: float) -> float | None:
+        if len(self.latencies) < MIN_HEALTH_SAMPLES:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+    def rate(self, *kinds: str, last: int | None = None) -> float:
+        outcomes = list(self.outcomes)[-last:] if last else self.outcomes
+        if len(outcomes) < MIN_HEALTH_SAMPLES:
+            return 0.0
+        return sum(1 for outcome in outcomes if outcome in kinds) / len(outcomes)
+
+    def failure_rate(self, last: int | None = None) -> float:
+        return self.rate(*FAILURE_KINDS, last=last)
+
+    def to_dict(self) -> dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "open_count": self.open_count,
+            "opened_until": self.opened_until,
+            "outcomes": list(self.outcomes),
+            "latencies": [round(seconds, 4) for seconds in self.latencies],
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "ModelHealth":
+        health = cls()
+        health.outcomes.extend(data.get("outcomes", []))
+        health.latencies.extend(data.get("latencies", []))
+        # A probe in flight when the last run ended never reported back.
+        health.state = OPEN if data.get("state") == HALF_OPEN else data.get("state", CLOSED)
+        health.consecutive_failures = data.get("consecutive_failures", 0)
+        health.open_count = data.get("open_count", 0)
+        health.opened_until = data.get("opened_until", 0.0)
+        return health
+
+
+class ModelRouter:
+    """
+    Chooses the order in which models are tried for each call class, from
+    what it has seen of them.
+
+    Every attempt reports back a latency or a failure (error, timeout, or an
+    answer the caller could not use). A model that keeps failing has its
+    circuit opened and is skipped; after a cooldown one half-open probe
+    request is sent to it first, and its outcome closes the circuit or
+    re-opens it for twice as long. Models with a high recent failure rate
+    are tried after healthy ones, and latency-sensitive call classes put the
+    fastest healthy model first.
+
+    The history is saved to a small JSON file so a model that was failing
+    when the process stopped is not blindly tried first on the next run.
+    """
+    def __init__(self, state_path: str | None = ROUTER_STATE_FILE, call_classes: dict | None = None):
+        self.state_path = state_path or None
+        self.call_classes = call_classes or CALL_CLASSES
+        self._health: dict[str, ModelHealth] = {}
+        self._lock = threading.Lock()
+        self._last_save = 0.0
+        self._load()
+
+    def order(self, call_class: str, models: list[str] | None = None) -> list[str]:
+        """
+        The models to try for `call_class`, best first. `models` overrides
+        the class's candidates (their order is the preference). Open circuits
+        are left out unless every candidate is open, in which case all are
+        returned so the call is still attempted.
+        """
+        settings = self.call_classes.get(call_class) or CALL_CLASSES.get(call_class, CALL_CLASSES["vision"])
+        candidates = list(models) if models else list(settings["models"])
+        with self._lock:
+            healthy, degraded, probes = [], [], []
+            for model_name in candidates:
+                health = self._health_of(model_name)
+                if health.state != CLOSED and not self._take_probe(model_name, health):
+                    continue
+                if health.state == HALF_OPEN:
+                    probes.append(model_name)
+                elif health.failure_rate() > DEGRADED_FAILURE_RATE:
+                    degraded.append(model_name)
+                else:
+                    healthy.append(model_name)
+            if settings["prefer"] == "latency":
+                # Models without enough samples sort first, so they get measured.
+                healthy.sort(key=lambda m: (self._health[m].latency_percentile(50) or 0.0, candidates.index(m)))
+            # A probe goes first so it is actually sent; hedging limits what a bad one costs.
+            chosen = probes + healthy + degraded
+        if not chosen:
+            logger.warning(f"All models for '{call_class}' have open circuits. Trying them anyway.")
+            return candidates
+        return chosen
+
+    def record_success(self, model_name: str, latency: float):
+        with self._lock:
+            health = self._health_of(model_name)
+            health.outcomes.append("ok")
+            health.latencies.append(latency)
+            health.consecutive_failures = 0
+            changed = health.state != CLOSED
+            if changed:
+                logger.info(f"Circuit for model `{model_name}` closed after a successful call.")
+                health.state, health.open_count, health.probe_started = CLOSED, 0, None
+                # Start the failure rate afresh so one more error does not re-open it at once.
+                health.outcomes.clear()
+                health.outcomes.append("ok")
+        self._save(force=changed)
+
+    def record_failure(self, model_name: str, kind: str = "error"):
+        """Records a failed attempt: kind is "error", "timeout" or "parse" (an unusable answer)."""
+        if kind not in FAILURE_KINDS:
+            raise ValueError(f"Unknown failure kind: '{kind}'")
+        with self._lock:
+            health = self._health_of(model_name)
+            health.outcomes.append(kind)
+            health.consecutive_failures += 1
+            should_open = (
+                health.state == HALF_OPEN
+                or health.consecutive_failures >= BREAKER_FAILURE_THRESHOLD
+                or health.failure_rate(last=BREAKER_RATE_WINDOW) >= BREAKER_FAILURE_RATE
+            )
+            changed = should_open and health.state != OPEN
+            if changed:
+                self._open(model_name, health)
+        self._save(force=changed)
+
+    def release(self, model_name: str):
+        """Frees a half-open probe slot taken by order() for an attempt that was never made or was cancelled."""
+        with self._lock:
+            health = self._health.get(model_name)
+            if health is not None and health.state == HALF_OPEN:
+                health.state, health.probe_started = OPEN, None
+                health.opened_until = 0.0  # Still due for a probe.
+
+    def latency_percentile(self, model_name: str, p: float) -> float | None:
+        """The model's p-th percentile latency in seconds, or None without enough samples."""
+        with self._lock:
+            health = self._health.get(model_name)
+            return health.latency_percentile(p) if health else None
+
+    def stats(self) -> dict:
+        """Per-model circuit state, latency percentiles and failure rates."""
+        with self._lock:
+            return {
+                model_name: {
+                    "state": health.state,
+                    "samples": len(health.outcomes),
+                    "p50": health.latency_percentile(50),
+                    "p95": health.latency_percentile(95),
+                    "error_rate": health.rate("error", "timeout"),
+                    "parse_failure_rate": health.rate("parse"),
+                    "consecutive_failures": health.consecutive_failures,
+                    "opened_until": health.opened_until if health.state == OPEN else None,
+                }
+                for model_name, health in self._health.items()
+            }
+
+    def save(self):
+        """Writes the router state to its file now."""
+        self._save(force=True)
+
+    # --- Internals ---
+
+    def _health_of(self, model_name: str) -> ModelHealth:
+        health = self._health.get(model_name)
+        if health is None:
+            health = self._health[model_name] = ModelHealth()
+        return health
+
+    def _take_probe(self, model_name: str, health: ModelHealth) -> bool:
+        """Whether an open or half-open model may be tried now. Claims the probe slot if so."""
+        now = time.monotonic()
+        if health.state == HALF_OPEN:
+            if health.probe_started is not None and now - health.probe_started < PROBE_TIMEOUT:
+                return False
+        elif time.time() < health.opened_until:
+            return False
+        else:
+            logger.info(f"Circuit for model `{model_name}` is half-open. Sending a probe request.")
+        health.state, health.probe_started = HALF_OPEN, now
+        return True
+
+    def _open(self, model_name: str, health: ModelHealth):
+        cooldown = min(BREAKER_MAX_COOLDOWN, BREAKER_COOLDOWN * 2 ** health.open_count)
+        health.state, health.probe_started = OPEN, None
+        health.opened_until = time.time() + cooldown
+        health.open_count += 1
+        logger.warning(f"Circuit for model `{model_name}` opened after repeated failures. "
+                       f"Skipping it for {cooldown:.0f}s.")
+
+    def _load(self):
+        if not self.state_path or not os.path.exists(self.state_path):
+            return
+        try:
+            with open(self.state_path, "r") as f:
+                data = json.load(f)
+            self._health = {name: ModelHealth.from_dict(entry) for name, entry in data.get("models", {}).items()}
+            logger.info(f"Loaded model router state for {len(self._health)} model(s) from {self.state_path}.")
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable model router state {self.state_path}: {e}")
+
+    def _save(self, force: bool = False):
+        if not self.state_path:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if not force and now - self._last_save < SAVE_INTERVAL:
+                return
+            self._last_save = now
+            data = {"saved_at": time.time(), "models": {name: h.to_dict() for name, h in self._health.items()}}
+        directory = os.path.dirname(self.state_path) or "."
+        tmp_path = None
+        try:
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(prefix=".model_router-", suffix=".tmp", dir=directory)
+            with os.fdopen(fd, "w") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.state_path)
+        except OSError as e:
+            logger.warning(f"Failed to save model router state: {e}")
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+
+_shared_router: ModelRouter | None = None
+_shared_router_lock = threading.Lock()
+
+
+def get_model_router() -> ModelRouter:
+    """Returns the process-wide model router, loading its saved state on first use."""
+    global _shared_router
+    with _shared_router_lock:
+        if _shared_router is None:
+            _shared_router = ModelRouter()
+        return _shared_router
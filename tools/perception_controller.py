@@ -4,20 +4,47 @@ import hashlib
 import numpy as np
 import mss
 import mss.tools
-from PIL import Image
 import os
 import logging
+import threading
+from tools.frame import ScreenFrame, to_pil_image
+from tools.change_detector import get_change_detector
 
 # Configure logging for this module
 logger = logging.getLogger(__name__)
 
+# One mss instance per thread (mss handles are not shareable across threads),
+# reused across calls instead of reconnecting to the display every time.
+_grabbers = threading.local()
+
 class PerceptionController:
     """
     A robust controller for capturing screen data. It can capture the full
     primary monitor or a specific region of it, providing a stable foundation
     for the agent's vision system.
     """
-    last_hash = None
+    @staticmethod
+    def _grabber():
+        sct = getattr(_grabbers, "sct", None)
+        if sct is None:
+            sct = _grabbers.sct = mss.mss()
+        return sct
+
+    @staticmethod
+    def _reset_grabber():
+        """Drops this thread's grabber (e.g. after a display error) so the next call reconnects."""
+        sct = getattr(_grabbers, "sct", None)
+        _grabbers.sct = None
+        if sct is not None:
+            try:
+                sct.close()
+            except Exception:
+                pass
+
+    @staticmethod
+    def to_pixels(sct_img) -> ScreenFrame:
+        """Wraps an mss screenshot as a ScreenFrame (no pixel conversion or copy)."""
+        return ScreenFrame.from_grab(sct_img)
 
     @staticmethod
     def capture_primary_monitor():
@@ -29,17 +56,17 @@ class PerceptionController:
             A tuple of (pixels, monitor_info_dict) or (None, None) on failure.
         """
         try:
-            with mss.mss() as sct:
-                # sct.monitors[1] is the designated primary monitor.
-                primary_monitor = sct.monitors[1]
-                sct_img = sct.grab(primary_monitor)
-                
-                # Convert to the format we need
-                img = Image.frombytes("RGB", sct_img.size, sct_img.rgb)
-                pixels = np.array(img)
-                
-                return pixels, primary_monitor
+            sct = PerceptionController._grabber()
+            # sct.monitors[1] is the designated primary monitor.
+            primary_monitor = sct.monitors[1]
+            sct_img = sct.grab(primary_monitor)
+
+            # Convert to the format we need
+            pixels = PerceptionController.to_pixels(sct_img)
+
+            return pixels, primary_monitor
         except Exception as e:
+            PerceptionController._reset_grabber()
             logger.error(f"Failed to capture primary monitor: {e}", exc_info=True)
             return None, None
 
@@ -51,29 +78,34 @@ class PerceptionController:
         The bounding box should be a dictionary with 'left', 'top', 'width', 'height'.
         """
         try:
-            with mss.mss() as sct:
-                sct_img = sct.grab(bbox)
-                img = Image.frombytes("RGB", sct_img.size, sct_img.rgb)
-                pixels = np.array(img)
-                # The bbox for a region capture is the region itself
-                return pixels, bbox
+            sct_img = PerceptionController._grabber().grab(bbox)
+            pixels = PerceptionController.to_pixels(sct_img)
+            # The bbox for a region capture is the region itself
+            return pixels, bbox
         except Exception as e:
+            PerceptionController._reset_grabber()
             logger.error(f"Failed to capture screen region at {bbox}: {e}", exc_info=True)
             return None, None
 
     @staticmethod
     def hash_pixels(pixels: np.array) -> str:
-        """Creates a SHA1 hash of the pixel array for fast change detection."""
-        return hashlib.sha1(pixels.tobytes()).hexdigest()
+        """Creates a SHA1 hash of the pixel array (or frame) for fast change detection."""
+        if isinstance(pixels, ScreenFrame):
+            return hashlib.sha1(pixels.bgra).hexdigest()
+        return hashlib.sha1(np.ascontiguousarray(pixels)).hexdigest()
 
     @staticmethod
-    def has_screen_changed(pixels: np.array) -> bool:
-        """Compares the current screen hash to the last known hash."""
-        current_hash = PerceptionController.hash_pixels(pixels)
-        if current_hash != PerceptionController.last_hash:
-            PerceptionController.last_hash = current_hash
-            return True
-        return False
+    def has_screen_changed(pixels: np.array, caller: str = "default") -> bool:
+        """
+        Checks whether the screen changed beyond the noise threshold since the
+        last frame this caller checked.
+        """
+        return get_change_detector().has_changed(caller, pixels)
+
+    @staticmethod
+    def changed_regions(pixels: np.array, caller: str = "default") -> list[dict]:
+        """Returns the dirty rectangles since the last frame this caller checked (empty if unchanged)."""
+        return get_change_detector().compare(caller, pixels)
 
     @staticmethod
     def save_screen_snapshot(pixels: np.array, save_path: str) -> bool:
@@ -82,7 +114,7 @@ class PerceptionController:
             logger.error("No pixels to save.")
             return False
         try:
-            img = Image.fromarray(pixels.copy(), "RGB")
+            img = to_pil_image(pixels, copy=True)
             os.makedirs(os.path.dirname(save_path), exist_ok=True)
             img.save(save_path)
             logger.info(f"📸 Debug screenshot saved to {save_path}")
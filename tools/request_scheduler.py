@@ -0,0 +1,239 @@
+# tools/request_scheduler.py
+
+import os
+import time
+import bisect
+import asyncio
+import logging
+import itertools
+from collections import deque
+from contextlib import asynccontextmanager
+
+# Configure logging for this module
+logger = logging.getLogger(__name__)
+
+# Provider budget per model, per minute. 0 means unlimited.
+DEFAULT_RPM = float(os.getenv("MODEL_RPM_LIMIT", "60"))
+DEFAULT_TPM = float(os.getenv("MODEL_TPM_LIMIT", "1000000"))
+# Per-model overrides: "model=rpm:tpm,model=rpm:tpm".
+RATE_LIMITS_ENV = os.getenv("MODEL_RATE_LIMITS", "")
+# Seconds a model gets no new requests after the provider answers with a rate-limit error.
+RATE_LIMIT_BACKOFF = float(os.getenv("MODEL_RATE_LIMIT_BACKOFF", "10"))
+
+# Lower runs first: Supervisor approvals hold up an action on screen, the
+# Brain's next step waits on its plan, and WriterAgent text can wait.
+PRIORITIES = {"validation": 0, "planning": 1, "analysis": 2, "vision": 2, "text": 3}
+DEFAULT_PRIORITY = 2
+
+# Approximate prompt cost of one image part, in tokens.
+IMAGE_TOKENS = 258
+# Queue waits remembered per priority for the wait-time percentiles.
+WAIT_WINDOW = 500
+
+
+def parse_rate_limits(spec: str) -> dict[str, tuple[float, float]]:
+    """Parses "model=rpm:tpm,..." into {model: (rpm, tpm)}."""
+    limits = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        try:
+            model_name, values = item.split("=", 1)
+            rpm, tpm = values.split(":", 1)
+            limits[model_name.strip()] = (float(rpm), float(tpm))
+        except ValueError:
+            logger.warning(f"Ignoring malformed rate limit '{item}' (expected model=rpm:tpm).")
+    return limits
+
+
+def estimate_tokens(contents: list) -> int:
+    """A rough prompt token count: about four characters per token, plus a flat cost per image."""
+    tokens = 0
+    for part in contents:
+        tokens += len(part) // 4 + 1 if isinstance(part, str) else IMAGE_TOKENS
+    return tokens
+
+
+def priority_of(call_class: str) -> int:
+    """The queue priority of a call class (lower runs first)."""
+    return PRIORITIES.get(call_class, DEFAULT_PRIORITY)
+
+
+class TokenBucket:
+    """Refills continuously at `per_minute` per minute, holding at most a minute's worth."""
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.level = per_minute
+        self._updated = time.monotonic()
+
+    @property
+    def unlimited(self) -> bool:
+        return self.capacity <= 0
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until `amount` is available (requests larger than the bucket wait for a full one)."""
+        if self.unlimited:
+            return 0.0
+        self._refill(now)
+        missing = min(amount, self.capacity) - self.level
+        return max(0.0, missing * 60.0 / self.capacity)
+
+    def take(self, amount: float, now: float):
+        if not self.unlimited:
+            self._refill(now)
+            self.level -= min(amount, self.capacity)
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.capacity / 60.0)
+        self._updated = now
+
+
+class ModelBudget:
+    """The request and token buckets of one model, plus any provider-imposed pause."""
+    def __init__(self, rpm: float, tpm: float):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.paused_until = 0.0
+
+    def wait_time(self, tokens: int, now: float) -> float:
+        return max(self.paused_until - now, self.requests.wait_time(1, now), self.tokens.wait_time(tokens, now))
+
+    def take(self, tokens: int, now: float):
+        self.requests.take(1, now)
+        self.tokens.take(tokens, now)
+
+
+class RequestScheduler:
+    """
+    Decides when each model call may start: at most `max_concurrency` at
+    once, within each model's requests-per-minute and tokens-per-minute
+    budget, and in priority order.
+
+    Callers wait in one queue ordered by priority, then arrival. When a slot
+    frees up or a budget refills, the first waiter whose model has budget
+    left starts. A waiter never overtakes a higher-priority one for the same
+    model, but may start ahead of one that is waiting on a different model's
+    budget. A rate-limit error from the provider pauses that model for
+    everyone (throttle()), so a burst backs off once instead of every
+    caller retrying into the same limit.
+
+    Runs on one event loop (the model client's); it is not thread-safe.
+    """
+    def __init__(self, max_concurrency: int, rpm: float = DEFAULT_RPM, tpm: float = DEFAULT_TPM,
+                 limits: dict[str, tuple[float, float]] | None = None):
+        self.max_concurrency = max_concurrency
+        self.rpm = rpm
+        self.tpm = tpm
+        self.limits = parse_rate_limits(RATE_LIMITS_ENV) if limits is None else limits
+        self._budgets: dict[str, ModelBudget] = {}
+        self._waiters: list[tuple] = []   # (priority, seq, model, tokens, future), kept sorted.
+        self._seq = itertools.count()
+        self._in_flight = 0
+        self._timer: asyncio.TimerHandle | None = None
+        self._waits: dict[int, deque] = {}
+        self._granted: dict[int, int] = {}
+        self._max_queue_depth = 0
+        self._throttles = 0
+
+    @asynccontextmanager
+    async def slot(self, model_name: str, priority: int = DEFAULT_PRIORITY, tokens: int = 0):
+        """Holds one of the concurrent slots for a call to `model_name`, charged against its budget."""
+        await self._acquire(model_name, priority, tokens)
+        try:
+            yield
+        finally:
+            self._in_flight -= 1
+            self._dispatch()
+
+    def throttle(self, model_name: str, seconds: float = RATE_LIMIT_BACKOFF):
+        """Pauses new calls to `model_name`, after the provider said it is over its rate limit."""
+        budget = self._budget(model_name)
+        budget.paused_until = max(budget.paused_until, time.monotonic() + seconds)
+        self._throttles += 1
+        logger.warning(f"Model `{model_name}` is rate limited. Pausing its requests for {seconds:g}s.")
+
+    def stats(self) -> dict:
+        """Queue depth, requests in flight, throttles, and wait-time percentiles per priority."""
+        by_priority = {}
+        for priority in sorted(set(self._waits) | {entry[0] for entry in self._waiters}):
+            waits = sorted(self._waits.get(priority, ()))
+            by_priority[priority] = {
+                "queued": sum(1 for entry in self._waiters if entry[0] == priority),
+                "granted": self._granted.get(priority, 0),
+                "wait_p50": _percentile(waits, 50),
+                "wait_p95": _percentile(waits, 95),
+                "wait_max": waits[-1] if waits else None,
+            }
+        return {
+            "queue_depth": len(self._waiters),
+            "max_queue_depth": self._max_queue_depth,
+            "in_flight": self._in_flight,
+            "throttles": self._throttles,
+            "priorities": by_priority,
+        }
+
+    # --- Internals ---
+
+    def _budget(self, model_name: str) -> ModelBudget:
+        budget = self._budgets.get(model_name)
+        if budget is None:
+            rpm, tpm = self.limits.get(model_name, (self.rpm, self.tpm))
+            budget = self._budgets[model_name] = ModelBudget(rpm, tpm)
+        return budget
+
+    async def _acquire(self, model_name: str, priority: int, tokens: int):
+        enqueued = time.monotonic()
+        future = asyncio.get_running_loop().create_future()
+        entry = (priority, next(self._seq), model_name, tokens, future)
+        bisect.insort(self._waiters, entry)
+        self._max_queue_depth = max(self._max_queue_depth, len(self._waiters))
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Granted just as the caller was cancelled: hand the slot on.
+                self._in_flight -= 1
+            elif entry in self._waiters:
+                self._waiters.remove(entry)
+            self._dispatch()
+            raise
+        waits = self._waits.get(priority)
+        if waits is None:
+            waits = self._waits[priority] = deque(maxlen=WAIT_WINDOW)
+        waits.append(time.monotonic() - enqueued)
+        self._granted[priority] = self._granted.get(priority, 0) + 1
+
+    def _dispatch(self):
+        """Starts every waiter that can start now, and schedules a retry for those waiting on a budget."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        now = time.monotonic()
+        blocked, retry_in = set(), None
+        for entry in list(self._waiters):
+            if self._in_flight >= self.max_concurrency:
+                return  # A finishing call dispatches again.
+            _, _, model_name, tokens, future = entry
+            if future.done():
+                self._waiters.remove(entry)
+                continue
+            if model_name in blocked:
+                continue
+            budget = self._budget(model_name)
+            wait = budget.wait_time(tokens, now)
+            if wait > 0:
+                # Keep lower priorities from using up this model's budget first.
+                blocked.add(model_name)
+                retry_in = wait if retry_in is None else min(retry_in, wait)
+                continue
+            budget.take(tokens, now)
+            self._waiters.remove(entry)
+            self._in_flight += 1
+            future.set_result(None)
+        if retry_in is not None:
+            self._timer = asyncio.get_running_loop().call_later(retry_in, self._dispatch)
+
+
+def _percentile(ordered: list[float], p: float) -> float | None:
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
@@ -0,0 +1,246 @@
+# tools/response_cache.py
+
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# Configure logging for this module
+logger = logging.getLogger(__name__)
+
+DEFAULT_RESPONSE_CACHE = os.getenv("RESPONSE_CACHE", "1") == "1"
+# On-disk tier; empty keeps the cache in memory only.
+DEFAULT_CACHE_DIR = os.getenv("RESPONSE_CACHE_DIR", "memory/response_cache")
+# Entries kept in the in-memory LRU tier.
+DEFAULT_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "512"))
+
+# Seconds an answer stays valid, per call class, when the call site does not
+# pass its own TTL. 0 means not cached: text calls are mostly creative
+# writing, which should not repeat, so they opt in per call site.
+CACHE_TTLS = {
+    "planning": float(os.getenv("RESPONSE_CACHE_TTL_PLANNING", "300")),
+    "validation": float(os.getenv("RESPONSE_CACHE_TTL_VALIDATION", "600")),
+    "analysis": float(os.getenv("RESPONSE_CACHE_TTL_ANALYSIS", "600")),
+    "vision": float(os.getenv("RESPONSE_CACHE_TTL_VISION", "600")),
+    "text": float(os.getenv("RESPONSE_CACHE_TTL_TEXT", "0")),
+}
+
+# Call classes keyed on the exact frame instead of its perceptual hash: a
+# Supervisor approval or a set of element boxes must never be reused for a
+# screen the model has not seen, however similar it looks.
+EXACT_IMAGE_CLASSES = {"validation", "analysis"}
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Collapses whitespace, so prompts that differ only in indentation or line breaks share entries."""
+    return " ".join(prompt.split())
+
+
+class ResponseCache:
+    """
+    A two-tier cache of model answers: an in-memory LRU in front of one
+    small JSON file per entry on disk, so answers survive a restart.
+
+    Keys combine the call class, the models asked, the normalized prompt,
+    the generation settings and an image identity. For screenshots the image
+    identity is a perceptual hash, so a frame that differs only by noise (a
+    re-render, compression) still hits, or for EXACT_IMAGE_CLASSES a digest
+    of the exact pixels. Entries expire after the TTL they were stored with.
+
+    Lookups that miss memory read the disk tier on a worker thread (aget),
+    and disk writes happen in the background, so neither blocks the caller's
+    event loop. Hit and miss counts are kept per call site label.
+    """
+    def __init__(self, directory: str | None = DEFAULT_CACHE_DIR, max_entries: int = DEFAULT_CACHE_MAX_ENTRIES,
+                 enabled: bool = DEFAULT_RESPONSE_CACHE):
+        self.directory = directory or None
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self._entries: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats: dict[str, dict[str, int]] = {}
+        self._swept = False
+        self._io = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ResponseCache") if self.directory else None
+
+    @staticmethod
+    def key(call_class: str, models: list[str] | None, prompt: str, image_id: str = "",
+            generation_config: dict | None = None, extra: str = "") -> str:
+        """The entry key for a query. `extra` separates otherwise equal queries read differently (e.g. streamed)."""
+        parts = [call_class, ",".join(models or []), normalize_prompt(prompt), image_id,
+                 json.dumps(generation_config or {}, sort_keys=True), extra]
+        return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+    def get(self, key: str, site: str = "default") -> str | None:
+        """The cached answer, or None. Reads the disk tier in the calling thread."""
+        text = self._get_memory(key)
+        if text is not None:
+            self._count(site, "memory_hits")
+            return text
+        if self.directory:
+            text = self._get_disk(key)
+        self._count(site, "disk_hits" if text is not None else "misses")
+        return text
+
+    async def aget(self, key: str, site: str = "default") -> str | None:
+        """Like get(), reading the disk tier on the cache's I/O thread."""
+        text = self._get_memory(key)
+        if text is not None:
+            self._count(site, "memory_hits")
+            return text
+        if self.directory:
+            text = await asyncio.wrap_future(self._io.submit(self._get_disk, key))
+        self._count(site, "disk_hits" if text is not None else "misses")
+        return text
+
+    def put(self, key: str, text: str, ttl: float):
+        """Stores an answer for `ttl` seconds. The disk write happens in the background."""
+        if not self.enabled or ttl <= 0 or text is None:
+            return
+        expires_at = time.time() + ttl
+        self._put_memory(key, expires_at, text)
+        if self.directory:
+            self._io.submit(self._write_disk, key, expires_at, text)
+
+    def stats(self) -> dict:
+        """Hits (memory and disk), misses and hit rate per call site, plus the totals."""
+        with self._lock:
+            sites = {site: dict(counts) for site, counts in self._stats.items()}
+            entries = len(self._entries)
+        totals = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+        for counts in sites.values():
+            for name in totals:
+                totals[name] += counts[name]
+            counts["hit_rate"] = _hit_rate(counts)
+        return {**totals, "hit_rate": _hit_rate(totals), "entries": entries, "sites": sites}
+
+    def clear(self):
+        """Drops every entry, in memory and on disk."""
+        with self._lock:
+            self._entries.clear()
+        if self.directory:
+            self._io.submit(self._sweep, True).result()
+
+    def close(self):
+        if self._io:
+            self._io.shutdown(wait=True)
+
+    # --- Internals ---
+
+    def _get_memory(self, key: str) -> str | None:
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def _put_memory(self, key: str, expires_at: float, text: str):
+        with self._lock:
+            self._entries[key] = (expires_at, text)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _get_disk(self, key: str) -> str | None:
+        if not self.enabled:
+            return None
+        self._sweep_once()
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable response cache entry {path}: {e}")
+            return None
+        if entry.get("expires_at", 0) <= time.time():
+            _remove(path)
+            return None
+        self._put_memory(key, entry["expires_at"], entry["text"])
+        return entry["text"]
+
+    def _write_disk(self, key: str, expires_at: float, text: str):
+        self._sweep_once()
+        tmp_path = None
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(prefix=".response-", suffix=".tmp", dir=self.directory)
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"expires_at": expires_at, "text": text}, f)
+            os.replace(tmp_path, self._path(key))
+        except OSError as e:
+            logger.warning(f"Failed to write response cache entry: {e}")
+            if tmp_path:
+                _remove(tmp_path)
+
+    def _sweep_once(self):
+        """Deletes the disk entries that expired while nothing was running, on first disk access."""
+        if not self._swept:
+            self._swept = True
+            self._sweep(False)
+
+    def _sweep(self, everything: bool):
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return
+        now = time.time()
+        for name in names:
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.directory, name)
+            if not everything:
+                try:
+                    with open(path, "r", encoding="utf-8") as f:
+                        if json.load(f).get("expires_at", 0) > now:
+                            continue
+                except (OSError, ValueError):
+                    pass
+            _remove(path)
+
+    def _count(self, site: str, outcome: str):
+        with self._lock:
+            counts = self._stats.get(site)
+            if counts is None:
+                counts = self._stats[site] = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+            counts[outcome] += 1
+
+
+def _hit_rate(counts: dict) -> float:
+    lookups = counts["memory_hits"] + counts["disk_hits"] + counts["misses"]
+    return (counts["memory_hits"] + counts["disk_hits"]) / lookups if lookups else 0.0
+
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+_shared_cache: ResponseCache | None = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> ResponseCache:
+    """Returns the process-wide response cache."""
+    global _shared_cache
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            _shared_cache = ResponseCache()
+        return _shared_cache
@@ -0,0 +1,327 @@
+# tools/telemetry.py
+
+import os
+import json
+import time
+import logging
+import threading
+import contextvars
+from bisect import bisect_left
+from collections import deque
+from datetime import datetime
+
+# Configure logging for this module
+logger = logging.getLogger(__name__)
+
+TELEMETRY_DIR = os.getenv("TELEMETRY_DIR", "logs/telemetry")
+# Per-call records kept for the dump; histograms cover every call regardless.
+MAX_CALL_RECORDS = int(os.getenv("TELEMETRY_MAX_RECORDS", "5000"))
+
+# USD per million (prompt, response) tokens, for the cost estimate. Models
+# not listed are counted in tokens but not in cost.
+MODEL_PRICES = {
+    "gemini-1.5-pro-latest": (1.25, 5.00),
+    "gemini-1.5-flash-latest": (0.075, 0.30),
+}
+
+# Upper bucket bounds per histogram metric; values above the last bound go in an overflow bucket.
+HISTOGRAM_BOUNDS = {
+    "latency": [0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60],
+    "ttfb": [0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60],
+    "queue_wait": [0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30],
+    "image_bytes": [10_000, 50_000, 100_000, 250_000, 500_000, 1_000_000, 2_000_000],
+    "prompt_tokens": [100, 250, 500, 1000, 2000, 4000, 8000, 16000],
+    "response_tokens": [25, 50, 100, 250, 500, 1000, 2000, 4000],
+    "fallback_hops": [0, 1, 2, 3],
+}
+
+# The call being made by the current task, and the model attempt within it.
+_current_call: contextvars.ContextVar[dict | None] = contextvars.ContextVar("model_call", default=None)
+_current_attempt: contextvars.ContextVar[dict | None] = contextvars.ContextVar("model_attempt", default=None)
+
+
+class Histogram:
+    """Counts of values per bucket, plus count, sum, min and max."""
+    def __init__(self, bounds: list[float]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def percentile(self, p: float) -> float | None:
+        """The upper bound of the bucket holding the p-th percentile (the max for the overflow bucket)."""
+        if not self.count:
+            return None
+        rank = max(1, round(self.count * p / 100))
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else None,
+            "min": self.min,
+            "max": self.max,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "buckets": {f"<={bound:g}": count for bound, count in zip(self.bounds, self.counts)}
+                       | {f">{self.bounds[-1]:g}": self.counts[-1]},
+        }
+
+
+class Telemetry:
+    """
+    Per-call records of model usage, and histograms aggregated from them.
+
+    A record describes one logical query: who asked (caller), the call
+    class, the model that answered, image bytes sent, prompt and response
+    tokens, time to first byte, total latency, every model attempt made
+    (so retries and fallback hops are visible), whether the answer came
+    from the cache or a shared in-flight call, and the estimated cost.
+
+    Histograms are kept overall, per caller and per model, and can be
+    queried in process with histograms(); dump() writes everything to a
+    JSON file, e.g. at the end of a mission.
+    """
+    def __init__(self, directory: str = TELEMETRY_DIR, max_records: int = MAX_CALL_RECORDS):
+        self.directory = directory
+        self.records: deque = deque(maxlen=max_records)
+        self._histograms: dict[str, dict[str, Histogram]] = {}
+        self._totals: dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def record(self, call: dict):
+        """Adds one finished call (see finish_call() for the fields)."""
+        with self._lock:
+            self.records.append(call)
+            for scope in ("all", f"caller:{call['caller']}", f"model:{call['model']}" if call["model"] else None):
+                if scope:
+                    self._add(scope, call)
+
+    def histograms(self, scope: str = "all") -> dict:
+        """Histograms for "all", "caller:<name>" or "model:<name>"."""
+        with self._lock:
+            return {metric: histogram.to_dict() for metric, histogram in self._histograms.get(scope, {}).items()}
+
+    def summary(self) -> dict:
+        """Per scope: calls, outcomes, tokens, estimated cost, and latency p50/p95."""
+        with self._lock:
+            summary = {}
+            for scope, totals in self._totals.items():
+                latency = self._histograms[scope].get("latency")
+                summary[scope] = {
+                    **totals,
+                    "statuses": dict(totals["statuses"]),
+                    "cost_usd": round(totals["cost_usd"], 6),
+                    "latency_p50": latency.percentile(50) if latency else None,
+                    "latency_p95": latency.percentile(95) if latency else None,
+                }
+            return summary
+
+    def dump(self, path: str | None = None) -> str | None:
+        """Writes the summary, histograms and call records as JSON. Returns the file path."""
+        with self._lock:
+            scopes = list(self._histograms)
+            records = list(self.records)
+        data = {
+            "generated_at": datetime.now().isoformat(),
+            "summary": self.summary(),
+            "histograms": {scope: self.histograms(scope) for scope in scopes},
+            "calls": records,
+        }
+        path = path or os.path.join(self.directory, f"telemetry_{datetime.now():%Y%m%d_%H%M%S}.json")
+        try:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(data, f, indent=2)
+        except OSError as e:
+            logger.warning(f"Failed to write model telemetry to {path}: {e}")
+            return None
+        return path
+
+    def reset(self):
+        with self._lock:
+            self.records.clear()
+            self._histograms.clear()
+            self._totals.clear()
+
+    # --- Internals ---
+
+    def _add(self, scope: str, call: dict):
+        totals = self._totals.get(scope)
+        if totals is None:
+            totals = self._totals[scope] = {"calls": 0, "statuses": {}, "attempts": 0, "prompt_tokens": 0,
+                                            "response_tokens": 0, "image_bytes": 0, "cost_usd": 0.0}
+        totals["calls"] += 1
+        totals["statuses"][call["status"]] = totals["statuses"].get(call["status"], 0) + 1
+        totals["attempts"] += len(call["attempts"])
+        totals["prompt_tokens"] += call["prompt_tokens"] or 0
+        totals["response_tokens"] += call["response_tokens"] or 0
+        totals["image_bytes"] += call["image_bytes"] or 0
+        totals["cost_usd"] += call["cost_usd"] or 0.0
+        histograms = self._histograms.setdefault(scope, {})
+        for metric, bounds in HISTOGRAM_BOUNDS.items():
+            value = call.get(metric)
+            if value is not None:
+                histogram = histograms.get(metric)
+                if histogram is None:
+                    histogram = histograms[metric] = Histogram(bounds)
+                histogram.observe(value)
+
+
+# --- Building records (used by the model client and the other model call paths) ---
+
+def begin_call(caller: str, call_class: str | None = None, current: bool = True) -> dict:
+    """Starts the record of a query and, with `current`, makes it the current task's call."""
+    call = {
+        "timestamp": datetime.now().isoformat(),
+        "caller": caller,
+        "call_class": call_class,
+        "status": "failed",
+        "model": None,
+        "image_bytes": None,
+        "prompt_tokens": None,
+        "response_tokens": None,
+        "tokens_estimated": False,
+        "ttfb": None,
+        "latency": None,
+        "queue_wait": None,
+        "retries": 0,
+        "fallback_hops": None,
+        "cost_usd": None,
+        "attempts": [],
+        "_started": time.monotonic(),
+    }
+    if current:
+        _current_call.set(call)
+    return call
+
+
+def update_call(**fields):
+    """Sets fields on the current task's call, if one is being recorded."""
+    call = _current_call.get()
+    if call is not None:
+        call.update(fields)
+
+
+def begin_attempt(model_name: str) -> dict:
+    """Adds a model attempt to the current call and makes it the current task's attempt."""
+    attempt = {"model": model_name, "outcome": "cancelled", "queue_wait": None, "ttfb": None, "latency": None,
+               "prompt_tokens": None, "response_tokens": None, "_enqueued": time.monotonic(), "_started": None}
+    call = _current_call.get()
+    if call is not None:
+        call["attempts"].append(attempt)
+    _current_attempt.set(attempt)
+    return attempt
+
+
+def attempt_started():
+    """Marks the current attempt as sent, after any queueing."""
+    attempt = _current_attempt.get()
+    if attempt is not None:
+        attempt["_started"] = time.monotonic()
+        attempt["queue_wait"] = attempt["_started"] - attempt["_enqueued"]
+
+
+def note_first_byte():
+    """Records time to first byte for the current attempt (the first one only)."""
+    attempt = _current_attempt.get()
+    if attempt is not None and attempt["ttfb"] is None and attempt["_started"] is not None:
+        attempt["ttfb"] = time.monotonic() - attempt["_started"]
+
+
+def note_usage(usage):
+    """Records the provider's token counts (a usage_metadata object) for the current attempt."""
+    attempt = _current_attempt.get()
+    if attempt is None or usage is None:
+        return
+    prompt_tokens = getattr(usage, "prompt_token_count", None)
+    response_tokens = getattr(usage, "candidates_token_count", None)
+    if prompt_tokens:
+        attempt["prompt_tokens"] = prompt_tokens
+    if response_tokens:
+        attempt["response_tokens"] = response_tokens
+
+
+def finish_call(call: dict, status: str, text: str | None = None) -> dict:
+    """
+    Completes a call record: latency, the answering attempt's model, TTFB and
+    tokens (estimated from the prompt and text when the provider gave no
+    counts), retries, fallback hops and cost. Returns the record, ready for
+    Telemetry.record().
+    """
+    call["status"] = status
+    call["latency"] = time.monotonic() - call.pop("_started")
+    prompt_tokens_estimate = call.pop("_prompt_tokens_estimate", None)
+    attempts = call["attempts"]
+    for attempt in attempts:
+        attempt.pop("_enqueued", None)
+        attempt.pop("_started", None)
+    winner = next((attempt for attempt in reversed(attempts) if attempt["outcome"] == "ok"), None)
+    if winner is not None:
+        if winner["prompt_tokens"] is None and prompt_tokens_estimate is not None:
+            winner["prompt_tokens"] = prompt_tokens_estimate
+            call["tokens_estimated"] = True
+        if winner["response_tokens"] is None and text:
+            winner["response_tokens"] = len(text) // 4 + 1
+            call["tokens_estimated"] = True
+        call.update(model=winner["model"], ttfb=winner["ttfb"], queue_wait=winner["queue_wait"],
+                    prompt_tokens=winner["prompt_tokens"], response_tokens=winner["response_tokens"],
+                    fallback_hops=call.get("fallback_hops") or 0)
+    elif attempts:
+        call["model"] = attempts[-1]["model"]
+    call["retries"] = max(0, len(attempts) - 1)
+    # Every attempt that got an answer was paid for, including losing hedges.
+    costs = [_cost(a["model"], a["prompt_tokens"], a["response_tokens"]) for a in attempts]
+    known = [cost for cost in costs if cost is not None]
+    call["cost_usd"] = sum(known) if known else (0.0 if status in ("cached", "coalesced") else None)
+    return call
+
+
+def record_call(telemetry: Telemetry, caller: str, model_name: str, started: float, status: str, prompt: str,
+                text: str | None, image_bytes: int | None = None, call_class: str | None = None, usage=None):
+    """Records a single-attempt call made outside the model client (SDK or CLI). `started` is time.monotonic()."""
+    call = begin_call(caller, call_class, current=False)
+    call["_started"] = started
+    call["image_bytes"] = image_bytes
+    call["_prompt_tokens_estimate"] = len(prompt) // 4 + 1
+    attempt = {"model": model_name, "outcome": status, "queue_wait": None, "ttfb": None,
+               "latency": time.monotonic() - started, "prompt_tokens": None, "response_tokens": None}
+    if usage is not None:
+        attempt["prompt_tokens"] = getattr(usage, "prompt_token_count", None) or None
+        attempt["response_tokens"] = getattr(usage, "candidates_token_count", None) or None
+    call["attempts"].append(attempt)
+    telemetry.record(finish_call(call, status, text))
+
+
+def _cost(model_name: str, prompt_tokens: int | None, response_tokens: int | None) -> float | None:
+    prices = MODEL_PRICES.get(model_name.removeprefix("models/"))
+    if prices is None or (prompt_tokens is None and response_tokens is None):
+        return None
+    return ((prompt_tokens or 0) * prices[0] + (response_tokens or 0) * prices[1]) / 1_000_000
+
+
+_shared_telemetry: Telemetry | None = None
+_shared_telemetry_lock = threading.Lock()
+
+
+def get_telemetry() -> Telemetry:
+    """Returns the process-wide model telemetry."""
+    global _shared_telemetry
+    with _shared_telemetry_lock:
+        if _shared_telemetry is None:
+            _shared_telemetry = Telemetry()
+        return _shared_telemetry